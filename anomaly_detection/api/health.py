@@ -0,0 +1,54 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+
+from flask import Blueprint
+from flask import jsonify
+from flask import Response
+
+from anomaly_detection import metrics
+
+health = Blueprint("health", __name__)
+
+_ready = threading.Event()
+
+
+def set_ready():
+    _ready.set()
+
+
+def set_not_ready():
+    _ready.clear()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+# Readiness
+# URL: GET /ready
+# Returns 503 until the server has finished warming up.
+@health.route("/ready", methods=['GET'])
+def get_readiness():
+    if is_ready():
+        return jsonify(status="ready"), 200
+    return jsonify(status="warming up"), 503
+
+
+# Metrics
+# URL: GET /metrics
+# Returns the process metrics in the Prometheus text format.
+@health.route("/metrics", methods=['GET'])
+def get_metrics():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
@@ -13,6 +13,7 @@
 # limitations under the License.
 from werkzeug.wrappers.request import Request
 
+from anomaly_detection.api.middleware.request_id import REQUEST_ID_ENV
 from anomaly_detection.context import RequestContext
 
 NO_AUTH_ADMIN_TENANT_ID = 'admin_tenant'
@@ -25,7 +26,7 @@ class NoAuthMiddleWare(object):
     def __call__(self, environ, start_response):
         req = Request(environ)
         # FIXME: Any other good idea for this.
-        if req.path in ['/', '/v1beta', '/v1beta/']:
+        if req.path in ['/', '/v1beta', '/v1beta/', '/ready', '/metrics']:
             return self._app(environ, start_response)
 
         if 'X-Auth-Token' not in req.headers:
@@ -40,6 +41,7 @@ class NoAuthMiddleWare(object):
         environ["anomaly_detection.context"] = RequestContext(user_id,
                                                               tenant_id,
                                                               is_admin=True,
-                                                              remote_address=remote_address)
+                                                              remote_address=remote_address,
+                                                              request_id=environ.get(REQUEST_ID_ENV))
         return self._app(environ, start_response)
 
@@ -0,0 +1,63 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+from anomaly_detection import metrics
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+REQUEST_SECONDS = metrics.histogram(
+    'anomaly_detection_http_request_duration_seconds',
+    'Latency of the API requests by route and status',
+    ['method', 'route', 'status'])
+REQUESTS_IN_FLIGHT = metrics.gauge(
+    'anomaly_detection_http_requests_in_flight',
+    'Number of API requests being handled')
+
+
+class MetricsMiddleWare(object):
+    """Records the latency of every request and the requests in flight.
+
+    Requests are labelled by their URL rule, e.g.
+    ``/v1beta/<tenant_id>/training``, so the label values stay bounded.
+    """
+
+    def __init__(self, app, url_map):
+        self._app = app
+        self._url_map = url_map
+
+    def _route(self, environ):
+        try:
+            rule, _args = self._url_map.bind_to_environ(environ).match(return_rule=True)
+            return rule.rule
+        except (HTTPException, RequestRedirect):
+            return UNMATCHED_ROUTE
+
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        route = self._route(environ)
+        status = ['500']
+
+        def _start_response(status_line, headers, exc_info=None):
+            status[0] = status_line.split(' ', 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = metrics.monotonic()
+        try:
+            return self._app(environ, _start_response)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_SECONDS.observe(metrics.monotonic() - start, (method, route, status[0]))
@@ -0,0 +1,51 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from anomaly_detection import profiler
+from anomaly_detection.api.middleware.request_id import REQUEST_ID_ENV
+from anomaly_detection.utils import config as cfg
+
+CONF = cfg.CONF
+
+
+class ProfilerMiddleWare(object):
+    """Profiles requests, all of them or those asking for it.
+
+    An admin request is profiled when it carries an ``X-Profile`` header,
+    set to ``cprofile`` or ``sampling`` to choose the profiler. The profile
+    is named after the request id returned in ``X-Request-Id``.
+    """
+
+    def __init__(self, app):
+        self._app = app
+
+    def _mode(self, environ):
+        conf = CONF.snapshot('profiler')
+        if conf.profile_requests:
+            return conf.mode
+        requested = environ.get('HTTP_X_PROFILE')
+        if not requested or not conf.allow_header:
+            return None
+        ctx = environ.get('anomaly_detection.context')
+        if ctx is None or not ctx.is_admin:
+            return None
+        return requested if requested in profiler.MODES else conf.mode
+
+    def __call__(self, environ, start_response):
+        mode = self._mode(environ)
+        if mode is None:
+            return self._app(environ, start_response)
+        name = 'request-%s' % environ.get(REQUEST_ID_ENV, 'unknown')
+        with profiler.profile(name, mode):
+            # iterate the response inside the profile, it may be generated lazily
+            return list(self._app(environ, start_response))
@@ -0,0 +1,36 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from anomaly_detection import log
+from anomaly_detection.utils import uuidutils
+
+REQUEST_ID_ENV = 'anomaly_detection.request_id'
+REQUEST_ID_HEADER = 'X-Request-Id'
+
+
+class RequestIdMiddleWare(object):
+    """Assigns every request an id, returned in the X-Request-Id header."""
+
+    def __init__(self, app):
+        self._app = app
+
+    def __call__(self, environ, start_response):
+        request_id = 'req-' + uuidutils.generate_uuid()
+        environ[REQUEST_ID_ENV] = request_id
+
+        def _start_response(status, headers, exc_info=None):
+            headers.append((REQUEST_ID_HEADER, request_id))
+            return start_response(status, headers, exc_info)
+
+        with log.context(request_id=request_id):
+            return self._app(environ, _start_response)
@@ -0,0 +1,28 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from anomaly_detection import watchdog
+from anomaly_detection.api.middleware.request_id import REQUEST_ID_ENV
+
+
+class WatchdogMiddleWare(object):
+    """Logs the sampled stacks of requests running past the watchdog threshold."""
+
+    def __init__(self, app):
+        self._app = app
+
+    def __call__(self, environ, start_response):
+        name = '%s %s %s' % (environ.get('REQUEST_METHOD'), environ.get('PATH_INFO'),
+                             environ.get(REQUEST_ID_ENV, ''))
+        with watchdog.watch('request', name.strip()):
+            return self._app(environ, start_response)
@@ -42,6 +42,14 @@ def list_algorithm(tenant_id):
             {
                 'name': 'DBSCAN',
                 'description': 'Density-based spatial clustering of applications with noise'
+            },
+            {
+                'name': 'series_gaussian',
+                'description': 'gaussian distribution of every series'
+            },
+            {
+                'name': 'ewma',
+                'description': 'exponentially weighted seasonal baseline of every series'
             }
         ]
 
@@ -77,7 +85,7 @@ def create(tenant_id):
 def delete(tenant_id, training_id):
     LOG.debug("starting training, tenant_id: %s", tenant_id)
     ctx = request.environ['anomaly_detection.context']
-    db.training_delete(ctx, training_id)
+    ml_mgr.delete_training(ctx, training_id)
     return "", 200
 
 
@@ -102,7 +110,8 @@ def get(tenant_id, training_id):
 @service.route("<tenant_id>/training", methods=['GET'])
 def index(tenant_id):
     ctx = request.environ['anomaly_detection.context']
-    trainings = db.training_get_all_by_tenant(ctx, tenant_id)
+    # a training created a moment ago may not be listed yet with a lagging replica
+    trainings = db.training_get_all_by_tenant(ctx, tenant_id, use_slave=True)
     return jsonify(training_view_builder.detail_list(trainings)), 200
 
 
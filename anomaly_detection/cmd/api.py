@@ -13,17 +13,28 @@
 # limitations under the License.
 
 import sys
+import threading
 
 from flask import Flask
 
 from anomaly_detection import log
+from anomaly_detection import metrics
+from anomaly_detection.api import health
 from anomaly_detection.api.middleware.auth import NoAuthMiddleWare
+from anomaly_detection.api.middleware.metrics import MetricsMiddleWare
+from anomaly_detection.api.middleware.profiler import ProfilerMiddleWare
+from anomaly_detection.api.middleware.request_id import RequestIdMiddleWare
+from anomaly_detection.api.middleware.watchdog import WatchdogMiddleWare
 from anomaly_detection.api import v1beta
+from anomaly_detection.api.v1beta import training as training_api
 from anomaly_detection.api.version import version
+from anomaly_detection.context import get_admin_context
 from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import reloader
 from anomaly_detection.common import options # load configuration, don't remove
 
 CONF = cfg.CONF
+LOG = log.getLogger(__name__)
 
 api_opts = [
     cfg.StrOpt('listen_ip',
@@ -35,34 +46,71 @@ api_opts = [
     cfg.StrOpt('dbscan_figure_style',
                default='blue_red',
                choices=['blue_red', 'core_border_spectral'],
-               help='DBSCAN figure output style')
-
+               mutable=True,
+               help='DBSCAN figure output style'),
+    cfg.BoolOpt('enable_metrics',
+                default=True,
+                help='Record request latencies and serve them with the '
+                     'other process metrics on /metrics'),
+    cfg.BoolOpt('warm_up',
+                default=False,
+                help='Load trainings into the model cache and import the ML '
+                     'modules before the server reports ready'),
+    cfg.IntOpt('warm_up_training_number',
+               default=0,
+               min=0,
+               help='Number of most recently updated trainings loaded by '
+                    'the warm up, 0 loads as many as the model cache holds')
     ]
 
 CONF.register_opts(api_opts, "apiserver")
 
 
 class ServerManager:
-    app = Flask(__name__)
-
     def __init__(self):
+        # one app per manager, the middleware are chosen from the config
+        self.app = Flask(__name__)
         self._init_server()
 
     def _init_server(self):
         self.app.url_map.strict_slashes = False
-        # add middleware
+        # add middleware, the last one added sees the request first
+        if CONF.profiler.profile_requests or CONF.profiler.allow_header:
+            self.app.wsgi_app = ProfilerMiddleWare(self.app.wsgi_app)
         self.app.wsgi_app = NoAuthMiddleWare(self.app.wsgi_app)
+        if CONF.watchdog.enabled:
+            self.app.wsgi_app = WatchdogMiddleWare(self.app.wsgi_app)
+        self.app.wsgi_app = RequestIdMiddleWare(self.app.wsgi_app)
+        if CONF.apiserver.enable_metrics:
+            self.app.wsgi_app = MetricsMiddleWare(self.app.wsgi_app, self.app.url_map)
+            metrics.REGISTRY.register_collector(training_api.ml_mgr.collect_metrics)
         # register router
         self.app.register_blueprint(version)
+        self.app.register_blueprint(health.health)
         self.app.register_blueprint(v1beta.service, url_prefix="/v1beta")
 
+    def warm_up(self):
+        try:
+            training_api.ml_mgr.warm_up(get_admin_context(),
+                                        limit=CONF.apiserver.warm_up_training_number)
+        except Exception:
+            LOG.exception("warm up failed")
+        finally:
+            health.set_ready()
+
     def start(self):
+        if CONF.apiserver.warm_up:
+            health.set_not_ready()
+            threading.Thread(target=self.warm_up, name="warm-up").start()
+        else:
+            health.set_ready()
         self.app.run(CONF.apiserver.listen_ip, CONF.apiserver.listen_port)
 
 
 def main():
     CONF(sys.argv[1:])
     log.setup(CONF, "anomaly_detection")
+    reloader.start(CONF)
     server_manager = ServerManager()
     server_manager.start()
 
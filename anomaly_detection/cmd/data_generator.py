@@ -16,6 +16,7 @@ import sys
 from anomaly_detection import log
 from anomaly_detection.data_generator.generator import Generator
 from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import reloader
 # need register global_opts
 from anomaly_detection.common import options
 
@@ -25,6 +26,12 @@ CONF = cfg.CONF
 def main():
     CONF(sys.argv[1:])
     log.setup(CONF, "anomaly_detection")
+    reloader.start(CONF)
+    if CONF.data_generator.mode == 'synthetic':
+        # imported here, numpy is only needed by the synthetic workload
+        from anomaly_detection.data_generator import synthetic
+        synthetic.SyntheticGenerator().run()
+        return
     generator = Generator()
     generator.load_jobs()
     generator.run()
@@ -16,6 +16,7 @@ import sys
 from anomaly_detection import log
 from anomaly_detection.data_parser import manager
 from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import reloader
 # need register global_opts
 from anomaly_detection.common import options
 
@@ -24,7 +25,7 @@ CONF = cfg.CONF
 data_parser_opts = [
     cfg.StrOpt('receiver_name',
                default='csv',
-               help='Data receiver name')
+               help='Data receiver name, one of csv, kafka or replay')
 ]
 
 CONF.register_opts(data_parser_opts, "data_parser")
@@ -33,6 +34,7 @@ CONF.register_opts(data_parser_opts, "data_parser")
 def main():
     CONF(sys.argv[1:])
     log.setup(CONF, "anomaly_detection")
+    reloader.start(CONF)
     mgr = manager.Manager(CONF.data_parser.receiver_name)
     mgr.run()
 
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import argparse
+import datetime
 import os
 import sys
 
@@ -41,6 +42,31 @@ class DbCommands(object):
         print("do Dbcommand.sync(version=%s)." % version)
         api.init_db()
 
+    @args('batch_size', nargs='?', type=int, default=10000,
+          help='Rows copied per transaction')
+    def migrate_performance(self, batch_size=10000):
+        """Copy the performance rows to the compact schema."""
+        print("copied %d performance rows, set [database] performance_schema "
+              "to compact to use them." % api.migrate_performance(batch_size))
+
+    @args('days', nargs='?', type=int, default=None,
+          help='Delete the performance rows older than this many days, '
+               'defaults to [database] performance_retention_days')
+    def purge(self, days=None):
+        """Delete the expired and the soft deleted performance rows."""
+        conf = CONF.snapshot('database')
+        if days is None:
+            days = conf.performance_retention_days
+        before = None
+        if days:
+            before = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        print("purged %d performance rows." %
+              api.purge_performance(before, conf.purge_batch_size))
+
+    def recount(self):
+        """Drop the row counters, they are counted again on next read."""
+        print("reset %d row counters." % api.reset_row_counters())
+
 
 def methods_of(obj):
     result = []
@@ -15,7 +15,8 @@
 
 class RequestContext(object):
     def __init__(self, user_id, tenant_id, is_admin=None, is_admin_tenant=None,
-                 roles=None, auth_token=None, read_deleted="no", **kwargs):
+                 roles=None, auth_token=None, read_deleted="no", request_id=None,
+                 **kwargs):
         self._user_id = user_id
         self.auth_token = auth_token
         self.is_admin = is_admin
@@ -26,6 +27,7 @@ class RequestContext(object):
         self.tenant_id = tenant_id
 
         self.read_deleted = read_deleted
+        self.request_id = request_id
 
     def to_dict(self):
         values = super(RequestContext, self).to_dict()
@@ -33,6 +35,7 @@ class RequestContext(object):
             'user_id': getattr(self, 'user_id', None),
             'tenant_id': getattr(self, 'tenant_id', None),
             'read_deleted': getattr(self, 'read_deleted', None),
+            'request_id': getattr(self, 'request_id', None),
             'remote_address': getattr(self, 'remote_address', None),
             'timestamp': self.timestamp.isoformat() if hasattr(
                 self, 'timestamp') else None,
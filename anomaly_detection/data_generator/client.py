@@ -12,15 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import copy
+import datetime
 import json
-
-import requests
-from keystoneauth1 import identity
-from keystoneauth1 import session as ks
+import threading
+import time
 
 from anomaly_detection import log
+from anomaly_detection.utils import capture
 from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import lazy_import
+
+requests = lazy_import('requests')
+adapters = lazy_import('requests.adapters')
+identity = lazy_import('keystoneauth1.identity')
+ks = lazy_import('keystoneauth1.session')
 
 LOG = log.getLogger(__name__)
 CONF = cfg.CONF
@@ -83,6 +88,23 @@ generator_opts = [
     cfg.IntOpt('timeout',
                default=60,
                help='Request timeout in seconds'),
+    cfg.IntOpt('pool_connections',
+               default=100,
+               min=1,
+               help='Number of per host connection pools kept by the HTTP '
+                    'session, should be at least the number of endpoints'),
+    cfg.IntOpt('pool_maxsize',
+               default=10,
+               min=1,
+               help='Maximum number of connections kept per host'),
+    cfg.StrOpt('capture_file',
+               help='(Optional) Append every telemetry response body to this '
+                    'capture file so it can be replayed later'),
+    cfg.IntOpt('token_expiry_margin',
+               default=300,
+               min=0,
+               help='Seconds before its expiry a cached keystone token is '
+                    'renewed'),
 ]
 
 CONF.register_opts(auth_opts, "keystone_authtoken")
@@ -102,16 +124,70 @@ class KeystoneClient(object):
                                  user_domain_id=configuration.user_domain_id,
                                  user_domain_name=configuration.user_domain_name)
         self.session = ks.Session(auth=auth)
+        self._expiry_margin = CONF.data_generator.token_expiry_margin
+        self._token = None
+        self._renew_at = 0
+        self._lock = threading.Lock()
 
     def get_token(self):
-        return self.session.get_token()
+        """Return a token, cached until shortly before it expires.
+
+        A token without expiry is cached until invalidated, once rejected.
+        """
+        if self._token is not None and time.time() < self._renew_at:
+            return self._token
+        with self._lock:
+            if self._token is not None and time.time() < self._renew_at:
+                return self._token
+            if self._token is not None:
+                # the auth plugin would hand out its cached token again
+                self.session.auth.invalidate()
+            access = self.session.auth.get_access(self.session)
+            if access.expires is None:
+                self._renew_at = float('inf')
+            else:
+                now = datetime.datetime.now(access.expires.tzinfo)
+                lifetime = (access.expires - now).total_seconds()
+                self._renew_at = time.time() + max(lifetime - self._expiry_margin, 0)
+            self._token = access.auth_token
+            return self._token
+
+    def invalidate(self, token):
+        """Renew token on next use, unless it was already renewed."""
+        with self._lock:
+            if token == self._token:
+                self._renew_at = 0
 
     def get_tenant_id(self):
         return self.session.get_project_id()
 
 
+def create_http_session():
+    """Create a requests session with a connection pool sized from CONF.
+
+    The session is shared by the clients of many endpoints, from several
+    threads. requests doesn't document sessions as thread safe, the
+    clients only send requests through it and never change its headers
+    or adapters, and the urllib3 connection pools it uses are thread safe.
+    """
+    session = requests.Session()
+    adapter = adapters.HTTPAdapter(pool_connections=CONF.data_generator.pool_connections,
+                                   pool_maxsize=CONF.data_generator.pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
 class TelemetryClient(object):
-    def __init__(self):
+    def __init__(self, endpoint_url=None, driver_type=None, http_session=None,
+                 keystone_client=None):
+        """Client of the telemetry API of one OpenSDS endpoint.
+
+        :param endpoint_url: defaults to [data_generator] opensds_endpoint
+        :param driver_type: defaults to [data_generator] opensds_backend_driver_type
+        :param http_session: requests session shared with other clients
+        :param keystone_client: KeystoneClient shared with other clients
+        """
         self.auth_strategy = CONF.data_generator.auth_strategy
         self.default_headers = {
             'User-Agent': "python-anomaly-detection-client",
@@ -119,12 +195,13 @@ class TelemetryClient(object):
         }
 
         self.tenant_id = CONF.data_generator.noauth_tenant_id
+        self.keystone_client = None
         if self.auth_strategy == "keystone":
-            self.keystone_client = KeystoneClient()
+            self.keystone_client = keystone_client or KeystoneClient()
             self.tenant_id = self.keystone_client.get_tenant_id()
 
         self.api_version = CONF.data_generator.api_version
-        self.endpoint_url = CONF.data_generator.opensds_endpoint
+        self.endpoint_url = endpoint_url or CONF.data_generator.opensds_endpoint
         pieces = [self.endpoint_url, self.api_version, self.tenant_id]
         self.base_url = '/'.join(s.strip('/') for s in pieces)+"/"
 
@@ -133,7 +210,11 @@ class TelemetryClient(object):
 
         self.request_options = self._set_request_options(
             CONF.data_generator.insecure, CONF.data_generator.timeout)
-        self.driver_type = CONF.data_generator.opensds_backend_driver_type
+        self.driver_type = driver_type or CONF.data_generator.opensds_backend_driver_type
+        self.http_session = http_session or create_http_session()
+        self._capture = None
+        if CONF.data_generator.capture_file:
+            self._capture = capture.get_writer(CONF.data_generator.capture_file)
 
     def _set_request_options(self, insecure, timeout=None):
         options = {'verify': True}
@@ -147,20 +228,30 @@ class TelemetryClient(object):
 
     def do_request(self, url, method, **kwargs):
         url = self.base_url+url
-        headers = copy.deepcopy(self.default_headers)
+        headers = dict(self.default_headers)
+        token = None
         if self.keystone_client is not None:
-            headers['X-Auth-Token'] = self.keystone_client.get_token()
+            token = headers['X-Auth-Token'] = self.keystone_client.get_token()
 
         headers.update(kwargs.get('headers', {}))
-        options = copy.deepcopy(self.request_options)
+        options = dict(self.request_options)
+        if kwargs.get('timeout') is not None:
+            options['timeout'] = min(options.get('timeout') or kwargs['timeout'],
+                                     kwargs['timeout'])
 
         if 'body' in kwargs:
             headers['Content-Type'] = 'application/json'
             options['data'] = json.dumps(kwargs['body'])
 
         self.log_request(method, url, headers, options.get('data', None))
-        resp = requests.request(method, url, headers=headers, **options)
+        resp = self.http_session.request(method, url, headers=headers, **options)
         self.log_response(resp)
+        if resp.status_code == 401 and token is not None:
+            # revoked or expired early, retried with a new token
+            self.keystone_client.invalidate(token)
+            resp.raise_for_status()
+        if self._capture is not None and resp.content:
+            self._capture.write(resp.content, capture.KIND_TELEMETRY)
         body = None
         if resp.text:
             try:
@@ -169,19 +260,25 @@ class TelemetryClient(object):
                 pass
         return resp, body
 
-    def request(self, url, method, **kwargs):
+    def request(self, url, method, timeout=None, **kwargs):
+        """Send a request, retried on failure.
+
+        :param timeout: seconds all the attempts may take, each attempt
+                        times out when none are left
+        """
+        deadline = time.time() + timeout if timeout else None
         retries = self.retries
         for index in range(1, retries + 1):
+            if deadline is not None:
+                kwargs['timeout'] = max(deadline - time.time(), 0.001)
             try:
-                self.do_request(url, method, **kwargs)
+                return self.do_request(url, method, **kwargs)
             except Exception as e:
-                if index > retries:
+                if index >= retries or (deadline is not None and time.time() >= deadline):
                     LOG.error('%s\nall retry failed, exit.', e)
                     raise
                 else:
                     LOG.error("%s ,retry %d time(s)", e, index)
-            else:
-                break
 
     def log_request(self, method, url, headers, data=None):
         if not self.http_log_debug:
@@ -207,6 +304,6 @@ class TelemetryClient(object):
                 'body': resp.text
             })
 
-    def collect_metrics(self):
+    def collect_metrics(self, timeout=None):
         body = {"driverType": self.driver_type}
-        self.request('metrics', "POST", body=body)
+        self.request('metrics', "POST", body=body, timeout=timeout)
@@ -11,18 +11,48 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
+import threading
+import time
+from concurrent import futures
 
 from anomaly_detection import log
+from anomaly_detection.data_generator.client import KeystoneClient
 from anomaly_detection.data_generator.client import TelemetryClient
+from anomaly_detection.data_generator.client import create_http_session
 from anomaly_detection.utils import config as cfg
 
 LOG = log.getLogger(__name__)
 CONF = cfg.CONF
 
 data_parser_opts = [
+    cfg.StrOpt('mode',
+               default='telemetry',
+               choices=['telemetry', 'synthetic'],
+               help='Collect metrics from the telemetry service, or write a '
+                    'synthetic workload as configured in [synthetic]'),
     cfg.StrOpt('cron_expression',
                default='*/10 * * * * *',
-               help='Cron expression')
+               help='Cron expression'),
+    cfg.ListOpt('backends',
+                default=[],
+                help='Backends to collect metrics from, each item is '
+                     '<driver type> or <driver type>@<OpenSDS endpoint URL>. '
+                     'Without an endpoint opensds_endpoint is used, if empty '
+                     'only opensds_backend_driver_type is collected'),
+    cfg.IntOpt('collect_concurrency',
+               default=32,
+               min=1,
+               help='Maximum number of backends collected concurrently'),
+    cfg.IntOpt('backend_timeout',
+               default=30,
+               min=1,
+               mutable=True,
+               help='Seconds the requests collecting a backend, retries '
+                    'included, may take before the collection fails. Runs do '
+                    'not wait for the collections, their results are '
+                    'reported by the next run and a backend still in flight '
+                    'is skipped')
 ]
 
 CONF.register_opts(data_parser_opts, "data_generator")
@@ -51,11 +81,95 @@ class Job(object):
                 break
 
 
+Backend = collections.namedtuple('Backend', ['driver_type', 'endpoint'])
+
+
+def parse_backends(values, default_endpoint, default_driver_type):
+    """Parse the [data_generator] backends items into Backend tuples."""
+    backends = []
+    for value in values or [default_driver_type]:
+        driver_type, _sep, endpoint = value.partition('@')
+        backends.append(Backend(driver_type.strip(), endpoint.strip() or default_endpoint))
+    return backends
+
+
 class CollectMetricsJob(Job):
+    """Collect metrics from all configured backends concurrently.
+
+    Backends are polled from a bounded thread pool sharing one HTTP
+    connection pool and one keystone token, so a slow backend only holds
+    its own worker. A run submits the collections and returns, the next
+    run reports their results so a slow backend never delays the schedule.
+    """
+
     def __init__(self):
-        super(CollectMetricsJob, self).__init__("collect_metrics")
-        self._client = TelemetryClient()
+        # retries are done per backend by the telemetry client
+        super(CollectMetricsJob, self).__init__("collect_metrics", retries=1)
         self.expression = CONF.data_generator.cron_expression
 
+        http_session = create_http_session()
+        keystone_client = None
+        if CONF.data_generator.auth_strategy == "keystone":
+            keystone_client = KeystoneClient()
+        backends = parse_backends(CONF.data_generator.backends,
+                                  CONF.data_generator.opensds_endpoint,
+                                  CONF.data_generator.opensds_backend_driver_type)
+        self._clients = [TelemetryClient(endpoint_url=backend.endpoint,
+                                         driver_type=backend.driver_type,
+                                         http_session=http_session,
+                                         keystone_client=keystone_client)
+                         for backend in backends]
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=min(CONF.data_generator.collect_concurrency, len(self._clients)))
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        # future -> (backend, submit time) of the collections not reported yet
+        self._pending = {}
+        self._timed_out = set()
+
+    def _collect(self, backend, client, timeout):
+        try:
+            client.collect_metrics(timeout=timeout)
+        finally:
+            with self._lock:
+                self._in_flight.discard(backend)
+
+    def _report(self, now, timeout):
+        """Report the collections submitted by the previous runs."""
+        collected = failed = 0
+        for future, (backend, submitted_at) in list(self._pending.items()):
+            if not future.done():
+                # the requests time out, only a stuck client gets here
+                if now - submitted_at > timeout and future not in self._timed_out:
+                    self._timed_out.add(future)
+                    LOG.warning("collecting metrics of backend %s at %s still runs after %ds",
+                                backend.driver_type, backend.endpoint, timeout)
+                continue
+            del self._pending[future]
+            self._timed_out.discard(future)
+            if future.exception() is not None:
+                failed += 1
+                LOG.error("collecting metrics of backend %s at %s failed: %s",
+                          backend.driver_type, backend.endpoint, future.exception())
+            else:
+                collected += 1
+        return collected, failed
+
     def run(self, *args, **kwargs):
-        self._client.collect_metrics()
+        now = time.time()
+        timeout = CONF.snapshot('data_generator').backend_timeout
+        collected, failed = self._report(now, timeout)
+        submitted = 0
+        for client in self._clients:
+            backend = Backend(client.driver_type, client.endpoint_url)
+            with self._lock:
+                if backend in self._in_flight:
+                    LOG.warning("backend %s at %s is still being collected, skip it",
+                                backend.driver_type, backend.endpoint)
+                    continue
+                self._in_flight.add(backend)
+            future = self._executor.submit(self._collect, backend, client, timeout)
+            self._pending[future] = (backend, now)
+            submitted += 1
+        LOG.debug("collected metrics of %d backends, %d failed, submitted %d/%d",
+                  collected, failed, submitted, len(self._clients))
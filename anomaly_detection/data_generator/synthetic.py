@@ -0,0 +1,346 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Synthetic telemetry workload.
+
+Produces iops/latency series with a daily seasonality, multiplicative
+noise and injected anomalies labeled in ``ground_truth``, and writes them
+at a target rate to a CSV file, to Kafka, to a capture file which the data
+parser can replay in place of Kafka, or straight to the database.
+"""
+import datetime
+import json
+import time
+
+import numpy as np
+
+from anomaly_detection import log
+from anomaly_detection.context import get_admin_context
+from anomaly_detection.db import base
+from anomaly_detection.utils import capture
+from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import lazy_import
+
+kafka = lazy_import('kafka')
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+ANOMALY_TYPES = ['spike', 'latency_degradation', 'level_shift', 'outage']
+
+synthetic_opts = [
+    cfg.StrOpt('sink',
+               default='csv',
+               choices=['csv', 'kafka', 'capture', 'database'],
+               help='Where the synthetic workload is written to'),
+    cfg.StrOpt('csv_file_name',
+               default='synthetic.csv',
+               help='Output file of the csv sink'),
+    cfg.StrOpt('capture_file',
+               default='synthetic.cap',
+               help='Output file of the capture sink'),
+    cfg.IntOpt('rows',
+               default=100000,
+               min=1,
+               help='Number of samples to generate'),
+    cfg.IntOpt('rate',
+               default=0,
+               min=0,
+               mutable=True,
+               help='Target write rate in samples per second, 0 writes as '
+                    'fast as the sink accepts'),
+    cfg.IntOpt('batch_size',
+               default=1000,
+               min=1,
+               help='Number of samples generated and written at once'),
+    cfg.IntOpt('interval',
+               default=10,
+               min=1,
+               help='Seconds between two samples of the series'),
+    cfg.IntOpt('iops_mean',
+               default=1200,
+               help='Mean iops of the series'),
+    cfg.IntOpt('latency_mean',
+               default=180,
+               help='Mean latency of the series in microseconds'),
+    cfg.FloatOpt('noise',
+                 default=0.1,
+                 min=0,
+                 help='Standard deviation of the multiplicative noise'),
+    cfg.IntOpt('seasonality_period',
+               default=86400,
+               min=1,
+               help='Period of the seasonality in seconds'),
+    cfg.FloatOpt('seasonality_amplitude',
+                 default=0.3,
+                 min=0,
+                 max=1,
+                 help='Relative amplitude of the seasonality'),
+    cfg.FloatOpt('anomaly_rate',
+                 default=0.0005,
+                 min=0,
+                 max=1,
+                 help='Probability of an anomaly starting at any sample'),
+    cfg.ListOpt('anomaly_types',
+                default=ANOMALY_TYPES,
+                help='Anomaly types to inject, any of %s' % ', '.join(ANOMALY_TYPES)),
+    cfg.IntOpt('seed',
+               help='Random seed, a random one is used if unset'),
+]
+
+CONF.register_opts(synthetic_opts, "synthetic")
+
+
+class SyntheticWorkload(object):
+    """Generator of labeled iops/latency samples.
+
+    Samples are produced in blocks of column arrays: ``time`` (seconds
+    since the epoch), ``iops``, ``latency`` and ``ground_truth``. An
+    anomaly started near the end of a block continues in the next one.
+    """
+
+    # (min duration, max duration) in samples per anomaly type
+    DURATIONS = {
+        'spike': (1, 3),
+        'latency_degradation': (5, 30),
+        'level_shift': (20, 120),
+        'outage': (3, 15),
+    }
+
+    def __init__(self, iops_mean=1200, latency_mean=180, noise=0.1,
+                 seasonality_period=86400, seasonality_amplitude=0.3,
+                 anomaly_rate=0.0005, anomaly_types=None, interval=10,
+                 start_time=None, seed=None):
+        for typ in anomaly_types or []:
+            if typ not in self.DURATIONS:
+                raise ValueError('Unknown anomaly type %s' % typ)
+        self.iops_mean = iops_mean
+        self.latency_mean = latency_mean
+        self.noise = noise
+        self.period = seasonality_period
+        self.amplitude = seasonality_amplitude
+        self.anomaly_rate = anomaly_rate
+        self.anomaly_types = list(anomaly_types or ANOMALY_TYPES)
+        self.interval = interval
+        self.start_time = time.time() if start_time is None else start_time
+        self._rng = np.random.RandomState(seed)
+        self._index = 0
+        # anomaly which didn't end in the previous block: (type, remaining samples)
+        self._pending = None
+
+    @classmethod
+    def from_config(cls, conf, start_time=None):
+        return cls(iops_mean=conf.iops_mean,
+                   latency_mean=conf.latency_mean,
+                   noise=conf.noise,
+                   seasonality_period=conf.seasonality_period,
+                   seasonality_amplitude=conf.seasonality_amplitude,
+                   anomaly_rate=conf.anomaly_rate,
+                   anomaly_types=conf.anomaly_types,
+                   interval=conf.interval,
+                   start_time=start_time,
+                   seed=conf.seed)
+
+    def _inject(self, typ, iops, latency, truth, start, stop):
+        window = slice(start, stop)
+        if typ == 'spike':
+            iops[window] *= self._rng.uniform(3, 6)
+            latency[window] *= self._rng.uniform(2, 4)
+        elif typ == 'latency_degradation':
+            latency[window] *= self._rng.uniform(3, 8)
+        elif typ == 'level_shift':
+            iops[window] *= self._rng.uniform(0.2, 0.5)
+            latency[window] *= self._rng.uniform(1.5, 2.5)
+        elif typ == 'outage':
+            iops[window] *= self._rng.uniform(0, 0.05)
+            latency[window] *= self._rng.uniform(10, 20)
+        truth[window] = 1
+
+    def block(self, size):
+        t = self.start_time + (self._index + np.arange(size)) * float(self.interval)
+        season = self.amplitude * np.sin(2 * np.pi * (t % self.period) / self.period)
+        # latency follows the load with a dampened seasonality
+        iops = self.iops_mean * (1 + season) * (1 + self.noise * self._rng.standard_normal(size))
+        latency = self.latency_mean * (1 + season / 2) * \
+            np.exp(self.noise * self._rng.standard_normal(size))
+        truth = np.zeros(size, dtype=np.int64)
+
+        position = 0
+        if self._pending is not None:
+            typ, remaining = self._pending
+            stop = min(remaining, size)
+            self._inject(typ, iops, latency, truth, 0, stop)
+            position = stop
+            self._pending = (typ, remaining - stop) if remaining > stop else None
+
+        if self.anomaly_types and self.anomaly_rate:
+            starts = np.flatnonzero(self._rng.random_sample(size) < self.anomaly_rate)
+            for start in starts:
+                if start < position:
+                    continue
+                typ = self.anomaly_types[self._rng.randint(len(self.anomaly_types))]
+                low, high = self.DURATIONS[typ]
+                duration = self._rng.randint(low, high + 1)
+                stop = min(start + duration, size)
+                self._inject(typ, iops, latency, truth, start, stop)
+                position = stop
+                if start + duration > size:
+                    self._pending = (typ, start + duration - size)
+
+        self._index += size
+        return {
+            'time': t,
+            'iops': np.rint(np.maximum(iops, 0)).astype(np.int64),
+            'latency': np.rint(np.maximum(latency, 1)).astype(np.int64),
+            'ground_truth': truth,
+        }
+
+    def blocks(self, rows, block_size=1000):
+        while rows > 0:
+            size = min(rows, block_size)
+            yield self.block(size)
+            rows -= size
+
+
+class Sink(object):
+    def write(self, block):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CSVSink(Sink):
+    """Writes samples in the layout of ml/csv/performance.csv plus a time column."""
+
+    def __init__(self, file_name):
+        self._file = open(file_name, 'w')
+        self._file.write('iops,latency,ground_truth,time\n')
+
+    def write(self, block):
+        data = np.column_stack([block['iops'], block['latency'],
+                                block['ground_truth'], block['time']])
+        np.savetxt(self._file, data, delimiter=',', fmt=['%d', '%d', '%d', '%.3f'])
+
+    def close(self):
+        self._file.close()
+
+
+def _messages(block):
+    """Yield (timestamp, JSON message) of every sample, as consumed by the data parser."""
+    for iops, latency, truth, ts in zip(block['iops'].tolist(), block['latency'].tolist(),
+                                        block['ground_truth'].tolist(), block['time'].tolist()):
+        yield ts, json.dumps({'iops': iops, 'latency': latency,
+                              'ground_truth': truth, 'time': ts}).encode('utf-8')
+
+
+class KafkaSink(Sink):
+    def __init__(self, topic, bootstrap_servers):
+        self._topic = topic
+        self._producer = kafka.KafkaProducer(bootstrap_servers=bootstrap_servers)
+
+    def write(self, block):
+        for _ts, value in _messages(block):
+            self._producer.send(self._topic, value)
+
+    def close(self):
+        self._producer.flush()
+        self._producer.close()
+
+
+class CaptureSink(Sink):
+    """Writes the kafka messages to a capture file, stamped with the sample time."""
+
+    def __init__(self, file_name):
+        self._writer = capture.CaptureWriter(file_name)
+
+    def write(self, block):
+        for ts, value in _messages(block):
+            self._writer.write(value, capture.KIND_KAFKA, ts)
+
+    def close(self):
+        self._writer.close()
+
+
+class DBSink(Sink, base.Base):
+    def __init__(self):
+        super(DBSink, self).__init__()
+        self._ctx = get_admin_context()
+
+    def write(self, block):
+        values = [{'iops': iops, 'latency': latency, 'ground_truth': truth,
+                   'time': datetime.datetime.utcfromtimestamp(ts)}
+                  for iops, latency, truth, ts in zip(block['iops'].tolist(),
+                                                      block['latency'].tolist(),
+                                                      block['ground_truth'].tolist(),
+                                                      block['time'].tolist())]
+        self.db.performance_create_all(self._ctx, values)
+
+
+def create_sink(name):
+    if name == 'kafka':
+        return KafkaSink(CONF.data_parser.kafka_topic,
+                         CONF.data_parser.kafka_bootstrap_servers)
+    if name == 'capture':
+        return CaptureSink(CONF.synthetic.capture_file)
+    if name == 'database':
+        return DBSink()
+    return CSVSink(CONF.synthetic.csv_file_name)
+
+
+class SyntheticGenerator(object):
+    """Writes a synthetic workload to a sink at a target rate."""
+
+    def __init__(self, workload=None, sink=None):
+        conf = CONF.synthetic
+        self._rows = conf.rows
+        self._rate = conf.rate
+        self._batch_size = conf.batch_size
+        if workload is None:
+            # end the series now so the samples look like recent history
+            start_time = time.time() - conf.rows * conf.interval
+            workload = SyntheticWorkload.from_config(conf, start_time=start_time)
+        self._workload = workload
+        self._sink = sink or create_sink(conf.sink)
+
+    def run(self):
+        LOG.info("Writing %d synthetic samples", self._rows)
+        start = time.time()
+        written = 0
+        anomalies = 0
+        # the rate may be changed by a config reload, it is paced from the
+        # time of the last change
+        paced_since, paced = start, 0
+        try:
+            for block in self._workload.blocks(self._rows, self._batch_size):
+                self._sink.write(block)
+                count = len(block['time'])
+                written += count
+                anomalies += int(block['ground_truth'].sum())
+                rate = CONF.snapshot('synthetic').rate
+                if rate != self._rate:
+                    LOG.info("Write rate changed from %d to %d samples/s", self._rate, rate)
+                    self._rate = rate
+                    paced_since, paced = time.time(), 0
+                    continue
+                paced += count
+                if self._rate:
+                    idle_for = paced_since + float(paced) / self._rate - time.time()
+                    if idle_for > 0:
+                        time.sleep(idle_for)
+        finally:
+            self._sink.close()
+        elapsed = time.time() - start
+        LOG.info("Wrote %d samples (%d anomalous) in %.2fs, %.0f samples/s",
+                 written, anomalies, elapsed, written / elapsed if elapsed else 0)
+        return written
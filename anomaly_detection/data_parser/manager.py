@@ -12,17 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
 import functools
 import time
 import json
 
 from anomaly_detection import log
+from anomaly_detection import watchdog
 from anomaly_detection.context import get_admin_context
+from anomaly_detection.db import api as db_api
 from anomaly_detection.db import base
 from anomaly_detection.exception import LoopingCallDone
 from anomaly_detection.ml import csv
+from anomaly_detection.utils import capture
 from anomaly_detection.utils import config as cfg
-from kafka import KafkaConsumer
+from anomaly_detection.utils import lazy_import
+
+kafka = lazy_import('kafka')
 
 LOG = log.getLogger(__name__)
 CONF = cfg.CONF
@@ -40,12 +46,52 @@ data_parser_opts = [
                help='kafka topic'),
     cfg.IntOpt('kafka_retry_num',
                default=3,
-               help='kafka retry num')
+               help='kafka retry num'),
+    cfg.StrOpt('capture_file',
+               help='(Optional) Append every received kafka message to this '
+                    'capture file so it can be replayed later'),
+    cfg.StrOpt('replay_file',
+               help='Capture file fed to the pipeline by the replay receiver'),
+    cfg.FloatOpt('replay_speed',
+                 default=1.0,
+                 min=0,
+                 help='Replay speed relative to the captured timestamps, '
+                      '0 replays as fast as possible'),
+    cfg.ListOpt('rollups',
+                default=sorted(db_api.ROLLUP_RESOLUTIONS),
+                item_type=cfg.String(choices=sorted(db_api.ROLLUP_RESOLUTIONS)),
+                help='Rollups of the received performance data to maintain, '
+                     'per minute and per hour aggregates long trainings can '
+                     'read instead of the raw rows. Empty disables them'),
+    cfg.IntOpt('rollup_batch_size',
+               default=1000,
+               min=1,
+               help='Received rows buffered before being merged into the '
+                    'rollups in one transaction'),
+    cfg.FloatOpt('rollup_flush_interval',
+                 default=10.0,
+                 min=0,
+                 help='Seconds after which the buffered rows are merged into '
+                      'the rollups even if fewer than rollup_batch_size were '
+                      'received')
 ]
 
 CONF.register_opts(data_parser_opts, "data_parser")
 
 
+def to_performance_values(perf):
+    """Convert a decoded telemetry message to performance column values.
+
+    The metrics of a resource without an explicit series_id are one series.
+    """
+    timestamp = perf.get('time')
+    if isinstance(timestamp, (int, float)):
+        perf['time'] = datetime.datetime.utcfromtimestamp(timestamp)
+    if perf.get('series_id') is None and perf.get('resource_id') is not None:
+        perf['series_id'] = perf['resource_id']
+    return perf
+
+
 class LoopingCall(object):
     def __init__(self, interval=60, raise_on_error=False):
         self._interval = interval
@@ -75,12 +121,75 @@ class DataReceiver(base.Base):
     def __init__(self, name):
         super(DataReceiver, self).__init__()
         self._name = name
+        self._rollup_buffer = []
+        self._rollup_flushed = time.time()
 
     def run(self):
         raise NotImplemented
 
+    def handle_message(self, value):
+        """Decode one raw telemetry message and store its performance data."""
+        with watchdog.watch('ingestion', '%s message' % self._name):
+            data = json.loads(value)
+            perfs = data if isinstance(data, list) else [data]
+            ctx = get_admin_context()
+            stored = []
+            for perf in perfs:
+                if not isinstance(perf, dict) or 'iops' not in perf:
+                    LOG.debug("skip message without performance data: %s", perf)
+                    continue
+                perf = to_performance_values(perf)
+                LOG.debug("receive performance data:%s", perf)
+                self.db.performance_create(ctx, perf)
+                stored.append(perf)
+            self.update_rollups(ctx, stored)
+
+    def update_rollups(self, ctx, perfs):
+        """Buffer stored performance data for the configured rollups.
+
+        The buffer is merged once it holds rollup_batch_size rows or
+        rollup_flush_interval seconds after the last merge, so the bucket
+        rows shared by all writers are locked once per batch.
+        """
+        conf = CONF.snapshot('data_parser')
+        if not conf.rollups:
+            return
+        self._rollup_buffer.extend(perfs)
+        if len(self._rollup_buffer) >= conf.rollup_batch_size:
+            self.flush_rollups(ctx)
+        else:
+            self.flush_rollups_if_due(ctx)
+
+    def flush_rollups_if_due(self, ctx=None):
+        """Merge the buffered rows once rollup_flush_interval has passed.
+
+        Receivers also call it while no message arrives, so a quiet stream
+        does not hold back the rollups of the rows it already received.
+        """
+        interval = CONF.data_parser.rollup_flush_interval
+        if self._rollup_buffer and time.time() - self._rollup_flushed >= interval:
+            self.flush_rollups(ctx)
+
+    def flush_rollups(self, ctx=None):
+        """Merge the buffered performance data into the rollups."""
+        perfs, self._rollup_buffer = self._rollup_buffer, []
+        self._rollup_flushed = time.time()
+        resolutions = [db_api.ROLLUP_RESOLUTIONS[name]
+                       for name in CONF.snapshot('data_parser').rollups]
+        if not resolutions or not perfs:
+            return
+        try:
+            self.db.performance_rollup_add(ctx or get_admin_context(), perfs,
+                                           resolutions=resolutions)
+        except Exception:
+            # the rows are stored already, only their rollups are lost
+            LOG.exception("failed to merge %d rows into the rollups", len(perfs))
+
 
 class CSVDataReceiver(DataReceiver):
+    # rows read from the file at a time, the file is never loaded whole
+    chunk_rows = 10000
+
     def __init__(self):
         super(CSVDataReceiver, self).__init__(name="csv")
         self.once = False
@@ -88,33 +197,52 @@ class CSVDataReceiver(DataReceiver):
 
     def run(self):
         LOG.info("CSV Data Receiver running ...")
-        perf_array = csv.read(self.csv_file)
-        LOG.info("Starting to write %s items to database", perf_array.shape[0])
-        for perf in perf_array:
-            perf_dict = {
-                'iops': perf[0],
-                'latency': perf[1],
-                'ground_truth': perf[2]
-            }
-            ctx = get_admin_context()
-            self.db.performance_create(ctx, perf_dict)
-        LOG.info("Writing to database is done")
+        ctx = get_admin_context()
+        count = 0
+        with watchdog.watch('ingestion', self.csv_file):
+            for perf_array in csv.iter_read(self.csv_file, chunk_rows=self.chunk_rows):
+                for perf in perf_array:
+                    perf_dict = {
+                        'iops': perf[0],
+                        'latency': perf[1],
+                        'ground_truth': perf[2]
+                    }
+                    self.db.performance_create(ctx, perf_dict)
+                    self.update_rollups(ctx, [perf_dict])
+                count += len(perf_array)
+            self.flush_rollups(ctx)
+        LOG.info("Writing %d items to database is done", count)
 
 
 class KafkaDataReceiver(DataReceiver):
     def __init__(self):
         super(KafkaDataReceiver, self).__init__(name="kafka")
+        self._capture = None
+        if CONF.data_parser.capture_file:
+            self._capture = capture.get_writer(CONF.data_parser.capture_file)
 
     def consume(self):
-        consumer = KafkaConsumer(CONF.data_parser.kafka_topic,
-                                 bootstrap_servers=CONF.data_parser.kafka_bootstrap_servers)
-        for msg in consumer:
-            perf = json.loads(msg.value)
-            LOG.info("receive performance data:%s", perf)
-            ctx = get_admin_context()
-            self.db.performance_create(ctx, perf)
+        consumer = kafka.KafkaConsumer(CONF.data_parser.kafka_topic,
+                                       bootstrap_servers=CONF.data_parser.kafka_bootstrap_servers)
+        # poll instead of iterating so the rollups are flushed while idle
+        timeout_ms = max(int(CONF.data_parser.rollup_flush_interval * 1000), 100)
+        while True:
+            batches = consumer.poll(timeout_ms=timeout_ms)
+            for records in batches.values():
+                for msg in records:
+                    if self._capture is not None:
+                        # kafka timestamps are in milliseconds
+                        self._capture.write(msg.value, capture.KIND_KAFKA, msg.timestamp / 1000.0)
+                    self.handle_message(msg.value)
+            self.flush_rollups_if_due()
 
     def run(self):
+        try:
+            self._run()
+        finally:
+            self.flush_rollups()
+
+    def _run(self):
         retry = CONF.data_parser.kafka_retry_num
         for index in range(1, retry+1):
             try:
@@ -132,11 +260,49 @@ class KafkaDataReceiver(DataReceiver):
                 break
 
 
+class ReplayDataReceiver(DataReceiver):
+    """Feeds a capture file to the pipeline without a broker.
+
+    Messages are paced by their captured timestamps divided by the replay
+    speed, a speed of 0 feeds them as fast as possible.
+    """
+
+    def __init__(self, replay_file=None, speed=None):
+        super(ReplayDataReceiver, self).__init__(name="replay")
+        self.replay_file = replay_file or CONF.data_parser.replay_file
+        self.speed = CONF.data_parser.replay_speed if speed is None else speed
+
+    def run(self):
+        LOG.info("Replaying %s at speed %s ...", self.replay_file, self.speed or 'max')
+        count = 0
+        first = None
+        start = time.time()
+        for timestamp, _kind, payload in capture.CaptureReader(self.replay_file):
+            if self.speed:
+                if first is None:
+                    first = timestamp
+                idle_for = start + (timestamp - first) / self.speed - time.time()
+                if idle_for > 0:
+                    self.flush_rollups_if_due()
+                    time.sleep(idle_for)
+            try:
+                self.handle_message(payload)
+            except ValueError as e:
+                LOG.warning("skip undecodable message: %s", e)
+            count += 1
+        self.flush_rollups()
+        elapsed = time.time() - start
+        LOG.info("Replayed %d messages in %.2fs", count, elapsed)
+        return count
+
+
 class Manager(base.Base):
     def __init__(self, receiver_name):
         super(Manager, self).__init__()
         if receiver_name == 'csv':
             self._receiver = CSVDataReceiver()
+        elif receiver_name == 'replay':
+            self._receiver = ReplayDataReceiver()
         else:
             self._receiver = KafkaDataReceiver()
 
@@ -15,6 +15,7 @@ import threading
 
 from anomaly_detection.utils import config as cfg
 from anomaly_detection import log
+from anomaly_detection import metrics
 from anomaly_detection import utils
 
 LOG = log.getLogger(__name__)
@@ -27,10 +28,107 @@ db_opts = [
     cfg.StrOpt('connection',
                help='The SQLAlchemy connection string to use to connect to '
                     'the database.',
-               secret=True)
+               secret=True),
+    cfg.StrOpt('slave_connection',
+               help='The SQLAlchemy connection string of a read replica. '
+                    'Listings and training dataset scans read from it, '
+                    'they use the primary database if it is not set.',
+               secret=True),
+    cfg.IntOpt('max_pool_size',
+               default=5,
+               min=1,
+               help='Maximum number of connections kept open in the pool.'),
+    cfg.IntOpt('max_overflow',
+               default=10,
+               min=0,
+               help='Connections opened on top of max_pool_size under load, '
+                    'they are closed when returned.'),
+    cfg.IntOpt('pool_timeout',
+               default=30,
+               min=1,
+               help='Seconds to wait for a connection of the pool.'),
+    cfg.BoolOpt('pool_pre_ping',
+                default=False,
+                help='Test pooled connections before using them, connections '
+                     'dropped by the server are replaced transparently.'),
+    cfg.IntOpt('connection_recycle_time',
+               default=3600,
+               help='Connections older than this many seconds are replaced '
+                    'when taken from the pool, -1 disables it.'),
+    cfg.StrOpt('performance_schema',
+               default='uuid',
+               choices=[('uuid', 'Rows keyed by a random UUID string.'),
+                        ('compact', 'Rows keyed by an autoincrement integer, '
+                                    'appended in insertion order, without '
+                                    'deletion and update times. Existing '
+                                    'rows are copied by manage db '
+                                    'migrate_performance.')],
+               help='Schema of the performance table.'),
+    cfg.IntOpt('performance_retention_days',
+               default=0,
+               min=0,
+               help='Performance rows older than this many days are deleted '
+                    'by manage db purge, 0 keeps them forever.'),
+    cfg.IntOpt('purge_batch_size',
+               default=10000,
+               min=1,
+               help='Rows deleted per transaction by manage db purge.'),
+    cfg.StrOpt('row_count_strategy',
+               default='query',
+               choices=[('query', 'Run a COUNT query, exact but it scans '
+                                  'the table.'),
+                        ('counter', 'Read the row counters maintained by the '
+                                    'create and delete calls. Every write '
+                                    'then updates a row shared by all '
+                                    'writers. Counters are approximate: the '
+                                    'rows written while a counter is seeded '
+                                    'on first read may be missed until '
+                                    'manage db recount.'),
+                        ('estimate', 'Read the table statistics of MySQL and '
+                                     'PostgreSQL for the rows of all tenants, '
+                                     'they are approximate and include soft '
+                                     'deleted rows. A COUNT query is run '
+                                     'otherwise.')],
+               help='How the rows of a table are counted. Counters are only '
+                    'maintained with counter, run manage db recount after '
+                    'switching to it on an existing database.'),
+    cfg.IntOpt('fetch_size',
+               default=10000,
+               min=1,
+               help='Rows fetched at a time by the streaming dataset scans.'),
+    cfg.StrOpt('sqlite_journal_mode',
+               default='WAL',
+               choices=['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL'],
+               ignore_case=True,
+               help='Journal mode of SQLite databases. WAL lets reads run '
+                    'concurrently with a write and needs one fsync per commit.'),
+    cfg.StrOpt('sqlite_synchronous',
+               default='NORMAL',
+               choices=['OFF', 'NORMAL', 'FULL'],
+               ignore_case=True,
+               help='SQLite synchronous pragma. NORMAL in WAL mode may lose '
+                    'the last commits on power loss, never corrupts the '
+                    'database.'),
+    cfg.IntOpt('sqlite_cache_size',
+               default=64 * 1024,
+               min=0,
+               help='Page cache size of every SQLite connection in KiB, 0 '
+                    'keeps the SQLite default.'),
+    cfg.IntOpt('sqlite_mmap_size',
+               default=256 * 1024 * 1024,
+               min=0,
+               help='Bytes of SQLite databases read through memory mapped '
+                    'I/O, 0 disables it.'),
 ]
 CONF.register_opts(db_opts, group='database')
 
+# rollup name -> seconds of its time buckets
+ROLLUP_RESOLUTIONS = {'minute': 60, 'hour': 3600}
+
+DB_CALL_SECONDS = metrics.histogram('anomaly_detection_db_call_duration_seconds',
+                                    'Time spent in the database API calls',
+                                    ['call'])
+
 
 class DBAPI(object):
     """Initialize the chosen DB API backend.
@@ -60,7 +158,12 @@ class DBAPI(object):
     def __getattr__(self, key):
         if not self._backend:
             self._load_backend()
-        return getattr(self._backend, key)
+        attr = getattr(self._backend, key)
+        if callable(attr):
+            attr = metrics.timed(DB_CALL_SECONDS, (key,))(attr)
+            # cache the wrapper, __getattr__ is only called for missing attributes
+            setattr(self, key, attr)
+        return attr
 
     @classmethod
     def from_config(cls, conf, backend_mapping=None, lazy=False):
@@ -89,18 +192,28 @@ def training_get(context, training_id):
     return IMPL.training_get(context, training_id)
 
 
-def training_get_all(context):
-    return IMPL.training_get_all(context)
+def training_get_version(context, training_id):
+    return IMPL.training_get_version(context, training_id)
+
 
+def training_get_all(context, limit=None, offset=None,
+                     sort_keys=None, sort_dirs=None):
+    return IMPL.training_get_all(context, limit=limit, offset=offset,
+                                 sort_keys=sort_keys, sort_dirs=sort_dirs)
 
-def training_get_all_by_tenant(context, tenant_id):
-    return IMPL.training_get_all_by_tenant(context, tenant_id)
+
+def training_get_all_by_tenant(context, tenant_id, use_slave=False):
+    return IMPL.training_get_all_by_tenant(context, tenant_id, use_slave=use_slave)
 
 
 def performance_create(context, performance_values):
     return IMPL.performance_create(context, performance_values)
 
 
+def performance_create_all(context, performance_values):
+    return IMPL.performance_create_all(context, performance_values)
+
+
 def performance_delete(context, performance_id):
     return IMPL.performance_delete(context, performance_id)
 
@@ -110,13 +223,54 @@ def performance_get(context, performance_id):
 
 
 def performance_get_all(context, fields=None, limit=None, offset=None,
-                        sort_keys=None, sort_dirs=None):
+                        sort_keys=None, sort_dirs=None, use_slave=False):
     return IMPL.performance_get_all(context, fields=fields, limit=limit, offset=offset,
-                                    sort_keys=sort_keys, sort_dirs=sort_dirs)
+                                    sort_keys=sort_keys, sort_dirs=sort_dirs,
+                                    use_slave=use_slave)
+
+
+def performance_iter_columns(context, columns=('iops', 'latency', 'ground_truth'),
+                             limit=None, offset=None, fetch_size=None, use_slave=False,
+                             series_id=None):
+    return IMPL.performance_iter_columns(context, columns=columns, limit=limit,
+                                         offset=offset, fetch_size=fetch_size,
+                                         use_slave=use_slave, series_id=series_id)
+
+
+def performance_iter_series(context, columns=('iops', 'latency', 'ground_truth'),
+                            limit=None, offset=None, fetch_size=None, use_slave=False):
+    return IMPL.performance_iter_series(context, columns=columns, limit=limit,
+                                        offset=offset, fetch_size=fetch_size,
+                                        use_slave=use_slave)
+
+
+def performance_rollup_add(context, performance_values, resolutions=(60, 3600)):
+    return IMPL.performance_rollup_add(context, performance_values, resolutions=resolutions)
+
+
+def performance_rollup_iter_columns(context, resolution,
+                                    columns=('iops_mean', 'latency_mean', 'anomalies'),
+                                    limit=None, offset=None, fetch_size=None,
+                                    use_slave=False):
+    return IMPL.performance_rollup_iter_columns(context, resolution, columns=columns,
+                                                limit=limit, offset=offset,
+                                                fetch_size=fetch_size, use_slave=use_slave)
+
+
+def performance_get_count(context, use_slave=False):
+    return IMPL.performance_get_count(context, use_slave=use_slave)
+
+
+def reset_row_counters():
+    return IMPL.reset_row_counters()
+
+
+def purge_performance(before=None, batch_size=10000):
+    return IMPL.purge_performance(before=before, batch_size=batch_size)
 
 
-def performance_get_count(context):
-    return IMPL.performance_get_count(context)
+def migrate_performance(batch_size=10000):
+    return IMPL.migrate_performance(batch_size=batch_size)
 
 
 def init_db():
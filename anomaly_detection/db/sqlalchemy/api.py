@@ -13,32 +13,74 @@
 # limitations under the License.
 
 import copy
+import datetime
+import itertools
 import sys
 import warnings
 from functools import wraps
 
 import sqlalchemy.orm
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import pool
+from sqlalchemy import text
+from sqlalchemy.engine import url as sa_url
 from sqlalchemy.orm import load_only
 from sqlalchemy.sql import func
 
 from anomaly_detection import exception
+from anomaly_detection import log
 from anomaly_detection.db.sqlalchemy import models
 from anomaly_detection.utils import uuidutils, config as cfg
+from anomaly_detection.utils import lazy_import
+
+np = lazy_import('numpy')
 
 CONF = cfg.CONF
+LOG = log.getLogger(__name__)
 
 
 class Session(sqlalchemy.orm.session.Session):
     """Custom Session class to avoid SqlAlchemy Session monkey patching."""
 
 
+def _is_sqlite_file(url):
+    return url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:')
+
+
+def _set_sqlite_pragmas(journal_mode=None, synchronous=None, cache_size=0, mmap_size=0):
+    """Return a connect listener setting the pragmas of SQLite connections."""
+    pragmas = []
+    if journal_mode:
+        pragmas.append('PRAGMA journal_mode=%s' % journal_mode.upper())
+    if synchronous:
+        pragmas.append('PRAGMA synchronous=%s' % synchronous.upper())
+    if cache_size:
+        # a negative cache size is in KiB
+        pragmas.append('PRAGMA cache_size=-%d' % cache_size)
+    if mmap_size:
+        pragmas.append('PRAGMA mmap_size=%d' % mmap_size)
+
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+    return _on_connect
+
+
 class EngineFacade(object):
     def __init__(self, sql_connection, slave_connection=None, autocommit=True,
                  expire_on_commit=False, _conf=None, _factory=None, **kwargs):
 
-        engine_kwargs = {
-            'idle_timeout': kwargs.get('idle_timeout', 3600),
-        }
+        engine_kwargs = dict((key, kwargs[key]) for key in
+                             ('idle_timeout', 'max_pool_size', 'max_overflow',
+                              'pool_timeout', 'pool_pre_ping', 'sqlite_journal_mode',
+                              'sqlite_synchronous', 'sqlite_cache_size',
+                              'sqlite_mmap_size')
+                             if key in kwargs)
 
         maker_kwargs = {
             'autocommit': autocommit,
@@ -47,19 +89,39 @@ class EngineFacade(object):
         self._engine = self._create_engine(sql_connection=sql_connection, **engine_kwargs)
         self._session_maker = self._get_maker(engine=self._engine, **maker_kwargs)
         if slave_connection:
-            self._slave_engine = self._create_engine(sql_connection=sql_connection, **engine_kwargs)
-            self._slave_session_maker = self._get_maker(engine=self._engine, **maker_kwargs)
+            self._slave_engine = self._create_engine(sql_connection=slave_connection,
+                                                     **engine_kwargs)
+            self._slave_session_maker = self._get_maker(engine=self._slave_engine,
+                                                        **maker_kwargs)
         else:
             self._slave_engine = None
             self._slave_session_maker = None
 
     @staticmethod
-    def _create_engine(sql_connection, idle_timeout=3600):
+    def _create_engine(sql_connection, idle_timeout=3600, max_pool_size=5,
+                       max_overflow=10, pool_timeout=30, pool_pre_ping=False,
+                       sqlite_journal_mode='WAL', sqlite_synchronous='NORMAL',
+                       sqlite_cache_size=0, sqlite_mmap_size=0):
+        url = sa_url.make_url(sql_connection)
         engine_args = {
-            "pool_recycle": idle_timeout,
-            'convert_unicode': True,
+            'pool_recycle': idle_timeout,
+            'pool_pre_ping': pool_pre_ping,
         }
+        if not url.drivername.startswith('sqlite'):
+            engine_args.update(pool_size=max_pool_size, max_overflow=max_overflow,
+                               pool_timeout=pool_timeout)
+        elif _is_sqlite_file(url):
+            # pool the connections of file databases instead of opening one
+            # per session, the pragmas and the page cache are per connection.
+            # A pooled connection is only used by one thread at a time.
+            engine_args.update(poolclass=pool.QueuePool, pool_size=max_pool_size,
+                               max_overflow=max_overflow, pool_timeout=pool_timeout,
+                               connect_args={'check_same_thread': False})
         engine = sqlalchemy.create_engine(sql_connection, **engine_args)
+        if url.drivername.startswith('sqlite'):
+            event.listen(engine, 'connect', _set_sqlite_pragmas(
+                sqlite_journal_mode if _is_sqlite_file(url) else None,
+                sqlite_synchronous, sqlite_cache_size, sqlite_mmap_size))
         return engine
 
     @staticmethod
@@ -71,12 +133,14 @@ class EngineFacade(object):
         return maker
 
     def get_engine(self, use_slave=False):
-        if use_slave:
+        """Return the replica engine if use_slave and one is configured."""
+        if use_slave and self._slave_engine is not None:
             return self._slave_engine
         return self._engine
 
     def get_session(self, use_slave=False, **kwargs):
-        if use_slave:
+        """Return a replica session if use_slave and one is configured."""
+        if use_slave and self._slave_session_maker is not None:
             return self._slave_session_maker(**kwargs)
         return self._session_maker(**kwargs)
 
@@ -90,13 +154,24 @@ CONF.set_default("connection", _DEFAULT_SQL_CONNECTION, group="database")
 def _create_facade_lazily():
     global _FACADE
     if _FACADE is None:
-        _FACADE = EngineFacade(CONF.database.connection)
+        conf = CONF.snapshot('database')
+        _FACADE = EngineFacade(conf.connection,
+                               slave_connection=conf.slave_connection,
+                               idle_timeout=conf.connection_recycle_time,
+                               max_pool_size=conf.max_pool_size,
+                               max_overflow=conf.max_overflow,
+                               pool_timeout=conf.pool_timeout,
+                               pool_pre_ping=conf.pool_pre_ping,
+                               sqlite_journal_mode=conf.sqlite_journal_mode,
+                               sqlite_synchronous=conf.sqlite_synchronous,
+                               sqlite_cache_size=conf.sqlite_cache_size,
+                               sqlite_mmap_size=conf.sqlite_mmap_size)
     return _FACADE
 
 
-def get_engine():
+def get_engine(use_slave=False):
     facade = _create_facade_lazily()
-    return facade.get_engine()
+    return facade.get_engine(use_slave=use_slave)
 
 
 def get_session(**kwargs):
@@ -258,10 +333,11 @@ def is_orm_value(obj):
 
 # TODO: add filter and marker features.
 def _pagination_query(context, session, model, limit=None, offset=None,
-                      sort_keys=None, sort_dirs=None):
+                      sort_keys=None, sort_dirs=None, columns=(), default_keys=None,
+                      filters=()):
 
-    sort_keys, sort_dirs = process_sort_params(sort_keys, sort_dirs)
-    query = model_query(context, model, session=session)
+    sort_keys, sort_dirs = process_sort_params(sort_keys, sort_dirs, default_keys=default_keys)
+    query = model_query(context, model, *columns, session=session).filter(*filters)
     # Add sorting
     for current_sort_key, current_sort_dir in zip(sort_keys, sort_dirs):
         sort_dir_func = {
@@ -284,8 +360,8 @@ def _pagination_query(context, session, model, limit=None, offset=None,
     return query
 
 
-def get_count(context, model, tenant_only=True):
-    session = get_session()
+def _count_query(context, model, tenant_only=True, use_slave=False):
+    session = get_session(use_slave=use_slave)
     with session.begin():
         query = model_query(context, model, func.count(model.id),
                             session=session, tenant_only=tenant_only)
@@ -295,6 +371,90 @@ def get_count(context, model, tenant_only=True):
         return result[0] or 0
 
 
+def _update_row_counters(session, model, amount, tenant_ids=None):
+    """Add amount to the row counters of model in the session's transaction.
+
+    Counters are only maintained with the counter row_count_strategy.
+
+    :param tenant_ids: tenant id -> amount of the per tenant counters
+    """
+    if CONF.snapshot('database').row_count_strategy != 'counter':
+        return
+    amounts = [('', amount)] + sorted((tenant_ids or {}).items())
+    for tenant_id, tenant_amount in amounts:
+        if not tenant_amount or tenant_id is None:
+            continue
+        # counters which aren't seeded yet are counted on first read
+        session.query(models.RowCounter).filter_by(
+            table_name=model.__tablename__, tenant_id=tenant_id).update(
+            {models.RowCounter.count: models.RowCounter.count + tenant_amount},
+            synchronize_session=False)
+
+
+def _counter_get(context, model, tenant_id, tenant_only, use_slave=False):
+    session = get_session(use_slave=use_slave)
+    counter = session.query(models.RowCounter.count).filter_by(
+        table_name=model.__tablename__, tenant_id=tenant_id).first()
+    if counter is not None:
+        return counter[0]
+    # seed the counter on the primary, the rows written between the COUNT
+    # and the insert of the counter are missed, counters are approximate
+    count = _count_query(context, model, tenant_only=tenant_only)
+    session = get_session()
+    try:
+        with session.begin():
+            session.add(models.RowCounter(table_name=model.__tablename__,
+                                          tenant_id=tenant_id, count=count))
+    except sa_exc.IntegrityError:
+        # seeded concurrently
+        pass
+    return count
+
+
+# table statistics of the engines keeping them, they include soft deleted rows
+_ESTIMATE_QUERIES = {
+    'mysql': "SELECT TABLE_ROWS FROM information_schema.TABLES "
+             "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table",
+    'postgresql': "SELECT reltuples::bigint FROM pg_class WHERE relname = :table",
+}
+
+
+def _estimate_count(model, use_slave=False):
+    engine = get_engine(use_slave=use_slave)
+    query = _ESTIMATE_QUERIES.get(engine.dialect.name)
+    if query is None:
+        return None
+    with engine.connect() as conn:
+        result = conn.execute(text(query), table=model.__tablename__).scalar()
+    return None if result is None or result < 0 else int(result)
+
+
+def get_count(context, model, tenant_only=True, use_slave=False):
+    """Return the number of live rows of model.
+
+    [database] row_count_strategy chooses between a COUNT query, the row
+    counters maintained by the create and delete calls and, for the rows
+    of all tenants, the table statistics of MySQL and PostgreSQL.
+    """
+    strategy = CONF.snapshot('database').row_count_strategy
+    if strategy == 'query' or context.read_deleted not in ('no', 'n', False):
+        return _count_query(context, model, tenant_only, use_slave)
+    tenant_id = context.tenant_id if tenant_only and is_user_context(context) else ''
+    if strategy == 'estimate':
+        count = _estimate_count(model, use_slave) if not tenant_id else None
+        if count is None:
+            return _count_query(context, model, tenant_only, use_slave)
+        return count
+    return _counter_get(context, model, tenant_id, tenant_only, use_slave)
+
+
+def reset_row_counters():
+    """Drop the row counters, they are counted again on next read."""
+    session = get_session()
+    with session.begin():
+        return session.query(models.RowCounter).delete()
+
+
 def _training_get_query(context, session=None):
     return model_query(context, models.Training, tenant_only=True, session=session)
 
@@ -308,6 +468,7 @@ def training_create(context, training_values):
     training_ref.update(values)
     with session.begin():
         training_ref.save(session=session)
+        _update_row_counters(session, models.Training, 1, {training_ref.tenant_id: 1})
         return training_get(context, training_ref['id'], session=session)
 
 
@@ -317,6 +478,7 @@ def training_delete(context, training_id):
     with session.begin():
         training_ref = training_get(context, training_id, session)
         training_ref.delete(session)
+        _update_row_counters(session, models.Training, -1, {training_ref.tenant_id: -1})
 
 
 @require_context
@@ -329,6 +491,17 @@ def training_get(context, training_id, session=None):
     return result
 
 
+@require_context
+def training_get_version(context, training_id):
+    """Return when a training was last updated or created, not its model data."""
+    version = func.coalesce(models.Training.updated_at, models.Training.created_at)
+    result = model_query(context, models.Training, version,
+                         tenant_only=True).filter_by(id=training_id).first()
+    if result is None:
+        raise exception.NotFound()
+    return result[0]
+
+
 @require_admin_context
 def training_get_all(context, limit=None, offset=None,
                      sort_keys=None, sort_dirs=None):
@@ -343,35 +516,69 @@ def training_get_all(context, limit=None, offset=None,
 
 
 @require_context
-def training_get_all_by_tenant(context, tenant_id):
-    query = model_query(context, models.Training).filter_by(tenant_id=tenant_id)
+def training_get_all_by_tenant(context, tenant_id, use_slave=False):
+    query = model_query(context, models.Training,
+                        session=get_session(use_slave=use_slave)).filter_by(tenant_id=tenant_id)
     if query is None:
         return []
     return query.all()
 
 
+def _performance_model():
+    return models.PERFORMANCE_MODELS[CONF.snapshot('database').performance_schema]
+
+
+def _performance_sort_keys(model):
+    # compact ids follow the insertion order and are the primary key
+    return ['id'] if model is models.CompactPerformance else None
+
+
+def _performance_values(model, values):
+    if model is models.CompactPerformance:
+        values.pop('id', None)
+        return values
+    return ensure_model_dict_has_id(values)
+
+
 def _performance_get_query(context, session=None):
-    return model_query(context, models.Performance, tenant_only=True, session=session)
+    return model_query(context, _performance_model(), tenant_only=True, session=session)
 
 
 @require_context
 def performance_create(context, performance_values):
-    values = copy.deepcopy(performance_values)
-    values = ensure_model_dict_has_id(values)
+    model = _performance_model()
+    values = _performance_values(model, copy.deepcopy(performance_values))
     session = get_session()
-    performance_ref = models.Performance()
+    performance_ref = model()
     performance_ref.update(values)
     with session.begin():
         performance_ref.save(session=session)
+        _update_row_counters(session, model, 1)
         return performance_get(context, performance_ref['id'], session=session)
 
 
+@require_context
+def performance_create_all(context, performance_values):
+    """Insert many performance rows in one transaction.
+
+    Unlike performance_create the rows are not read back.
+    """
+    model = _performance_model()
+    values = [_performance_values(model, dict(v)) for v in performance_values]
+    session = get_session()
+    with session.begin():
+        session.bulk_insert_mappings(model, values)
+        _update_row_counters(session, model, len(values))
+    return len(values)
+
+
 @require_context
 def performance_delete(context, performance_id):
     session = get_session()
     with session.begin():
         performance_ref = performance_get(context, performance_id, session)
         performance_ref.delete(session)
+        _update_row_counters(session, type(performance_ref), -1)
 
 
 @require_context
@@ -386,12 +593,14 @@ def performance_get(context, performance_id, session=None):
 
 @require_context
 def performance_get_all(context, fields=None, limit=None, offset=None,
-                        sort_keys=None, sort_dirs=None):
-    session = get_session()
+                        sort_keys=None, sort_dirs=None, use_slave=False):
+    model = _performance_model()
+    session = get_session(use_slave=use_slave)
     with session.begin():
-        query = _pagination_query(context, session, models.Performance,
+        query = _pagination_query(context, session, model,
                                   limit=limit, offset=offset,
-                                  sort_keys=sort_keys, sort_dirs=sort_dirs)
+                                  sort_keys=sort_keys, sort_dirs=sort_dirs,
+                                  default_keys=_performance_sort_keys(model))
         if query is None:
             return []
         if fields is not None:
@@ -400,12 +609,317 @@ def performance_get_all(context, fields=None, limit=None, offset=None,
 
 
 @require_context
-def performance_get_count(context):
-    return get_count(context, models.Performance, tenant_only=False)
+def performance_iter_columns(context, columns=('iops', 'latency', 'ground_truth'),
+                             limit=None, offset=None, fetch_size=None, use_slave=False,
+                             series_id=None):
+    """Yield the columns of the performance rows as float arrays.
+
+    Rows are fetched fetch_size at a time, without building ORM objects,
+    and every block of at most fetch_size rows is yielded as an array of
+    shape (rows, len(columns)) in the order of performance_get_all. NULL
+    values are NaN, times are in seconds since the epoch.
+
+    :param series_id: only yield the rows of this series
+    """
+    model = _performance_model()
+    fetch_size = fetch_size or CONF.snapshot('database').fetch_size
+    session = get_session(use_slave=use_slave)
+    try:
+        filters = [model.series_id == series_id] if series_id is not None else []
+        query = _pagination_query(context, session, model,
+                                  limit=limit, offset=offset,
+                                  default_keys=_performance_sort_keys(model),
+                                  columns=[getattr(model, c) for c in columns],
+                                  filters=filters)
+        for block in _iter_arrays(query, len(columns), fetch_size):
+            yield block
+    finally:
+        session.close()
+
+
+@require_context
+def performance_iter_series(context, columns=('iops', 'latency', 'ground_truth'),
+                            limit=None, offset=None, fetch_size=None, use_slave=False):
+    """Yield (series ids, columns) blocks of the performance rows.
+
+    Blocks are read like those of performance_iter_columns, the series ids
+    of their rows are yielded alongside as an array of utf-8 encoded bytes,
+    b'' for the rows without a series.
+    """
+    model = _performance_model()
+    fetch_size = fetch_size or CONF.snapshot('database').fetch_size
+    session = get_session(use_slave=use_slave)
+    try:
+        query = _pagination_query(context, session, model,
+                                  limit=limit, offset=offset,
+                                  default_keys=_performance_sort_keys(model),
+                                  columns=[getattr(model, c) for c in columns] +
+                                  [func.coalesce(model.series_id, '')])
+        width = len(columns)
+        for block in _iter_rows(query, fetch_size):
+            series_ids = np.array([row[width].encode('utf-8') for row in block], dtype=bytes)
+            yield series_ids, _float_array([row[:width] for row in block], width)
+    finally:
+        session.close()
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _iter_rows(query, fetch_size):
+    rows = iter(query.yield_per(fetch_size))
+    while True:
+        block = list(itertools.islice(rows, fetch_size))
+        if not block:
+            break
+        yield block
+
+
+def _seconds(value):
+    if isinstance(value, datetime.datetime):
+        return (value - _EPOCH).total_seconds()
+    return value
+
+
+def _float_array(rows, width):
+    """Return rows as a float array, datetimes as seconds since the epoch."""
+    try:
+        array = np.array(rows, dtype=float)
+    except TypeError:
+        array = np.array([[_seconds(v) for v in row] for row in rows], dtype=float)
+    return array.reshape(len(rows), width)
+
+
+def _iter_arrays(query, width, fetch_size):
+    for block in _iter_rows(query, fetch_size):
+        yield _float_array(block, width)
+
+
+@require_context
+def performance_get_count(context, use_slave=False):
+    return get_count(context, _performance_model(), tenant_only=False, use_slave=use_slave)
+
+
+def _rollup_bucket(timestamp, resolution):
+    seconds = int((timestamp - _EPOCH).total_seconds())
+    return _EPOCH + datetime.timedelta(seconds=seconds - seconds % resolution)
+
+
+def _merge_rollup_stats(rollup, name, values):
+    """Merge the mean, m2, min and max of values into the name_ columns."""
+    n = len(values)
+    mean = values.mean()
+    m2 = ((values - mean) ** 2).sum()
+    low, high = values.min(), values.max()
+    if rollup.count:
+        total = rollup.count + n
+        old_mean = getattr(rollup, name + '_mean')
+        delta = mean - old_mean
+        mean = old_mean + delta * n / total
+        m2 += getattr(rollup, name + '_m2') + delta ** 2 * rollup.count * n / total
+        low = min(low, getattr(rollup, name + '_min'))
+        high = max(high, getattr(rollup, name + '_max'))
+    setattr(rollup, name + '_mean', float(mean))
+    setattr(rollup, name + '_m2', float(m2))
+    setattr(rollup, name + '_min', float(low))
+    setattr(rollup, name + '_max', float(high))
+
+
+@require_context
+def performance_rollup_add(context, performance_values, resolutions=(60, 3600)):
+    """Merge performance rows into the rollups of their time buckets.
+
+    Rows are bucketed by their time, or the current time if they have
+    none, and the rows without iops or latency are skipped. Rollups are
+    only ever added to, deleting or purging performance rows leaves them
+    unchanged.
+
+    :param resolutions: bucket lengths in seconds
+    :returns: the number of updated rollups
+    """
+    now = datetime.datetime.utcnow()
+    buckets = {}
+    for values in performance_values:
+        if values.get('iops') is None or values.get('latency') is None:
+            continue
+        timestamp = values.get('time') or now
+        for resolution in resolutions:
+            key = (resolution, _rollup_bucket(timestamp, resolution))
+            buckets.setdefault(key, []).append(values)
+    merges = [(key, np.array([(r['iops'], r['latency']) for r in rows], dtype=float),
+               sum(1 for r in rows if r.get('ground_truth')))
+              for key, rows in sorted(buckets.items())]
+    for attempt in range(1, _ROLLUP_ATTEMPTS + 1):
+        try:
+            _rollup_merge(merges)
+            break
+        except (sa_exc.IntegrityError, sa_exc.OperationalError) as e:
+            # a bucket created or locked by a concurrent writer, the
+            # transaction was rolled back as a whole
+            if attempt == _ROLLUP_ATTEMPTS:
+                raise
+            LOG.debug("retrying the rollup merge: %s", e)
+    return len(buckets)
+
+
+_ROLLUP_ATTEMPTS = 3
+
+
+def _rollup_merge(merges):
+    session = get_session()
+    with session.begin():
+        # buckets are locked in key order, writers can't deadlock on them
+        for (resolution, bucket), data, anomalies in merges:
+            rollup = session.query(models.PerformanceRollup).filter_by(
+                resolution=resolution, bucket=bucket).with_for_update().first()
+            if rollup is None:
+                rollup = models.PerformanceRollup(resolution=resolution, bucket=bucket,
+                                                  count=0, anomalies=0)
+                session.add(rollup)
+            _merge_rollup_stats(rollup, 'iops', data[:, 0])
+            _merge_rollup_stats(rollup, 'latency', data[:, 1])
+            rollup.count += len(data)
+            rollup.anomalies += anomalies
+
+
+@require_context
+def performance_rollup_iter_columns(context, resolution,
+                                    columns=('iops_mean', 'latency_mean', 'anomalies'),
+                                    limit=None, offset=None, fetch_size=None,
+                                    use_slave=False):
+    """Yield the columns of the rollups of resolution as float arrays.
+
+    Rollups are yielded in bucket order, in blocks of at most fetch_size
+    rows like performance_iter_columns.
+    """
+    model = models.PerformanceRollup
+    fetch_size = fetch_size or CONF.snapshot('database').fetch_size
+    session = get_session(use_slave=use_slave)
+    try:
+        query = session.query(*[getattr(model, c) for c in columns]) \
+            .filter_by(resolution=resolution).order_by(model.bucket)
+        if limit is not None:
+            query = query.limit(limit)
+        if offset is not None:
+            query = query.offset(offset)
+        for block in _iter_arrays(query, len(columns), fetch_size):
+            yield block
+    finally:
+        session.close()
+
+
+def migrate_performance(batch_size=10000):
+    """Copy the live rows of the uuid performance table to the compact one.
+
+    Rows are copied in the order they were created, batch_size at a time.
+    The source table is left untouched.
+
+    :returns: the number of copied rows
+    """
+    source, target = models.Performance, models.CompactPerformance
+    session = get_session()
+    if session.query(target.id).first() is not None:
+        raise exception.InvalidInput(
+            reason='%s is not empty, the rows were migrated already' % target.__tablename__)
+    columns = ['created_at', 'resource_id', 'series_id', 'latency', 'iops',
+               'ground_truth', 'time']
+    # keyset pagination, rows without creation time come first
+    created_at = func.coalesce(source.created_at, datetime.datetime(1970, 1, 1))
+    last = None
+    copied = 0
+    while True:
+        query = session.query(created_at, source.id,
+                              *[getattr(source, c) for c in columns]) \
+            .filter(source.deleted == sqlalchemy.false())
+        if last is not None:
+            query = query.filter(sqlalchemy.or_(
+                created_at > last[0],
+                sqlalchemy.and_(created_at == last[0], source.id > last[1])))
+        rows = query.order_by(created_at, source.id).limit(batch_size).all()
+        if not rows:
+            break
+        with session.begin():
+            session.bulk_insert_mappings(target, [dict(zip(columns, row[2:])) for row in rows])
+        copied += len(rows)
+        last = rows[-1][:2]
+    reset_row_counters()
+    return copied
+
+
+def purge_performance(before=None, batch_size=10000):
+    """Hard delete the soft deleted performance rows and those created before.
+
+    Rows are deleted batch_size at a time, each batch in its own
+    transaction, so the table isn't locked for the whole purge. The rows
+    created before are deleted first, by a range of the created_at index,
+    then the soft deleted rows left.
+
+    :param before: datetime, None only purges the soft deleted rows
+    :returns: the number of deleted rows
+    """
+    purged = 0
+    for model in models.PERFORMANCE_MODELS.values():
+        conditions = [model.deleted == sqlalchemy.true()]
+        if before is not None:
+            conditions.insert(0, model.created_at < before)
+        session = get_session()
+        for condition in conditions:
+            while True:
+                with session.begin():
+                    rows = session.query(model.id, model.deleted).filter(condition) \
+                        .limit(batch_size).all()
+                    if not rows:
+                        break
+                    # read with the delete, a row soft deleted meanwhile isn't uncounted twice
+                    live = sum(1 for _id, deleted in rows if not deleted)
+                    session.query(model).filter(model.id.in_([row[0] for row in rows])) \
+                        .delete(synchronize_session=False)
+                    _update_row_counters(session, model, -live)
+                purged += len(rows)
+    return purged
+
+
+# dialect -> statements converting the text model data of the trainings
+# created before it was binary
+_MODEL_DATA_MIGRATIONS = {
+    # the declared type can't be altered, SQLite keeps blobs in text columns
+    'sqlite': ["UPDATE training SET model_data = CAST(model_data AS BLOB) "
+               "WHERE typeof(model_data) = 'text'"],
+    'mysql': ['ALTER TABLE training MODIFY model_data LONGBLOB'],
+    'postgresql': ["ALTER TABLE training ALTER COLUMN model_data TYPE BYTEA "
+                   "USING convert_to(model_data, 'UTF8')"],
+}
+
+
+def _migrate_model_data(engine, inspector):
+    columns = dict((c['name'], c) for c in inspector.get_columns('training'))
+    if not isinstance(columns['model_data']['type'], sqlalchemy.String):
+        return
+    statements = _MODEL_DATA_MIGRATIONS.get(engine.dialect.name)
+    if statements is None:
+        LOG.warning("training.model_data of the %s database is still a text column, "
+                    "convert it to a binary one", engine.dialect.name)
+        return
+    for statement in statements:
+        engine.execute(statement)
 
 
 def init_db():
     engine = get_engine()
     models.Base.metadata.create_all(engine)
+    # create_all skips existing tables, add the nullable columns and the
+    # indexes they lack
+    inspector = sqlalchemy.inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        existing = set(column['name'] for column in inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                ddl = sqlalchemy.schema.CreateColumn(column).compile(dialect=engine.dialect)
+                engine.execute('ALTER TABLE %s ADD COLUMN %s' % (table.name, ddl))
+        existing = set(index['name'] for index in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+    _migrate_model_data(engine, inspector)
 
 
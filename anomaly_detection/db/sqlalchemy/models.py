@@ -14,9 +14,13 @@
 import datetime
 
 import six
-from sqlalchemy import Column, String, Boolean, Integer
+from sqlalchemy import Column, String, Boolean, Integer, BigInteger, LargeBinary
 from sqlalchemy import DateTime
+from sqlalchemy import Float
+from sqlalchemy import Index
+from sqlalchemy.dialects import mysql
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import column_property
 from sqlalchemy.orm import object_mapper
 
 
@@ -173,13 +177,85 @@ class Training(Base, AnomalyDetectionBase):
     description = Column(String(255), nullable=True)
     tenant_id = Column(String(255), index=True)
     algorithm = Column(String(36))
-    model_data = Column(String(255))
+    # BLOB is limited to 64 KiB on MySQL
+    model_data = Column(LargeBinary().with_variant(mysql.LONGBLOB(), 'mysql'))
 
 
 class Performance(Base, AnomalyDetectionBase):
     __tablename__ = "performace"
+    # purged by creation time, series are read in creation order
+    __table_args__ = (Index('ix_performace_created_at', 'created_at'),
+                      Index('ix_performace_series_id', 'series_id', 'created_at'),
+                      {'mysql_engine': 'InnoDB'})
     id = Column(String(36), primary_key=True)
+    # the volume, pool... the metrics are of, and their series
+    resource_id = Column(String(36), nullable=True, index=True)
+    series_id = Column(String(255), nullable=True)
     latency = Column(Integer)
     iops = Column(Integer)
     ground_truth = Column(Integer, nullable=True)
     time = Column(DateTime, nullable=True)
+
+
+class CompactPerformance(Base, ModelBase):
+    """Performance rows keyed by an autoincrement integer.
+
+    Rows are appended at the end of the primary key index in insertion
+    order, and only the deleted flag is kept for soft deletes.
+    """
+    __tablename__ = "performance_compact"
+    __table_args__ = (Index('ix_performance_compact_series_id', 'series_id', 'id'),
+                      {'mysql_engine': 'InnoDB'})
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True,
+                autoincrement=True)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.utcnow(), index=True)
+    deleted = Column(Boolean, default=False)
+    resource_id = Column(String(36), nullable=True, index=True)
+    series_id = Column(String(255), nullable=True)
+    latency = Column(Integer)
+    iops = Column(Integer)
+    ground_truth = Column(Integer, nullable=True)
+    time = Column(DateTime, nullable=True)
+
+    def delete(self, session):
+        """Delete this object."""
+        self.deleted = True
+        self.save(session=session)
+
+
+# [database] performance_schema -> model of the performance rows
+PERFORMANCE_MODELS = {'uuid': Performance, 'compact': CompactPerformance}
+
+
+class PerformanceRollup(Base, ModelBase):
+    """Aggregates of the performance rows of one time bucket.
+
+    The variances are those of the population, m2 is the sum of the
+    squared deviations from the mean, kept so buckets can be merged.
+    """
+    __tablename__ = "performance_rollup"
+    __table_args__ = {'mysql_engine': 'InnoDB'}
+    # bucket length in seconds
+    resolution = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+    anomalies = Column(BigInteger, nullable=False, default=0)
+    iops_mean = Column(Float(precision=53))
+    iops_m2 = Column(Float(precision=53))
+    iops_min = Column(Float(precision=53))
+    iops_max = Column(Float(precision=53))
+    latency_mean = Column(Float(precision=53))
+    latency_m2 = Column(Float(precision=53))
+    latency_min = Column(Float(precision=53))
+    latency_max = Column(Float(precision=53))
+    iops_variance = column_property(iops_m2 / count)
+    latency_variance = column_property(latency_m2 / count)
+
+
+class RowCounter(Base, ModelBase):
+    """Number of live rows of a table, of all tenants if tenant_id is ''."""
+    __tablename__ = "row_counters"
+    __table_args__ = {'mysql_engine': 'InnoDB'}
+    table_name = Column(String(64), primary_key=True)
+    tenant_id = Column(String(255), primary_key=True, default='')
+    count = Column(BigInteger, nullable=False, default=0)
@@ -11,12 +11,20 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import atexit
+import contextlib
 import inspect
+import json
 import logging
 import logging.handlers
 import os
 import platform
 import sys
+import threading
+import time
+
+from six.moves import queue
+
 from anomaly_detection.utils import config as cfg
 
 try:
@@ -52,6 +60,7 @@ _DEFAULT_LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 logging_opts = [
     cfg.BoolOpt('debug',
                 default=False,
+                mutable=True,
                 help='If set to true, the logging level will be set to '
                      'DEBUG instead of the default INFO level.'),
     cfg.StrOpt('log_date_format',
@@ -106,6 +115,27 @@ logging_opts = [
     cfg.BoolOpt('use_eventlog',
                 default=False,
                 help='Log output to Windows Event Log.'),
+    cfg.StrOpt('log_format',
+               default='text',
+               choices=[('text', 'Human readable lines.'),
+                        ('json', 'One JSON object per line, without colors.')],
+               help='Format of the log records.'),
+    cfg.BoolOpt('log_async',
+                default=False,
+                help='Hand log records to a background thread which formats '
+                     'and writes them, so logging never blocks on I/O.'),
+    cfg.IntOpt('log_queue_size',
+               default=10000,
+               min=1,
+               help='Maximum number of log records waiting to be written '
+                    'when log_async is set.'),
+    cfg.StrOpt('log_queue_full_policy',
+               default='drop_new',
+               choices=[('drop_new', 'Discard the record being logged.'),
+                        ('drop_old', 'Discard the oldest waiting record.'),
+                        ('block', 'Wait until the record can be queued.')],
+               help='What to do with a record logged while the log queue is '
+                    'full.'),
 ]
 
 
@@ -113,6 +143,82 @@ def register_opts(conf):
     conf.register_opts(logging_opts)
 
 
+# ids describing what the current thread works on, added to its records
+CONTEXT_KEYS = ('request_id', 'training_id')
+_context = threading.local()
+
+
+def get_context():
+    return dict((key, getattr(_context, key, None)) for key in CONTEXT_KEYS)
+
+
+@contextlib.contextmanager
+def context(**kwargs):
+    """Add the given ids to the records logged by the with block."""
+    previous = {}
+    for key, value in kwargs.items():
+        if key not in CONTEXT_KEYS:
+            raise KeyError('Unknown log context key %s' % key)
+        previous[key] = getattr(_context, key, None)
+        setattr(_context, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(_context, key, value)
+
+
+# json.dumps() with arguments builds a new encoder on every call
+_json_encoder = json.JSONEncoder(default=str)
+
+
+def _add_context(record):
+    for key in CONTEXT_KEYS:
+        if not hasattr(record, key):
+            setattr(record, key, getattr(_context, key, None))
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as one JSON object per line.
+
+    Every record has the same keys, the timestamp is UTC with millisecond
+    precision and its date and time part is formatted once per second.
+    """
+
+    def __init__(self):
+        logging.Formatter.__init__(self)
+        # (second, formatted second), replaced as a whole to be thread safe
+        self._second = (None, None)
+
+    def format_time(self, created):
+        second = int(created)
+        cached = self._second
+        if cached[0] != second:
+            cached = (second, time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second)))
+            self._second = cached
+        return '%s.%03dZ' % (cached[1], (created - second) * 1000)
+
+    def format(self, record):
+        _add_context(record)
+        data = {
+            'timestamp': self.format_time(record.created),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'location': '%s:%d' % (record.filename, record.lineno),
+            'process': record.process,
+            'thread': record.threadName,
+            'request_id': record.request_id,
+            'training_id': record.training_id,
+            'exception': None,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return _json_encoder.encode(data)
+
+
 class ColorHandler(logging.StreamHandler):
     """Log handler that sets the 'color' key based on the level
 
@@ -136,6 +242,111 @@ class ColorHandler(logging.StreamHandler):
         return logging.StreamHandler.format(self, record) + record.reset_color
 
 
+class DroppingQueueHandler(logging.Handler):
+    """Handler putting records on a bounded queue, read by a QueueListener.
+
+    The policy applies when the queue is full: ``drop_new`` discards the
+    record being logged, ``drop_old`` the oldest queued one and ``block``
+    waits for the listener to catch up.
+    """
+
+    def __init__(self, queue_, policy='drop_new'):
+        logging.Handler.__init__(self)
+        self.queue = queue_
+        self.policy = policy
+        self.dropped = 0
+
+    def prepare(self, record):
+        # merge the arguments on the logging thread, they may change later
+        # and may not be safe to format from the listener thread, the rest
+        # of the formatting is left to the listener
+        record.msg = record.getMessage()
+        record.args = None
+        _add_context(record)
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.policy == 'block':
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.policy == 'drop_old':
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+
+    def emit(self, record):
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """Thread writing the records of a queue to the given handlers."""
+
+    _sentinel = None
+
+    def __init__(self, queue_, handlers):
+        self.queue = queue_
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is self._sentinel:
+                break
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def stop(self):
+        self.queue.put(self._sentinel)
+        self._thread.join()
+
+
+_listener = None
+_exception_formatter = logging.Formatter()
+
+
+def _start_async_logging(log_root, queue_size, policy):
+    global _listener
+    handlers = list(log_root.handlers)
+    for handler in handlers:
+        log_root.removeHandler(handler)
+    log_queue = queue.Queue(queue_size)
+    log_root.addHandler(DroppingQueueHandler(log_queue, policy))
+    _listener = QueueListener(log_queue, handlers)
+    _listener.start()
+
+
+def _stop_async_logging():
+    """Write the queued records and stop the background logging thread."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(_stop_async_logging)
+
+
 class BaseLoggerAdapter(logging.LoggerAdapter):
 
     warn = logging.LoggerAdapter.warning
@@ -179,6 +390,9 @@ class KeywordArgumentAdapter(BaseLoggerAdapter):
             if name == 'exc_info':
                 continue
             extra[name] = kwargs.pop(name)
+        for name in CONTEXT_KEYS:
+            if name not in extra:
+                extra[name] = getattr(_context, name, None)
         # NOTE(dhellmann): The gap between when the adapter is called
         # and when the formatter needs to know what the extra values
         # are is large enough that we can't get back to the original
@@ -279,6 +493,7 @@ def _get_log_file_path(conf, binary=None):
 def _setup_logging_from_conf(conf, project):
     log_root = getLogger(None).logger
 
+    _stop_async_logging()
     # Remove all handlers
     for handler in list(log_root.handlers):
         log_root.removeHandler(handler)
@@ -310,8 +525,10 @@ def _setup_logging_from_conf(conf, project):
 
         log_root.addHandler(filelog)
 
+    json_format = conf.log_format == 'json'
+    stream_handler = logging.StreamHandler if json_format else ColorHandler
     if conf.use_stderr:
-        streamlog = ColorHandler()
+        streamlog = stream_handler()
         log_root.addHandler(streamlog)
 
     if conf.use_eventlog:
@@ -325,16 +542,22 @@ def _setup_logging_from_conf(conf, project):
     if not logpath and not conf.use_stderr:
         # pass sys.stdout as a positional argument
         # python2.6 calls the argument strm, in 2.7 it's stream
-        streamlog = ColorHandler(sys.stdout)
+        streamlog = stream_handler(sys.stdout)
         log_root.addHandler(streamlog)
 
     _refresh_root_level(conf.debug)
 
     datefmt = conf.log_date_format
     for handler in log_root.handlers:
-        handler.setFormatter(logging.Formatter(
-            fmt="%(asctime)s - %(levelname)s - %(filename)s[:%(lineno)d] - %(message)s",
-            datefmt=datefmt))
+        if json_format:
+            handler.setFormatter(JSONFormatter())
+        else:
+            handler.setFormatter(logging.Formatter(
+                fmt="%(asctime)s - %(levelname)s - %(filename)s[:%(lineno)d] - %(message)s",
+                datefmt=datefmt))
+
+    if conf.log_async:
+        _start_async_logging(log_root, conf.log_queue_size, conf.log_queue_full_policy)
 
 
 def _refresh_root_level(debug):
@@ -350,6 +573,12 @@ def _refresh_root_level(debug):
         log_root.setLevel(logging.INFO)
 
 
+def _mutate_hook(conf, fresh):
+    """Apply the log level of a reloaded config file."""
+    if (None, 'debug') in fresh:
+        _refresh_root_level(conf.debug)
+
+
 def _create_logging_excepthook(product_name):
     def logging_excepthook(exc_type, value, tb):
         extra = {'exc_info': (exc_type, value, tb)}
@@ -389,4 +618,5 @@ def getLogger(name=None, project='unknown', version='unknown'):
 def setup(conf, product_name):
     """Setup logging for the current application."""
     _setup_logging_from_conf(conf, product_name)
+    conf.register_mutate_hook(_mutate_hook)
     sys.excepthook = _create_logging_excepthook(product_name)
@@ -0,0 +1,242 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Process wide counters, gauges and histograms.
+
+Metrics are kept in memory and rendered in the Prometheus text exposition
+format by the API server's /metrics endpoint::
+
+    REQUESTS = metrics.counter('requests_total', 'Handled requests', ['status'])
+    REQUESTS.inc(('200',))
+
+    with metrics.timer(DB_SECONDS, ('training_get',)):
+        ...
+"""
+import collections
+import contextlib
+import functools
+import threading
+import time
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 300.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return '%d' % value
+    return repr(value)
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape(v)) for k, v in pairs)
+
+
+class _Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _check(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError('%s expects labels %s, got %s' %
+                             (self.name, self.labelnames, labels))
+        return tuple(str(v) for v in labels)
+
+    def samples(self):
+        """Return the (name, label pairs, value) samples of the metric."""
+        raise NotImplementedError
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        labels = self._check(labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels=()):
+        return self._values.get(self._check(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, list(zip(self.labelnames, labels)), value)
+                for labels, value in values]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, value, labels=()):
+        labels = self._check(labels)
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        labels = self._check(labels)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # one count per bucket, +Inf, then the sum
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def get(self, labels=()):
+        """Return the (count, sum) of the observed values."""
+        counts = self._values.get(self._check(labels))
+        if counts is None:
+            return 0, 0.0
+        return sum(counts[:-1]), counts[-1]
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        samples = []
+        for labels, counts in values:
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts[:-1]):
+                cumulative += count
+                samples.append((self.name + '_bucket',
+                                pairs + [('le', _format_value(float(bound)))], cumulative))
+            samples.append((self.name + '_sum', pairs, counts[-1]))
+            samples.append((self.name + '_count', pairs, cumulative))
+        return samples
+
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = collections.OrderedDict()
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Register a metric, an already registered one of that name is returned."""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or \
+                        existing.labelnames != metric.labelnames:
+                    raise ValueError('metric %s is already registered' % metric.name)
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def register_collector(self, collector):
+        """Register a callable returning metrics to render on every scrape."""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def unregister_collector(self, collector):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def collect(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def render(self):
+        lines = []
+        for metric in self.collect():
+            lines.append('# HELP %s %s' % (metric.name,
+                                           metric.documentation.replace('\n', ' ')))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for name, pairs, value in metric.samples():
+                lines.append('%s%s %s' % (name, _format_labels(pairs),
+                                          _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+@contextlib.contextmanager
+def timer(histogram, labels=()):
+    """Observe the duration of the with block in seconds."""
+    start = monotonic()
+    try:
+        yield
+    finally:
+        histogram.observe(monotonic() - start, labels)
+
+
+def timed(histogram, labels=()):
+    """Decorator observing the duration of every call in seconds."""
+    def _decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(monotonic() - start, labels)
+        return wrapper
+    return _decorator
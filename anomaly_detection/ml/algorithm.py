@@ -17,6 +17,7 @@ from anomaly_detection.context import get_admin_context
 from anomaly_detection.db.base import Base
 from anomaly_detection.ml import csv
 from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import np_binary
 
 CONF = cfg.CONF
 
@@ -25,6 +26,28 @@ class DataSet(object):
     def get(self, offset=0, limit=1000):
         raise NotImplementedError
 
+    def iter_blocks(self, offset=0, limit=1000):
+        """Yield the rows of get() in blocks, for streaming estimators."""
+        yield self.get(offset=offset, limit=limit)
+
+    def iter_series_blocks(self, offset=0, limit=1000, with_time=False):
+        """Yield (series ids, rows) blocks, all rows are of the series b''.
+
+        With with_time the rows have a fourth column, their time in seconds
+        since the epoch, NaN if unknown.
+        """
+        for block in self.iter_blocks(offset=offset, limit=limit):
+            if with_time:
+                block = with_time_column(block)
+            yield np.zeros(len(block), dtype='S1'), block
+
+
+def with_time_column(block):
+    """Return (iops, latency, ground truth, time) rows, NaN times if unknown."""
+    if block.shape[1] > 3:
+        return block[:, 0:4]
+    return np.column_stack([block, np.full(len(block), np.nan)])
+
 
 class CSVDataSet(DataSet):
     def __init__(self, file_name='performance.csv'):
@@ -34,38 +57,106 @@ class CSVDataSet(DataSet):
         return csv.read(self._file_name, skip_header=offset, max_rows=offset+limit)
 
 
+class ArrayDataSet(DataSet):
+    """In memory dataset of (iops, latency, ground_truth) rows."""
+
+    def __init__(self, data):
+        self._data = data
+
+    def get(self, offset=0, limit=10000):
+        return self._data[offset:offset + limit]
+
+
 class DBDataSet(DataSet, Base):
-    def __init__(self):
+    def __init__(self, use_slave=True):
         super(DataSet, self).__init__()
+        # scan the read replica, if any, not to compete with ingestion writes
+        self.use_slave = use_slave
 
     def get(self, offset=0, limit=10000):
-        count = self.db.performance_get_count(get_admin_context())
-        limit = min(count, limit)
-        perfs = self.db.performance_get_all(get_admin_context(), offset=offset, limit=limit)
-        data = np.empty(shape=[0, 3])
-        for perf in perfs:
-            data = np.vstack([data, [perf.iops, perf.latency, perf.ground_truth]])
-        return data
+        blocks = list(self.iter_blocks(offset=offset, limit=limit))
+        if not blocks:
+            return np.empty(shape=[0, 3])
+        return np.concatenate(blocks)
+
+    def iter_blocks(self, offset=0, limit=10000):
+        """Yield the rows [database] fetch_size at a time, memory stays bounded."""
+        return self.db.performance_iter_columns(get_admin_context(), offset=offset,
+                                                limit=limit, use_slave=self.use_slave)
+
+    def iter_series_blocks(self, offset=0, limit=10000, with_time=False):
+        """Yield (series ids, rows) blocks, rows without a series are of b''."""
+        columns = ('iops', 'latency', 'ground_truth') + (('time',) if with_time else ())
+        return self.db.performance_iter_series(get_admin_context(), columns=columns,
+                                               offset=offset, limit=limit,
+                                               use_slave=self.use_slave)
+
+
+class RollupDataSet(DBDataSet):
+    """Dataset of (iops mean, latency mean, anomalous) rows of the rollups.
+
+    :param resolution: name of the rollup, minute or hour
+    """
+
+    def __init__(self, resolution, use_slave=True):
+        super(RollupDataSet, self).__init__(use_slave=use_slave)
+        self.resolution = self.db.ROLLUP_RESOLUTIONS[resolution]
+
+    def iter_blocks(self, offset=0, limit=10000, with_time=False):
+        columns = ('iops_mean', 'latency_mean', 'anomalies') + (('bucket',) if with_time else ())
+        for block in self.db.performance_rollup_iter_columns(
+                get_admin_context(), self.resolution, columns=columns,
+                offset=offset, limit=limit, use_slave=self.use_slave):
+            # a bucket is anomalous if one of its rows is
+            block[:, 2] = block[:, 2] > 0
+            yield block
+
+    def iter_series_blocks(self, offset=0, limit=10000, with_time=False):
+        # rollups aren't kept per series
+        for block in self.iter_blocks(offset=offset, limit=limit, with_time=with_time):
+            yield np.zeros(len(block), dtype='S1'), block
 
 
 class AlgorithmBase(object):
 
     def __init__(self, *args, **kwargs):
         self.algorithm_name = kwargs.get("algorithm_name")
-        source_type = CONF.training.dataset_source_type
-        if source_type == 'database':
-            self.dataset = DBDataSet()
+        conf = CONF.snapshot('training')
+        if conf.dataset_source_type == 'database':
+            if conf.dataset_resolution == 'raw':
+                self.dataset = DBDataSet()
+            else:
+                self.dataset = RollupDataSet(conf.dataset_resolution)
         else:
-            self.dataset = CSVDataSet(CONF.training.dataset_csv_file_name)
+            self.dataset = CSVDataSet(conf.dataset_csv_file_name)
+
+    def load_model(self, model_data):
+        """Decode the serialized model data of a training."""
+        return np_binary.loads(model_data)
 
     def create_training(self, training):
+        """Fit a model and return its data as a dict of values and arrays."""
         raise NotImplementedError
 
-    def get_training_figure(self, training):
+    def get_training_figure(self, model):
         raise NotImplementedError
 
-    def prediction(self, training, dataset):
+    def prediction(self, model, dataset):
         raise NotImplementedError
 
-    def get_prediction_figure(self, training, dataset):
+    def prediction_by_series(self, model, dataset, series_ids):
+        """Score the rows of dataset with the models of their series.
+
+        Drivers fitting one model for all series ignore series_ids.
+        """
+        return self.prediction(model, dataset)
+
+    def state_nbytes(self, model):
+        """Return the size of the state a loaded model gained while scoring.
+
+        The model cache accounts it on top of the model data.
+        """
+        return 0
+
+    def get_prediction_figure(self, model, dataset):
         raise NotImplementedError
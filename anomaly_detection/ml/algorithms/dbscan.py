@@ -12,19 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
-
-import matplotlib.pyplot as plt
 import numpy as np
-from sklearn import cluster
-from sklearn import metrics
-from sklearn.preprocessing import StandardScaler
-from anomaly_detection.utils import np_json
 
 from anomaly_detection import log
 from anomaly_detection.ml import contants
 from anomaly_detection.ml.algorithm import AlgorithmBase
 from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import lazy_import
+
+plt = lazy_import('matplotlib.pyplot')
+cluster = lazy_import('sklearn.cluster')
+metrics = lazy_import('sklearn.metrics')
+preprocessing = lazy_import('sklearn.preprocessing')
 
 LOG = log.getLogger(__name__)
 
@@ -51,31 +50,30 @@ class DBSCAN(AlgorithmBase):
         return best_ar, best_ep, best_ms
 
     def _get_training_data(self):
-        num = CONF.training.dataset_number
+        num = CONF.snapshot('training').dataset_number
         data = self.dataset.get(offset=0, limit=num)
         return data[:, 0:2], data[:, 2]
 
     def _get_test_data(self):
-        num = CONF.training.dataset_number
+        num = CONF.snapshot('training').dataset_number
         data = self.dataset.get(limit=num//2)
         return data[:, 0:2]
 
     def create_training(self, training):
         data, labels_true = self._get_training_data()
-        st_data = StandardScaler().fit_transform(data)
+        st_data = preprocessing.StandardScaler().fit_transform(data)
         # The epsilon and min_samples value with highest adjusted-rand-score will be selected as threshold
         ar_score, eps, min_samples = self._select_parameter(st_data, labels_true)
         model_data = {"adjusted_rand_score": ar_score, "epsilon": eps, "min_samples": min_samples}
         LOG.info("parameters: %s", model_data)
-        return np_json.dumps(model_data)
+        return model_data
 
-    def get_training_figure(self, training):
+    def get_training_figure(self, md):
         test_data = self._get_test_data()
-        md = np_json.loads(training.model_data)
         eps = md["epsilon"]
         min_samples = md["min_samples"]
         adjusted_rand_score = md["adjusted_rand_score"]
-        st_test_data = StandardScaler().fit_transform(test_data)
+        st_test_data = preprocessing.StandardScaler().fit_transform(test_data)
         db = cluster.DBSCAN(eps=eps, min_samples=min_samples).fit(st_test_data)
         core_samples_mask = np.zeros_like(db.labels_, dtype=bool)
         core_samples_mask[db.core_sample_indices_] = True
@@ -87,7 +85,7 @@ class DBSCAN(AlgorithmBase):
         plt.ylabel("Latency (μs)")
 
         # Black removed and is used for noise instead.
-        if CONF.dbscan_figure_style == "core_border_spectral":
+        if CONF.snapshot('apiserver').dbscan_figure_style == "core_border_spectral":
             unique_labels = set(labels)
             colors = [plt.cm.Spectral(each)
                       for each in np.linspace(0, 1, len(unique_labels))]
@@ -115,8 +113,8 @@ class DBSCAN(AlgorithmBase):
             plt.legend(loc='upper right')
         return fig
 
-    def prediction(self, training, dataset):
+    def prediction(self, md, dataset):
         pass
 
-    def get_prediction_figure(self, training, dataset):
+    def get_prediction_figure(self, md, dataset):
         pass
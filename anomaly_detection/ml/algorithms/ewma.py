@@ -0,0 +1,281 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Streaming baselines of every series.
+
+Each series keeps an exponentially weighted mean and variance of iops and
+latency, plus additive Holt-Winters seasonal components if season_length
+is set: season_period is split in season_length slots and a point updates
+the component of the slot of its time. A point deviating from the
+baseline of its series by more than threshold standard deviations is an
+outlier. Baselines are updated in O(1) per point: training replays the
+dataset once to warm them up, and scoring keeps updating the baselines of
+the loaded model, no scan is needed to follow the series afterwards.
+
+Following the series while scoring is best effort: the baselines live in
+the model cached by the API process and are never written back. Every
+process follows its own copy, and the baselines restart from the trained
+state whenever the model is loaded again, after an eviction, a restart
+or a retraining, which the loads counter shows. At most max_new_series
+series unknown to the training are followed per loaded model, their
+baselines are charged to the model cache. dump_model returns the current
+baselines as model data.
+"""
+import copy
+import threading
+
+import numpy as np
+
+from anomaly_detection import log
+from anomaly_detection import metrics
+from anomaly_detection.ml import contants
+from anomaly_detection.ml.algorithm import AlgorithmBase
+from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import lazy_import
+
+plt = lazy_import('matplotlib.pyplot')
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+ewma_opts = [
+    cfg.FloatOpt('alpha',
+                 default=0.1,
+                 min=0.0001,
+                 max=1,
+                 help='Weight of a new point in the mean and variance'),
+    cfg.FloatOpt('gamma',
+                 default=0.1,
+                 min=0,
+                 max=1,
+                 help='Weight of a new point in its seasonal component'),
+    cfg.IntOpt('season_length',
+               default=0,
+               min=0,
+               help='Seasonal components per season, e.g. 24 for hourly '
+                    'components of a daily season, 0 disables them'),
+    cfg.FloatOpt('season_period',
+                 default=86400,
+                 min=1,
+                 help='Seconds of a season, the component of a point is that '
+                      'of its time in the season'),
+    cfg.FloatOpt('threshold',
+                 default=3.0,
+                 min=0,
+                 help='Standard deviations from the baseline beyond which a '
+                      'point is an outlier'),
+    cfg.IntOpt('max_new_series',
+               default=10000,
+               min=0,
+               help='Series unknown to the training followed by a loaded '
+                    'model, the points of the other new series are not '
+                    'flagged'),
+    cfg.IntOpt('warm_up',
+               default=30,
+               min=1,
+               help='Points of a series folded in before its outliers are '
+                    'flagged'),
+]
+
+CONF.register_opts(ewma_opts, "ewma")
+
+STREAMED_POINTS = metrics.counter(
+    'anomaly_detection_ewma_streamed_points_total',
+    'Points scored and folded into the baselines of loaded EWMA models')
+UNTRACKED_POINTS = metrics.counter(
+    'anomaly_detection_ewma_untracked_points_total',
+    'Points of new series beyond max_new_series, not flagged')
+MODEL_LOADS = metrics.counter(
+    'anomaly_detection_ewma_model_loads_total',
+    'EWMA models loaded, their baselines restart from the trained state')
+
+
+class Baseline(object):
+    """Exponentially weighted baseline of one series."""
+
+    def __init__(self, width=2, season_length=0):
+        self.count = 0
+        self.level = np.zeros(width)
+        self.variance = np.zeros(width)
+        self.seasonal = np.zeros((season_length, width))
+
+    def update(self, point, alpha, gamma=0.0, season=None):
+        """Fold point in, return its deviation before the update.
+
+        The deviation of every column is in standard deviations, NaN for
+        the first point.
+
+        :param season: seasonal component of the point, None if unknown
+        """
+        if not self.count:
+            self.count = 1
+            self.level = np.array(point, dtype=float)
+            return np.full(len(self.level), np.nan)
+        seasonal = self.seasonal[season] if season is not None else 0.0
+        residual = point - self.level - seasonal
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deviation = np.abs(residual) / np.sqrt(self.variance)
+        deviation[residual == 0] = 0.0
+
+        self.level = self.level + alpha * (point - seasonal - self.level)
+        # incremental exponentially weighted variance of the residuals
+        self.variance = (1 - alpha) * (self.variance + alpha * residual ** 2)
+        if season is not None:
+            self.seasonal[season] += gamma * (point - self.level - seasonal)
+        self.count += 1
+        return deviation
+
+
+class EWMA(AlgorithmBase):
+    def __init__(self):
+        super(EWMA, self).__init__(algorithm_name=contants.EWMA_MODEL)
+
+    @staticmethod
+    def _season(md, timestamp):
+        if not md["season_length"] or np.isnan(timestamp):
+            return None
+        period = md["season_period"]
+        return int(timestamp % period * md["season_length"] // period)
+
+    def _is_outlier(self, md, baseline, row):
+        warmed_up = baseline.count >= md["warm_up"]
+        season = self._season(md, row[3]) if len(row) > 3 else None
+        deviation = baseline.update(row[0:2], md["alpha"], md["gamma"], season)
+        return bool(warmed_up and (deviation > md["threshold"]).any())
+
+    def create_training(self, training):
+        num = CONF.snapshot('training').dataset_number
+        conf = CONF.snapshot('ewma')
+        md = {"alpha": conf.alpha, "gamma": conf.gamma, "season_length": conf.season_length,
+              "season_period": conf.season_period, "threshold": conf.threshold,
+              "warm_up": conf.warm_up, "baselines": {}}
+        # replay the rows in order, flagging them like a stream would
+        tp = flagged = positives = 0
+        for series_ids, block in self.dataset.iter_series_blocks(limit=num, with_time=True):
+            for series_id, row in zip(series_ids, block):
+                baseline = md["baselines"].get(series_id)
+                if baseline is None:
+                    baseline = md["baselines"][series_id] = Baseline(
+                        season_length=conf.season_length)
+                outlier = self._is_outlier(md, baseline, row)
+                anomalous = bool(row[2] > 0)
+                tp += outlier and anomalous
+                flagged += outlier
+                positives += anomalous
+        f1score = 2.0 * tp / (flagged + positives) if positives else None
+        LOG.info("warmed up the baselines of %d series, f1_score: %s",
+                 len(md["baselines"]), f1score)
+        model_data = self._dump_baselines(md)
+        model_data["f1_score"] = f1score
+        return model_data
+
+    def dump_model(self, md):
+        """Return the model data of a loaded model and its current baselines."""
+        with md["lock"]:
+            model_data = dict((k, v) for k, v in md.items()
+                              if k not in ("lock", "baselines", "new_series", "series",
+                                           "count", "level", "variance", "seasonal"))
+            model_data["baselines"] = dict(
+                (series_id, copy.deepcopy(baseline))
+                for series_id, baseline in md["baselines"].items())
+        return self._dump_baselines(model_data)
+
+    @staticmethod
+    def _dump_baselines(md):
+        baselines = md.pop("baselines")
+        series = sorted(baselines)
+        width, length = 2, md["season_length"]
+        md["series"] = np.array(series, dtype=bytes)
+        md["count"] = np.zeros(len(series), dtype=np.int64)
+        md["level"] = np.zeros((len(series), width))
+        md["variance"] = np.zeros((len(series), width))
+        md["seasonal"] = np.zeros((len(series), length, width))
+        for i, series_id in enumerate(series):
+            baseline = baselines[series_id]
+            md["count"][i] = baseline.count
+            md["level"][i] = baseline.level
+            md["variance"][i] = baseline.variance
+            md["seasonal"][i] = baseline.seasonal
+        return md
+
+    def load_model(self, model_data):
+        md = super(EWMA, self).load_model(model_data)
+        # the baselines keep following the series scored with the model,
+        # from the trained state whenever it is loaded again
+        baselines = {}
+        for i, series_id in enumerate(md["series"]):
+            baseline = Baseline(season_length=md["season_length"])
+            baseline.count = int(md["count"][i])
+            baseline.level = np.array(md["level"][i])
+            baseline.variance = np.array(md["variance"][i])
+            baseline.seasonal = np.array(md["seasonal"][i])
+            baselines[series_id] = baseline
+        md["baselines"] = baselines
+        md["new_series"] = 0
+        md["lock"] = threading.Lock()
+        MODEL_LOADS.inc()
+        return md
+
+    def get_training_figure(self, md):
+        level = md["level"]
+        fig = plt.figure()
+        plt.title('EWMA Baselines')
+        plt.xlabel("IOPS (tps)")
+        plt.ylabel("Latency (μs)")
+        plt.plot(level[:, 0], level[:, 1], "bx", label='series baseline')
+        plt.legend(loc='upper right')
+        return fig
+
+    def prediction(self, md, dataset):
+        # rows without series are those of the CSV datasets
+        return self.prediction_by_series(md, dataset, np.zeros(len(dataset), dtype='S1'))
+
+    def prediction_by_series(self, md, dataset, series_ids):
+        """Flag the outliers of the rows, in order, and fold them in.
+
+        The baselines of the loaded model md are updated, rows with a
+        fourth column, their time in seconds since the epoch, are compared
+        to the seasonal component of that time.
+        """
+        series_ids = np.asarray(series_ids)
+        if series_ids.dtype.kind == 'U':
+            series_ids = np.char.encode(series_ids, 'utf-8')
+        result = np.zeros(len(dataset), dtype=bool)
+        max_new_series = CONF.snapshot('ewma').max_new_series
+        untracked = 0
+        with md["lock"]:
+            for i, (series_id, row) in enumerate(zip(series_ids, dataset)):
+                baseline = md["baselines"].get(series_id)
+                if baseline is None:
+                    if md["new_series"] >= max_new_series:
+                        untracked += 1
+                        continue
+                    md["new_series"] += 1
+                    baseline = md["baselines"][series_id] = Baseline(
+                        season_length=md["season_length"])
+                result[i] = self._is_outlier(md, baseline, row)
+        STREAMED_POINTS.inc(amount=len(dataset) - untracked)
+        if untracked:
+            UNTRACKED_POINTS.inc(amount=untracked)
+            LOG.warning("%d points of new series beyond max_new_series %d are not flagged",
+                        untracked, max_new_series)
+        return result
+
+    def state_nbytes(self, md):
+        # arrays of the baselines and a rough estimate of their objects
+        width = 2
+        per_series = 8 * width * (2 + md["season_length"]) + 512
+        return md["new_series"] * per_series
+
+    def get_prediction_figure(self, md, dataset):
+        pass
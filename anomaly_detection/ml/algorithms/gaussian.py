@@ -12,16 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import matplotlib.pyplot as plt
 import numpy as np
-from scipy.stats import multivariate_normal
-from sklearn.metrics import f1_score
 
 from anomaly_detection import log
 from anomaly_detection.ml import contants
 from anomaly_detection.ml.algorithm import AlgorithmBase
 from anomaly_detection.utils import config as cfg
-from anomaly_detection.utils import np_json
+from anomaly_detection.utils import lazy_import
+
+plt = lazy_import('matplotlib.pyplot')
+metrics = lazy_import('sklearn.metrics')
+stats = lazy_import('scipy.stats')
 
 CONF = cfg.CONF
 LOG = log.getLogger(__name__)
@@ -38,8 +39,40 @@ def estimate_gaussian(dataset):
     return mu, sigma
 
 
+class GaussianEstimator(object):
+    """Mean and covariance of a dataset fed block by block.
+
+    Blocks are merged with the pairwise update of Chan et al., the result
+    matches estimate_gaussian on the whole dataset without holding it.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+
+    def update(self, block):
+        n = len(block)
+        if not n:
+            return
+        mean = np.mean(block, axis=0)
+        centered = block - mean
+        m2 = centered.T.dot(centered)
+        if not self.count:
+            self.count, self.mean, self._m2 = n, mean, m2
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self._m2 = self._m2 + m2 + np.outer(delta, delta) * self.count * n / total
+        self.count = total
+
+    def covariance(self):
+        return self._m2 / (self.count - 1)
+
+
 def multivariate_gaussian(dataset, mu, sigma):
-    p = multivariate_normal(mean=mu, cov=sigma)
+    p = stats.multivariate_normal(mean=mu, cov=sigma)
     return p.logpdf(dataset)
 
 
@@ -50,7 +83,7 @@ def select_threshold_by_cv(probs,gt):
     epsilons = np.arange(min(probs), max(probs), step_size)
     for epsilon in np.nditer(epsilons):
         predictions = (probs < epsilon)
-        f = f1_score(gt, predictions, average="binary")
+        f = metrics.f1_score(gt, predictions, average="binary")
         if f > best_f1:
             best_f1 = f
             best_epsilon = epsilon
@@ -61,40 +94,49 @@ class Gaussian(AlgorithmBase):
     def __init__(self):
         super(Gaussian, self).__init__(algorithm_name=contants.GAUSSIAN_MODEL)
 
-    def _get_cv_and_gt(self):
-        # cv: cross validation dataset
-        # gt: ground truth dataset
-        num = CONF.training.dataset_number
-        data = self.dataset.get(offset=num//2, limit=num)
-        return data[:, 0:2], data[:, 2]
-
     def _get_tr(self):
         # tr: training dataset
-        num = CONF.training.dataset_number
+        num = CONF.snapshot('training').dataset_number
         data = self.dataset.get(limit=num//2)
         return data[:, 0:2]
 
     def create_training(self, training):
-        cv_data, gt_data = self._get_cv_and_gt()
-        tr_data = self._get_tr()
-        mu, sigma = estimate_gaussian(tr_data)
-        p_cv = multivariate_gaussian(cv_data, mu, sigma)
+        num = CONF.snapshot('training').dataset_number
+        # tr: training dataset, streamed into the estimator
+        estimator = GaussianEstimator()
+        for block in self.dataset.iter_blocks(limit=num//2):
+            estimator.update(block[:, 0:2])
+        mu, sigma = estimator.mean, estimator.covariance()
+        # cv: cross validation dataset, gt: its ground truth, only the
+        # probabilities of the cv samples are kept
+        distribution = stats.multivariate_normal(mean=mu, cov=sigma)
+        p_cv, gt_data = [], []
+        for block in self.dataset.iter_blocks(offset=num//2, limit=num):
+            p_cv.append(np.atleast_1d(distribution.logpdf(block[:, 0:2])))
+            gt_data.append(block[:, 2])
+        p_cv = np.concatenate(p_cv)
+        gt_data = np.concatenate(gt_data)
         # The epsilon value with highest f-score will be selected as threshold
         f1score, ep = select_threshold_by_cv(p_cv, gt_data)
         model_data = {"mu": mu, "sigma": sigma, "epsilon": ep, "f1_score": f1score}
         LOG.info("parameter: %s", model_data)
-        return np_json.dumps(model_data)
+        return model_data
+
+    def load_model(self, model_data):
+        md = super(Gaussian, self).load_model(model_data)
+        # freeze the distribution once so scoring doesn't factorize sigma again
+        md["distribution"] = stats.multivariate_normal(mean=md.get("mu"), cov=md.get("sigma"))
+        return md
 
-    def get_training_figure(self, training):
+    def get_training_figure(self, md):
         # using training data as the testing data
         test_data = self._get_tr()
-        md = np_json.loads(training.model_data)
         mu = md.get("mu")
         sigma = md.get("sigma")
         ep = md.get("epsilon")
         f1score = md.get("f1_score")
         LOG.info('mu: %s, sigma: %s, epsilon: %s, f1_score: %s', mu, sigma, ep, f1score)
-        p = multivariate_gaussian(test_data, mu, sigma)
+        p = md["distribution"].logpdf(test_data)
         outliers = test_data[(p < ep)]
         fig = plt.figure()
         plt.title('Gaussian Estimated Figure')
@@ -106,8 +148,10 @@ class Gaussian(AlgorithmBase):
 
         return fig
 
-    def prediction(self, training, dataset):
-        return dataset
+    def prediction(self, md, dataset):
+        # returns True for every sample which is an outlier
+        p = np.atleast_1d(md["distribution"].logpdf(dataset[:, 0:2]))
+        return p < md.get("epsilon")
 
-    def get_prediction_figure(self, training, dataset):
+    def get_prediction_figure(self, md, dataset):
         pass
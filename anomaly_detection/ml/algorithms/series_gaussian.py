@@ -0,0 +1,214 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Gaussian models of every series, fitted together.
+
+Every series with at least min_samples rows gets its own mean and
+covariance of (iops, latency), the rows of the other series are scored
+with the model of all rows. The sums of all series are accumulated with
+np.bincount, so fitting thousands of series costs a few vector operations
+per block instead of one estimator per series.
+"""
+
+import numpy as np
+
+from anomaly_detection import exception
+from anomaly_detection import log
+from anomaly_detection.ml import contants
+from anomaly_detection.ml.algorithm import AlgorithmBase
+from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import lazy_import
+
+plt = lazy_import('matplotlib.pyplot')
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+series_gaussian_opts = [
+    cfg.IntOpt('min_samples',
+               default=30,
+               min=2,
+               help='Rows a series needs to get its own model, the rows of '
+                    'the other series are scored with the model of all rows'),
+    cfg.FloatOpt('alpha',
+                 default=0.001,
+                 min=1e-12,
+                 max=1,
+                 help='Probability of a normal row to be an outlier, sets the '
+                      'threshold when the dataset has no labelled anomalies'),
+]
+
+CONF.register_opts(series_gaussian_opts, "series_gaussian")
+
+
+def _grow(array, size):
+    if len(array) >= size:
+        return array
+    return np.concatenate([array, np.zeros((size - len(array),) + array.shape[1:])])
+
+
+class SeriesStatistics(object):
+    """Count, sums and sums of products of the rows of every series."""
+
+    def __init__(self, width=2):
+        self.width = width
+        self.series = {}
+        self.count = np.zeros(0)
+        self.sums = np.zeros((0, width))
+        self.products = np.zeros((0, width, width))
+        self.shift = None
+
+    def index(self, series_ids):
+        """Return the index of the series of every row, new series are added."""
+        uniques, inverse = np.unique(series_ids, return_inverse=True)
+        indexes = np.array([self.series.setdefault(s, len(self.series)) for s in uniques],
+                           dtype=np.intp)
+        return indexes[inverse]
+
+    def update(self, series_ids, block):
+        if not len(block):
+            return
+        if self.shift is None:
+            # sums of squares of rows shifted near the mean stay accurate
+            self.shift = block.mean(axis=0)
+        x = block - self.shift
+        indexes = self.index(series_ids)
+        size = len(self.series)
+        self.count = _grow(self.count, size)
+        self.sums = _grow(self.sums, size)
+        self.products = _grow(self.products, size)
+        self.count += np.bincount(indexes, minlength=size)
+        for i in range(self.width):
+            self.sums[:, i] += np.bincount(indexes, x[:, i], minlength=size)
+            for j in range(i, self.width):
+                product = np.bincount(indexes, x[:, i] * x[:, j], minlength=size)
+                self.products[:, i, j] += product
+                if i != j:
+                    self.products[:, j, i] += product
+
+    def fit(self, min_samples):
+        """Return the model data of the series with at least min_samples rows.
+
+        The last mean and precision matrix are those of all rows.
+        """
+        ids = np.array(list(self.series), dtype=bytes)
+        indexes = np.array(list(self.series.values()), dtype=np.intp)
+        order = np.argsort(ids, kind='mergesort')
+        ids, indexes = ids[order], indexes[order]
+        keep = self.count[indexes] >= min_samples
+        ids, indexes = ids[keep], indexes[keep]
+
+        count = np.append(self.count[indexes], self.count.sum())
+        sums = np.concatenate([self.sums[indexes], self.sums.sum(axis=0)[None]])
+        products = np.concatenate([self.products[indexes],
+                                   self.products.sum(axis=0)[None]])
+        mean = sums / count[:, None]
+        cov = (products - count[:, None, None] * mean[:, :, None] * mean[:, None, :]) / \
+            (count[:, None, None] - 1)
+        # constant series have a singular covariance
+        ridge = 1e-6 * np.trace(cov, axis1=1, axis2=2) / self.width + 1e-12
+        cov += ridge[:, None, None] * np.eye(self.width)
+        return {"series": ids,
+                "count": count.astype(np.int64),
+                "mu": mean + self.shift,
+                "precision": np.linalg.inv(cov)}
+
+
+def encode_series_ids(series_ids):
+    """Return series ids as the utf-8 encoded bytes array models are keyed by."""
+    series_ids = np.asarray(series_ids)
+    if series_ids.dtype.kind == 'U':
+        series_ids = np.char.encode(series_ids, 'utf-8')
+    return series_ids
+
+
+def model_indexes(md, series_ids):
+    """Return the index of the model of every series, that of all rows if none."""
+    series = md["series"]
+    if not len(series):
+        return np.full(len(series_ids), 0, dtype=np.intp)
+    indexes = np.minimum(np.searchsorted(series, series_ids), len(series) - 1)
+    return np.where(series[indexes] == series_ids, indexes, len(series))
+
+
+def mahalanobis(md, dataset, indexes):
+    """Return the squared Mahalanobis distance of every row to its model."""
+    delta = dataset[:, 0:2] - md["mu"][indexes]
+    return np.einsum('ni,nij,nj->n', delta, md["precision"][indexes], delta)
+
+
+def select_threshold(scores, gt):
+    """Return the best F1 score and the threshold of the scores flagging it."""
+    order = np.argsort(-scores, kind='mergesort')
+    tp = np.cumsum(gt[order] > 0)
+    f1 = 2.0 * tp / (np.arange(1, len(scores) + 1) + tp[-1])
+    best = np.argmax(f1)
+    return f1[best], scores[order[best]]
+
+
+class SeriesGaussian(AlgorithmBase):
+    def __init__(self):
+        super(SeriesGaussian, self).__init__(algorithm_name=contants.SERIES_GAUSSIAN_MODEL)
+
+    def create_training(self, training):
+        num = CONF.snapshot('training').dataset_number
+        conf = CONF.snapshot('series_gaussian')
+        stats = SeriesStatistics()
+        for series_ids, block in self.dataset.iter_series_blocks(limit=num):
+            stats.update(series_ids, block[:, 0:2])
+        if not stats.count.sum():
+            raise exception.InvalidInput(reason='no performance data of a series to train on')
+        model_data = stats.fit(conf.min_samples)
+
+        # the threshold of the squared distances is selected on the
+        # training rows, or follows from alpha without labelled anomalies
+        scores, gt_data = [], []
+        for series_ids, block in self.dataset.iter_series_blocks(limit=num):
+            indexes = model_indexes(model_data, series_ids)
+            scores.append(mahalanobis(model_data, block, indexes))
+            gt_data.append(block[:, 2])
+        scores = np.concatenate(scores)
+        gt_data = np.nan_to_num(np.concatenate(gt_data))
+        if gt_data.any():
+            f1score, threshold = select_threshold(scores, gt_data)
+        else:
+            # squared distances of 2-d gaussian rows follow a chi-squared
+            # distribution with 2 degrees of freedom
+            f1score, threshold = None, -2 * np.log(conf.alpha)
+        model_data.update({"threshold": float(threshold), "f1_score": f1score})
+        LOG.info("fitted %d series models on %d rows, threshold: %s, f1_score: %s",
+                 len(model_data["series"]), len(scores), threshold, f1score)
+        return model_data
+
+    def get_training_figure(self, md):
+        mu = md["mu"]
+        fig = plt.figure()
+        plt.title('Series Gaussian Means')
+        plt.xlabel("IOPS (tps)")
+        plt.ylabel("Latency (μs)")
+        plt.plot(mu[:-1, 0], mu[:-1, 1], "bx", label='series mean')
+        plt.plot(mu[-1:, 0], mu[-1:, 1], "ro", label='mean of all series')
+        plt.legend(loc='upper right')
+        return fig
+
+    def prediction(self, md, dataset):
+        # rows of unknown series are scored with the model of all rows
+        indexes = np.full(len(dataset), len(md["series"]), dtype=np.intp)
+        return mahalanobis(md, dataset, indexes) >= md["threshold"]
+
+    def prediction_by_series(self, md, dataset, series_ids):
+        indexes = model_indexes(md, encode_series_ids(series_ids))
+        return mahalanobis(md, dataset, indexes) >= md["threshold"]
+
+    def get_prediction_figure(self, md, dataset):
+        pass
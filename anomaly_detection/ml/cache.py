@@ -0,0 +1,134 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import collections
+import threading
+import time
+
+from anomaly_detection import log
+
+LOG = log.getLogger(__name__)
+
+# state_nbytes is the size of the state the model gained while scoring,
+# validated_at when its version was last checked against the database
+CachedModel = collections.namedtuple(
+    'CachedModel', ['training_id', 'version', 'tenant_id', 'algorithm', 'model', 'nbytes',
+                    'state_nbytes', 'validated_at'])
+
+
+class ModelCache(object):
+    """LRU cache of decoded models bounded by entry count and bytes.
+
+    Entries are looked up by training id and carry the version
+    (``updated_at``) of the training they were decoded from, a lookup with
+    a different version is a miss.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None):
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, training_id, version=None):
+        with self._lock:
+            entry = self._entries.pop(training_id, None)
+            if entry is None or (version is not None and entry.version != version):
+                if entry is not None:
+                    self._bytes -= entry.nbytes + entry.state_nbytes
+                self.misses += 1
+                return None
+            # re-insert to mark as most recently used
+            self._entries[training_id] = entry
+            self.hits += 1
+            return entry
+
+    def put(self, training_id, version, tenant_id, algorithm, model, nbytes=0):
+        entry = CachedModel(training_id, version, tenant_id, algorithm, model, nbytes, 0,
+                            time.time())
+        if not self._max_entries:
+            return entry
+        if self._max_bytes and nbytes > self._max_bytes:
+            LOG.debug("model of training %s is too large to cache: %d bytes",
+                      training_id, nbytes)
+            return entry
+        with self._lock:
+            old = self._entries.pop(training_id, None)
+            if old is not None:
+                self._bytes -= old.nbytes + old.state_nbytes
+            self._entries[training_id] = entry
+            self._bytes += nbytes
+            self._evict()
+        return entry
+
+    def charge(self, training_id, state_nbytes):
+        """Account the state an entry's model gained while scoring."""
+        with self._lock:
+            entry = self._entries.get(training_id)
+            if entry is None or entry.state_nbytes == state_nbytes:
+                return
+            self._bytes += state_nbytes - entry.state_nbytes
+            self._entries[training_id] = entry._replace(state_nbytes=state_nbytes)
+            self._evict()
+
+    def validate(self, training_id, validated_at):
+        """Record that an entry's version was checked at validated_at."""
+        with self._lock:
+            entry = self._entries.get(training_id)
+            if entry is not None:
+                self._entries[training_id] = entry._replace(validated_at=validated_at)
+
+    def invalidate(self, training_id):
+        with self._lock:
+            entry = self._entries.pop(training_id, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes + entry.state_nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def resize(self, max_entries, max_bytes=None):
+        with self._lock:
+            self._max_entries = max_entries
+            self._max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (
+                len(self._entries) > self._max_entries or
+                (self._max_bytes and self._bytes > self._max_bytes)):
+            _training_id, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.nbytes + entry.state_nbytes
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, training_id):
+        return training_id in self._entries
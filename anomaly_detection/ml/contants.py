@@ -14,4 +14,5 @@
 
 GAUSSIAN_MODEL = "gaussian"
 DBSCAN_MODEL = "DBSCAN"
-
+SERIES_GAUSSIAN_MODEL = "series_gaussian"
+EWMA_MODEL = "ewma"
@@ -11,13 +11,31 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import itertools
 import os
 
-from numpy import genfromtxt
+from anomaly_detection.utils import lazy_import
+
+np = lazy_import('numpy')
+
+
+def _path(file_name):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
 
 
 def read(file_name, delimiter=',', skip_header=0, max_rows=10000):
-    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
     skip_header += 1  # for title
-    return genfromtxt(file_path, delimiter=delimiter, skip_header=skip_header, max_rows=max_rows)
+    return np.genfromtxt(_path(file_name), delimiter=delimiter, skip_header=skip_header, max_rows=max_rows)
+
 
+def iter_read(file_name, delimiter=',', skip_header=0, chunk_rows=10000):
+    """Yield the rows of the whole file, at most chunk_rows at a time."""
+    with open(_path(file_name)) as f:
+        lines = itertools.islice(f, skip_header + 1, None)  # + 1 for title
+        while True:
+            chunk = list(itertools.islice(lines, chunk_rows))
+            if not chunk:
+                return
+            chunk = [line for line in chunk if line.strip()]
+            if chunk:
+                yield np.atleast_2d(np.genfromtxt(chunk, delimiter=delimiter))
@@ -12,14 +12,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import io
+import threading
+import time
+import weakref
 
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-
+from anomaly_detection import exception
+from anomaly_detection import log
+from anomaly_detection import metrics
+from anomaly_detection import profiler
+from anomaly_detection import units
+from anomaly_detection import watchdog
 from anomaly_detection.db.base import Base
+from anomaly_detection.ml.cache import ModelCache
+from anomaly_detection.utils import import_module
 from anomaly_detection.utils import import_object
+from anomaly_detection.utils import lazy_import
 from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import uuidutils
+
+backend_agg = lazy_import('matplotlib.backends.backend_agg')
+plt = lazy_import('matplotlib.pyplot')
+np_binary = lazy_import('anomaly_detection.utils.np_binary')
 
 CONF = cfg.CONF
+LOG = log.getLogger(__name__)
 
 training_opts = [
     cfg.StrOpt('dataset_source_type',
@@ -29,57 +45,254 @@ training_opts = [
     cfg.StrOpt('dataset_csv_file_name',
                default='performance.csv',
                help='Training dataset csv file name'),
+    cfg.StrOpt('dataset_resolution',
+               choices=[('raw', 'Train on the performance rows.'),
+                        ('minute', 'Train on the per minute rollups.'),
+                        ('hour', 'Train on the per hour rollups.')],
+               default='raw',
+               help='Resolution of the database training dataset. Rollups '
+                    'are maintained by the data parser, their samples are the '
+                    'mean iops and latency of a time bucket, anomalous if one '
+                    'of its rows is. dataset_number then counts buckets'),
     cfg.IntOpt('dataset_number',
                default=10000,
-               help='Dataset number which is used to training')
+               mutable=True,
+               help='Dataset number which is used to training'),
+    cfg.BoolOpt('model_data_compression',
+                default=False,
+                mutable=True,
+                help='Whether to zlib compress the arrays of stored model data'),
+    cfg.IntOpt('model_cache_size',
+               default=128,
+               min=0,
+               mutable=True,
+               help='Maximum number of decoded models kept in memory, 0 '
+                    'disables the model cache'),
+    cfg.IntOpt('model_cache_max_bytes',
+               default=64 * units.Mi,
+               min=0,
+               mutable=True,
+               help='Maximum size in bytes of the model data kept in the '
+                    'model cache, 0 means unlimited'),
+    cfg.FloatOpt('model_cache_revalidate_interval',
+                 default=5.0,
+                 min=0,
+                 mutable=True,
+                 help='Seconds a cached model is used before checking that '
+                      'its training wasn\'t deleted or retrained by another '
+                      'process, 0 checks it on every use'),
 ]
 
 CONF.register_opts(training_opts, "training")
 
+# managers whose model cache follows the reloaded options, a hook per
+# manager would keep every manager alive
+_MANAGERS = weakref.WeakSet()
+
+
+def _resize_model_caches(conf, fresh):
+    if ('training', 'model_cache_size') in fresh or \
+            ('training', 'model_cache_max_bytes') in fresh:
+        for manager in list(_MANAGERS):
+            manager._resize_model_cache(conf)
+
+
+CONF.register_mutate_hook(_resize_model_caches)
+
+OPERATION_SECONDS = metrics.histogram(
+    'anomaly_detection_ml_operation_duration_seconds',
+    'Time spent training, decoding models, scoring and rendering figures',
+    ['operation', 'algorithm'])
+
 
 def print_figure(fig, fmt='png'):
     output = io.BytesIO()
 
     if fmt not in ['png', 'jpg', 'jpeg', 'raw', 'tif', 'tiff', 'rgba']:
         raise TypeError('unsupported image type: %s' % fmt)
-    canvas = FigureCanvas(fig)
-    getattr(canvas, 'print_' + fmt)(output)
+    try:
+        canvas = backend_agg.FigureCanvasAgg(fig)
+        getattr(canvas, 'print_' + fmt)(output)
+    finally:
+        # pyplot keeps every figure alive until it is closed
+        plt.close(fig)
     return output.getvalue()
 
 
 class MLManager(Base):
     _ALGORITHM_MAPPING = {"gaussian": "anomaly_detection.ml.algorithms.gaussian.Gaussian",
-                          "dbscan": "anomaly_detection.ml.algorithms.dbscan.DBSCAN"}
+                          "dbscan": "anomaly_detection.ml.algorithms.dbscan.DBSCAN",
+                          "series_gaussian":
+                              "anomaly_detection.ml.algorithms.series_gaussian.SeriesGaussian",
+                          "ewma": "anomaly_detection.ml.algorithms.ewma.EWMA"}
+    # heavy modules used by the algorithm drivers, imported by warm_up. The
+    # drivers are imported on first use by _get_algorithm, numpy which they
+    # import eagerly is loaded with them
+    _WARM_UP_MODULES = ["matplotlib.pyplot",
+                        "matplotlib.backends.backend_agg",
+                        "scipy.stats",
+                        "sklearn.cluster",
+                        "sklearn.metrics",
+                        "sklearn.preprocessing"]
 
     def __init__(self):
         super(MLManager, self).__init__()
+        self._drivers = {}
+        self._model_cache = None
+        self._lock = threading.Lock()
+        _MANAGERS.add(self)
 
     def _get_algorithm(self, name='gaussian'):
-        return import_object(self._ALGORITHM_MAPPING[name.lower()])
+        name = name.lower()
+        driver = self._drivers.get(name)
+        if driver is None:
+            driver = import_object(self._ALGORITHM_MAPPING[name])
+            self._drivers[name] = driver
+        return driver
+
+    @property
+    def model_cache(self):
+        # created on first use, the configuration is not loaded yet when
+        # the API module instantiates the manager
+        if self._model_cache is None:
+            with self._lock:
+                if self._model_cache is None:
+                    conf = CONF.snapshot('training')
+                    self._model_cache = ModelCache(conf.model_cache_size,
+                                                   conf.model_cache_max_bytes)
+        return self._model_cache
+
+    def _resize_model_cache(self, conf):
+        if self._model_cache is not None:
+            training_conf = conf.snapshot('training')
+            self._model_cache.resize(training_conf.model_cache_size,
+                                     training_conf.model_cache_max_bytes)
+
+    def get_cache_stats(self):
+        return self.model_cache.stats()
+
+    def collect_metrics(self):
+        """Return the model cache statistics as metrics."""
+        stats = self.get_cache_stats()
+        result = []
+        for name, cls, doc in [('entries', metrics.Gauge, 'Models in the model cache'),
+                               ('bytes', metrics.Gauge, 'Model data size in the model cache'),
+                               ('hits', metrics.Counter, 'Model cache hits'),
+                               ('misses', metrics.Counter, 'Model cache misses'),
+                               ('evictions', metrics.Counter, 'Model cache evictions')]:
+            suffix = '_total' if cls is metrics.Counter else ''
+            metric = cls('anomaly_detection_model_cache_' + name + suffix, doc)
+            metric.inc(amount=stats[name])
+            result.append(metric)
+        return result
+
+    def _load_model(self, training):
+        driver = self._get_algorithm(training.get("algorithm"))
+        with metrics.timer(OPERATION_SECONDS, ('decode', training.algorithm)):
+            model = driver.load_model(training.model_data)
+        # the version is that of training_get_version
+        version = training.updated_at or training.created_at
+        return self.model_cache.put(training.id, version, training.tenant_id,
+                                    training.algorithm, model, len(training.model_data or b''))
+
+    def _get_model(self, ctx, training_id):
+        now = time.time()
+        entry = self.model_cache.get(training_id)
+        interval = CONF.snapshot('training').model_cache_revalidate_interval
+        if entry is None or now - entry.validated_at >= interval:
+            # a training deleted or retrained by another process is not
+            # served from the cache, only its version is read
+            try:
+                version = self.db.training_get_version(ctx, training_id)
+            except exception.NotFound:
+                self.model_cache.invalidate(training_id)
+                raise
+            if entry is None or entry.version != version:
+                return self._load_model(self.db.training_get(ctx, training_id))
+            self.model_cache.validate(training_id, now)
+        if not ctx.is_admin and entry.tenant_id != ctx.tenant_id:
+            raise exception.NotFound()
+        return entry
+
+    def warm_up(self, ctx, limit=None, render_figures=True):
+        """Import the ML modules and load trainings into the model cache.
+
+        :param limit: number of most recently updated trainings to load,
+                      all of them if None
+        :param render_figures: render one default figure per algorithm
+        """
+        for name in self._WARM_UP_MODULES:
+            import_module(name)
+        for algorithm in self._ALGORITHM_MAPPING:
+            self._get_algorithm(algorithm)
+
+        cache_size = CONF.snapshot('training').model_cache_size
+        limit = min(limit, cache_size) if limit else cache_size
+        if not limit:
+            return 0
+        trainings = self.db.training_get_all(ctx, limit=limit,
+                                             sort_keys=['updated_at', 'created_at'],
+                                             sort_dirs=['desc', 'desc'])
+        rendered = set()
+        # load the oldest first so the most recent ones end up on top of the LRU
+        for training in reversed(trainings):
+            try:
+                self._load_model(training)
+                if render_figures and training.algorithm not in rendered:
+                    self.get_training_figure(ctx, training.id, 'png')
+                    rendered.add(training.algorithm)
+            except Exception:
+                LOG.exception("failed to warm up training %s", training.id)
+        LOG.info("warmed up %d trainings", len(trainings))
+        return len(trainings)
 
     def create_training(self, ctx, training):
         algorithm = training.get("algorithm")
         driver = self._get_algorithm(algorithm)
-        training["model_data"] = driver.create_training(training)
+        # the id names the profile of the training
+        if not training.get('id'):
+            training['id'] = uuidutils.generate_uuid()
+        profiler_conf = CONF.snapshot('profiler')
+        mode = profiler_conf.mode if profiler_conf.profile_trainings else None
+        with log.context(training_id=training['id']), \
+                profiler.profile('training-%s' % training['id'], mode), \
+                watchdog.watch('training', training['id']), \
+                metrics.timer(OPERATION_SECONDS, ('train', algorithm.lower())):
+            model = driver.create_training(training)
+        training["model_data"] = np_binary.dumps(
+            model, compress=CONF.snapshot('training').model_data_compression)
         return self.db.training_create(ctx, training)
 
+    def delete_training(self, ctx, training_id):
+        self.db.training_delete(ctx, training_id)
+        self.model_cache.invalidate(training_id)
+
     def get_training_figure(self, ctx, training_id, fmt):
-        training = self.db.training_get(ctx, training_id)
-        algorithm = training.get("algorithm")
-        driver = self._get_algorithm(algorithm)
-        fig = driver.get_training_figure(training)
-        return print_figure(fig, fmt)
+        entry = self._get_model(ctx, training_id)
+        driver = self._get_algorithm(entry.algorithm)
+        with metrics.timer(OPERATION_SECONDS, ('render', entry.algorithm)):
+            fig = driver.get_training_figure(entry.model)
+            return print_figure(fig, fmt)
 
-    def prediction(self, ctx, training_id, dataset):
-        training = self.db.training_get(ctx, training_id)
-        algorithm = training.get("algorithm")
-        driver = self._get_algorithm(algorithm)
-        return driver.prediction(training, dataset)
+    def prediction(self, ctx, training_id, dataset, series_ids=None):
+        """Return which rows of dataset are outliers.
 
-    def get_prediction_figure(self, ctx, training_id, dataset, fmt):
-        training = self.db.training_get(ctx, training_id)
-        algorithm = training.get("algorithm")
-        driver = self._get_algorithm(algorithm)
-        fig = driver.get_prediction_figure(training, dataset)
-        return print_figure(fig)
+        :param series_ids: series of every row, models fitted per series
+                           score each row with the model of its series
+        """
+        entry = self._get_model(ctx, training_id)
+        driver = self._get_algorithm(entry.algorithm)
+        with metrics.timer(OPERATION_SECONDS, ('score', entry.algorithm)):
+            if series_ids is None:
+                result = driver.prediction(entry.model, dataset)
+            else:
+                result = driver.prediction_by_series(entry.model, dataset, series_ids)
+        self.model_cache.charge(training_id, driver.state_nbytes(entry.model))
+        return result
 
+    def get_prediction_figure(self, ctx, training_id, dataset, fmt):
+        entry = self._get_model(ctx, training_id)
+        driver = self._get_algorithm(entry.algorithm)
+        with metrics.timer(OPERATION_SECONDS, ('render', entry.algorithm)):
+            fig = driver.get_prediction_figure(entry.model, dataset)
+            return print_figure(fig)
@@ -0,0 +1,193 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""On demand profiling of API requests and trainings.
+
+``cprofile`` runs the code under cProfile and writes a ``.pstats`` file,
+``sampling`` samples the stack of the profiled thread from a background
+thread and writes collapsed stacks (one ``frame;frame;... count`` line per
+stack), the input of flamegraph.pl and speedscope. Output files are named
+after what was profiled, e.g. ``training-<id>.pstats``.
+"""
+import collections
+import contextlib
+import cProfile
+import os
+import sys
+import threading
+import time
+
+from anomaly_detection import log
+from anomaly_detection.utils import config as cfg
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+MODES = ['cprofile', 'sampling']
+
+profiler_opts = [
+    cfg.StrOpt('mode',
+               default='cprofile',
+               choices=MODES,
+               mutable=True,
+               help='Profiler used when profiling is enabled'),
+    cfg.BoolOpt('profile_requests',
+                default=False,
+                help='Profile every API request'),
+    cfg.BoolOpt('profile_trainings',
+                default=False,
+                mutable=True,
+                help='Profile every training'),
+    cfg.BoolOpt('allow_header',
+                default=False,
+                help='Profile API requests of admin users carrying an '
+                     'X-Profile header, set to cprofile or sampling. Without '
+                     'keystone authentication every request is an admin one'),
+    cfg.StrOpt('output_dir',
+               default='/var/lib/anomaly_detection/profiles',
+               mutable=True,
+               help='Directory the profiles are written to'),
+    cfg.FloatOpt('sample_interval',
+                 default=0.005,
+                 min=0.0001,
+                 mutable=True,
+                 help='Seconds between two stack samples of the sampling '
+                      'profiler'),
+    cfg.IntOpt('max_concurrent',
+               default=1,
+               min=1,
+               help='Maximum number of profiles taken at the same time, '
+                    'further requests and trainings run unprofiled'),
+]
+
+CONF.register_opts(profiler_opts, "profiler")
+
+_slots = None
+_slots_lock = threading.Lock()
+_local = threading.local()
+
+
+def _acquire_slot():
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(
+                    CONF.snapshot('profiler').max_concurrent)
+    return _slots.acquire(False)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return '%s:%s' % (os.path.basename(code.co_filename), code.co_name)
+
+
+def collapse_stack(frame, limit=None):
+    """Return the stack of frame as ``outer;...;inner``."""
+    names = []
+    while frame is not None and (limit is None or len(names) < limit):
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler(object):
+    """Samples the stack of one thread from a background thread."""
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.current_thread().ident
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is not None:
+            self.stacks[collapse_stack(frame)] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('%s %d\n' % (stack, count))
+
+
+def _save(name, ext, dump, elapsed):
+    output_dir = CONF.snapshot('profiler').output_dir
+    path = os.path.join(output_dir, '%s.%s' % (name, ext))
+    try:
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        dump(path)
+    except (IOError, OSError) as e:
+        LOG.error("failed to write the profile of %s: %s", name, e)
+    else:
+        LOG.info("profile of %s (%.2fs) written to %s", name, elapsed, path)
+
+
+@contextlib.contextmanager
+def profile(name, mode=None):
+    """Profile the with block if mode is set and a profiling slot is free.
+
+    :param name: file name of the profile, without extension
+    :param mode: one of MODES, None doesn't profile
+    """
+    if mode is None or getattr(_local, 'active', False):
+        # a profile of the enclosing request covers this block already
+        yield
+        return
+    if mode not in MODES:
+        raise ValueError('Unknown profiler mode %s' % mode)
+    if not _acquire_slot():
+        LOG.debug("profiling %s skipped, too many profiles in progress", name)
+        yield
+        return
+
+    start = time.time()
+    _local.active = True
+    try:
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                _save(name, 'pstats', profiler.dump_stats, time.time() - start)
+        else:
+            sampler = StackSampler(interval=CONF.snapshot('profiler').sample_interval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                _save(name, 'collapsed', sampler.dump, time.time() - start)
+    finally:
+        _local.active = False
+        _slots.release()
@@ -44,3 +44,27 @@ def import_object(import_str, *args, **kwargs):
     """
     return import_class(import_str)(*args, **kwargs)
 
+
+class LazyModule(object):
+    """Module proxy which imports the real module on first attribute access.
+
+    Used for heavy dependencies so they are only paid for by the code paths
+    which actually need them.
+    """
+
+    def __init__(self, import_str):
+        self._import_str = import_str
+        self._module = None
+
+    def __getattr__(self, name):
+        if self._module is None:
+            self._module = import_module(self._import_str)
+        return getattr(self._module, name)
+
+    def __repr__(self):
+        return '<LazyModule %s>' % self._import_str
+
+
+def lazy_import(import_str):
+    """Return a proxy of a module which is imported on first use."""
+    return LazyModule(import_str)
@@ -0,0 +1,150 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Append-only capture files of raw telemetry messages.
+
+A capture starts with the magic ``b'ADCAP'`` and a format version byte,
+followed by records::
+
+    timestamp   d   seconds since the epoch
+    kind        B   KIND_KAFKA or KIND_TELEMETRY
+    length      I   payload length
+    payload         raw message bytes
+
+A record cut short by a crash is ignored when reading, and dropped when
+the capture is opened again for appending.
+"""
+import atexit
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'ADCAP'
+VERSION = 1
+KIND_KAFKA = 1
+KIND_TELEMETRY = 2
+
+_HEADER = struct.Struct('<5sB')
+_RECORD = struct.Struct('<dBI')
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _read_header(f, path):
+    """Return False if the capture has no complete header."""
+    header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return False
+    magic, version = _HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('%s is not a capture file' % path)
+    if version > VERSION:
+        raise ValueError('Unsupported capture version %d' % version)
+    return True
+
+
+def _read_records(f):
+    """Yield the (timestamp, kind, payload) complete records after the header."""
+    while True:
+        head = f.read(_RECORD.size)
+        if len(head) < _RECORD.size:
+            return
+        timestamp, kind, length = _RECORD.unpack(head)
+        payload = f.read(length)
+        if len(payload) < length:
+            return
+        yield timestamp, kind, payload
+
+
+class CaptureWriter(object):
+    """Thread safe writer appending records to a capture file.
+
+    Every record is flushed once written, so a killed process loses at
+    most the record being written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        try:
+            end = 0
+            if _read_header(self._file, path):
+                end = self._file.tell()
+                for _record in _read_records(self._file):
+                    end = self._file.tell()
+            # drop a record cut short by a crash, appended records would be
+            # read as its remainder
+            self._file.seek(end)
+            self._file.truncate()
+            if not end:
+                self._file.write(_HEADER.pack(MAGIC, VERSION))
+                self._file.flush()
+        except Exception:
+            self._file.close()
+            raise
+
+    def write(self, payload, kind=KIND_KAFKA, timestamp=None):
+        if not isinstance(payload, bytes):
+            payload = payload.encode('utf-8')
+        if timestamp is None:
+            timestamp = time.time()
+        record = _RECORD.pack(timestamp, kind, len(payload)) + payload
+        with self._lock:
+            self._file.write(record)
+            self._file.flush()
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def get_writer(path):
+    """Return the process wide writer of a capture file."""
+    path = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = CaptureWriter(path)
+        return writer
+
+
+@atexit.register
+def _close_writers():
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+
+class CaptureReader(object):
+    """Iterates over the (timestamp, kind, payload) records of a capture."""
+
+    def __init__(self, path, kinds=None):
+        self.path = path
+        self._kinds = kinds
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            if not _read_header(f, self.path):
+                return
+            for timestamp, kind, payload in _read_records(f):
+                if self._kinds is None or kind in self._kinds:
+                    yield timestamp, kind, payload
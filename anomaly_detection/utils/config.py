@@ -16,11 +16,14 @@ import collections
 import copy
 import functools
 import itertools
+import logging
 import re
 from configparser import ConfigParser, NoOptionError, NoSectionError
 
 import six
 
+LOG = logging.getLogger(__name__)
+
 
 class Error(Exception):
     """Base class for cfg exceptions."""
@@ -402,7 +405,8 @@ class List(ConfigType):
 
 
 class Opt(object):
-    def __init__(self, name, typ=None, default=None, help=None, secret=False, required=False, ):
+    def __init__(self, name, typ=None, default=None, help=None, secret=False, required=False,
+                 mutable=False):
         if name.startswith('_'):
             raise ValueError('illegal name %s with prefix _' % (name,))
         self.name = name
@@ -417,6 +421,9 @@ class Opt(object):
         self.help = help
         self.secret = secret
         self.required = required
+        # mutable options take the new value of a reloaded config file,
+        # changes to the others need a restart
+        self.mutable = mutable
         self._check_default()
 
     def _default_is_ref(self):
@@ -535,7 +542,14 @@ class ConfigOpts(collections.Mapping):
         self._groups = {}
         self._args = None
         self._namespace = None
+        self._config_file = None
+        # config file read again by mutate_config_files()
+        self._mutable_namespace = None
+        self._mutate_hooks = []
         self.__cache = {}
+        # group name -> namedtuple of its values, replaced as a whole
+        self._snapshots = {}
+        self._snapshot_types = {}
         self._config_opts = []
         self._validate_default_values = False
         self._sources = []
@@ -547,6 +561,7 @@ class ConfigOpts(collections.Mapping):
             if kwargs.pop('clear_cache', True):
                 result = f(self, *args, **kwargs)
                 self.__cache.clear()
+                self._snapshots = {}
                 return result
             else:
                 return f(self, *args, **kwargs)
@@ -557,29 +572,117 @@ class ConfigOpts(collections.Mapping):
     def clear(self):
         self._args = None
         self._namespace = None
+        self._mutable_namespace = None
         # Keep _mutate_hooks
         self._validate_default_values = False
         self.unregister_opts(self._config_opts)
 
     def get_config_file(self):
-        for i, arg in enumerate(self._args):
+        for i, arg in enumerate(self._args or []):
             if arg == '--config-file':
                 if len(self._args) > i+1:
                     return self._args[i+1]
             if arg.startswith('--config-file='):
-                key, sep, val = arg.partion("=")
+                key, sep, val = arg.partition("=")
                 return val
         else:
             return None
 
+    @__clear_cache
     def __call__(self, args):
         self._args = args
         self._config_file = self.get_config_file()
+        self._mutable_namespace = None
         if self._config_file is not None:
             self._namespace = ConfigParser()
             if not self._namespace.read(self._config_file):
                 raise Error('Read config files "%s" error' % self._config_file)
 
+    def register_mutate_hook(self, hook):
+        """Call hook(conf, fresh) when a reload changed mutable options.
+
+        fresh maps the (group name, option name) of every changed option to
+        its (old, new) values, the group name of DEFAULT options is None.
+        """
+        if hook not in self._mutate_hooks:
+            self._mutate_hooks.append(hook)
+
+    def _iter_opts(self):
+        for opt in list(self._opts.values()):
+            yield None, opt
+        for group in list(self._groups.values()):
+            for opt in list(group._opts.values()):
+                yield group, opt
+
+    @__clear_cache
+    def _set_mutable_namespace(self, namespace):
+        self._mutable_namespace = namespace
+
+    def mutate_config_files(self):
+        """Read the config file again and apply the new mutable values.
+
+        Changes of the other options are logged and ignored. Nothing is
+        applied if the file can't be read or holds an invalid value.
+
+        :returns: the fresh dict passed to the mutate hooks
+        :raises: Error, ValueError
+        """
+        if self._config_file is None:
+            return {}
+        namespace = ConfigParser()
+        if not namespace.read(self._config_file):
+            raise Error('Read config files "%s" error' % self._config_file)
+
+        fresh = {}
+        for group, opt in self._iter_opts():
+            old = self._get(opt.name, group)
+            new = self._do_get(opt.name, group, namespace)
+            if old == new:
+                continue
+            group_name = group.name if group else None
+            if opt.mutable:
+                fresh[(group_name, opt.name)] = (old, new)
+            else:
+                LOG.warning("Ignoring the change of option %s in group [%s], "
+                            "it needs a restart", opt.name, group_name or 'DEFAULT')
+
+        self._set_mutable_namespace(namespace)
+        for key in sorted(fresh, key=str):
+            LOG.info("Option %s in group [%s] changed from %r to %r",
+                     key[1], key[0] or 'DEFAULT', fresh[key][0], fresh[key][1])
+        if fresh:
+            for hook in list(self._mutate_hooks):
+                try:
+                    hook(self, fresh)
+                except Exception:
+                    LOG.exception("Config mutate hook %s failed", hook)
+        return fresh
+
+    def snapshot(self, group=None):
+        """Return the option values of a group as an immutable namedtuple.
+
+        The values are resolved once, reading an option of a snapshot is a
+        plain attribute access. Snapshots aren't updated, a new one is built
+        when the configuration changes, so code holding one sees a
+        consistent set of values.
+
+        :param group: the group name, None for the options without group
+        """
+        snapshots = self._snapshots
+        snapshot = snapshots.get(group)
+        if snapshot is None:
+            group_obj = None if group is None else self._get_group(group)
+            opts = self._opts if group is None else group_obj._opts
+            names = tuple(sorted(opts))
+            snapshot_type = self._snapshot_types.get((group, names))
+            if snapshot_type is None:
+                snapshot_type = collections.namedtuple(
+                    '%sSnapshot' % (group or 'default').title().replace('_', ''), names)
+                self._snapshot_types[(group, names)] = snapshot_type
+            snapshot = snapshot_type(*[self._get(name, group_obj) for name in names])
+            snapshots[group] = snapshot
+        return snapshot
+
     def __getattr__(self, name):
         """Look up an option value and perform string substitution.
 
@@ -723,18 +826,22 @@ class ConfigOpts(collections.Mapping):
         self.__cache[key] = value
         return value
 
-    def _do_get(self, name, group=None):
+    def _do_get(self, name, group=None, namespace=None):
         if group is None and name in self._groups:
             return self.GroupAttr(self, self._get_group(name))
         opt = self._get_opt_info(name, group)
+        if namespace is None:
+            namespace = self._namespace
+            if opt.mutable and self._mutable_namespace is not None:
+                namespace = self._mutable_namespace
 
         def convert(value):
             return self._convert_value(value, opt)
 
         group_name = group.name if group else None
-        if self._namespace is not None:
+        if namespace is not None:
             try:
-                return convert(opt._get_from_namespace(self._namespace, group_name))
+                return convert(opt._get_from_namespace(namespace, group_name))
             except (NoOptionError, NoSectionError):
                 pass
             except ValueError:
@@ -0,0 +1,169 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Versioned binary container for model data.
+
+Layout of a container, all integers are little-endian::
+
+    magic       4s  b'ADMF'
+    version     B   format version
+    flags       B   FLAG_ZLIB if the payload is zlib compressed
+    reserved    H
+    header_len  I   length of the header, including padding
+    header          utf-8 JSON document padded with spaces
+    payload         raw array buffers
+
+The header holds the plain (JSON serializable) values of the model and a
+descriptor (dtype, shape, offset, nbytes) for every array. The payload starts
+and every array buffer begins on an ``ALIGNMENT`` boundary relative to the
+start of the container, so arrays can be handed out with ``np.frombuffer``
+straight from the loaded bytes or from a memory map without copying.
+"""
+import json
+import mmap
+import struct
+import zlib
+
+import numpy as np
+import six
+
+from anomaly_detection.utils import np_json
+
+MAGIC = b'ADMF'
+VERSION = 1
+FLAG_ZLIB = 0x01
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct('<4sBBHI')
+
+
+def _align(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def is_container(data):
+    """Return True if data starts with the container magic."""
+    if isinstance(data, six.text_type):
+        return False
+    return bytes(memoryview(data)[:len(MAGIC)]) == MAGIC
+
+
+def dumps(obj, compress=False, level=6):
+    """Serialize a flat dict of plain values and ndarrays to bytes.
+
+    :param obj: dict mapping names to ndarrays, numpy scalars or JSON
+                serializable values
+    :param compress: zlib compress the array payload
+    :param level: zlib compression level
+    """
+    if not isinstance(obj, dict):
+        raise TypeError('Unable to serialise object of type {}'.format(type(obj)))
+
+    meta = {}
+    arrays = []
+    offset = 0
+    for name in sorted(obj):
+        value = obj[name]
+        scalar = isinstance(value, np.generic)
+        if scalar:
+            value = np.asarray(value)
+        if not isinstance(value, np.ndarray):
+            meta[name] = value
+            continue
+        if value.dtype.hasobject:
+            raise TypeError('Unable to serialise object array {}'.format(name))
+        shape = list(value.shape)
+        # NOTE: ascontiguousarray returns at least 1-d arrays, keep the shape
+        value = np.ascontiguousarray(value)
+        arrays.append(({'name': name,
+                        'dtype': value.dtype.str,
+                        'shape': shape,
+                        'scalar': scalar,
+                        'offset': offset,
+                        'nbytes': value.nbytes}, value))
+        offset = _align(offset + value.nbytes)
+
+    payload = bytearray(offset)
+    for desc, value in arrays:
+        if not desc['nbytes']:
+            continue
+        dst = np.frombuffer(payload, dtype=value.dtype, count=value.size,
+                            offset=desc['offset'])
+        dst[...] = value.reshape(-1)
+
+    flags = 0
+    if compress:
+        flags |= FLAG_ZLIB
+        payload = zlib.compress(bytes(payload), level)
+
+    header = json.dumps({'meta': meta,
+                         'arrays': [desc for desc, _value in arrays]},
+                        default=np_json.to_json).encode('utf-8')
+    header_len = _align(_PREAMBLE.size + len(header)) - _PREAMBLE.size
+    header = header.ljust(header_len, b' ')
+    return b''.join([_PREAMBLE.pack(MAGIC, VERSION, flags, 0, header_len),
+                     header, bytes(payload)])
+
+
+def loads(data):
+    """Deserialize a container produced by dumps.
+
+    Arrays are views on ``data`` (or on the decompressed payload), no copy
+    is made. They are read-only if ``data`` is. Legacy JSON model data
+    written by :mod:`np_json` is still accepted.
+    """
+    if not is_container(data):
+        if isinstance(data, (bytes, bytearray)):
+            data = bytes(data).decode('utf-8')
+        return np_json.loads(data)
+
+    buf = memoryview(data)
+    magic, version, flags, _reserved, header_len = _PREAMBLE.unpack_from(buf)
+    if version > VERSION:
+        raise ValueError('Unsupported model data version %d' % version)
+    start = _PREAMBLE.size
+    header = json.loads(bytes(buf[start:start + header_len]).decode('utf-8'),
+                        object_hook=np_json.from_json)
+    payload = buf[start + header_len:]
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+
+    result = dict(header['meta'])
+    for desc in header['arrays']:
+        shape = tuple(desc['shape'])
+        dtype = np.dtype(desc['dtype'])
+        if desc['nbytes']:
+            value = np.frombuffer(payload, dtype=dtype,
+                                  count=desc['nbytes'] // dtype.itemsize,
+                                  offset=desc['offset']).reshape(shape)
+        else:
+            value = np.empty(shape, dtype=dtype)
+        result[desc['name']] = value[()] if desc['scalar'] else value
+    return result
+
+
+def dump(obj, fp, compress=False, level=6):
+    """Serialize obj to a binary file object."""
+    fp.write(dumps(obj, compress=compress, level=level))
+
+
+def load(path, use_mmap=True):
+    """Load a container from a file.
+
+    With use_mmap the file is memory mapped and uncompressed arrays are
+    backed by the mapping, so pages are only read when they are touched.
+    """
+    with open(path, 'rb') as fp:
+        if not use_mmap:
+            return loads(fp.read())
+        return loads(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
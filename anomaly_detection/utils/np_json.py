@@ -21,13 +21,13 @@ def to_json(obj):
     if isinstance(obj, (np.ndarray, np.generic)):
         if isinstance(obj, np.ndarray):
             return {
-                '__ndarray__': base64.b64encode(obj.tostring()),
+                '__ndarray__': base64.b64encode(obj.tobytes()).decode(),
                 'dtype': obj.dtype.str,
                 'shape': obj.shape,
             }
         elif isinstance(obj, (np.bool_, np.number)):
             return {
-                '__npgeneric__': base64.b64encode(obj.tostring()),
+                '__npgeneric__': base64.b64encode(obj.tobytes()).decode(),
                 'dtype': obj.dtype.str,
             }
     if isinstance(obj, set):
@@ -46,12 +46,12 @@ def from_json(obj):
     # check for numpy
     if isinstance(obj, dict):
         if '__ndarray__' in obj:
-            return np.fromstring(
+            return np.frombuffer(
                 base64.b64decode(obj['__ndarray__']),
                 dtype=np.dtype(obj['dtype'])
             ).reshape(obj['shape'])
         if '__npgeneric__' in obj:
-            return np.fromstring(
+            return np.frombuffer(
                 base64.b64decode(obj['__npgeneric__']),
                 dtype=np.dtype(obj['dtype'])
             )[0]
@@ -0,0 +1,111 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Reload of the config file without restarting the process.
+
+The file is read again on SIGHUP, and when its modification time changes
+if config_reload_interval is set. Only the options registered with
+``mutable=True`` take their new value, the components using them are told
+through the hooks registered with ``CONF.register_mutate_hook``.
+"""
+import os
+import signal
+import threading
+
+from anomaly_detection import log
+from anomaly_detection.utils import config as cfg
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+reloader_opts = [
+    cfg.IntOpt('config_reload_interval',
+               default=0,
+               min=0,
+               help='Seconds between two checks of the config file '
+                    'modification time, the file is reloaded when it '
+                    'changed. 0 only reloads it on SIGHUP'),
+]
+
+CONF.register_opts(reloader_opts)
+
+
+class ConfigReloader(object):
+    """Reloads the config file from a background thread.
+
+    The SIGHUP handler only wakes the thread up, the reload itself doesn't
+    run in the signal handler which may interrupt code holding locks.
+    """
+
+    def __init__(self, conf, interval=0):
+        self.conf = conf
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._mtime = self._get_mtime()
+
+    def _get_mtime(self):
+        path = self.conf.get_config_file()
+        if not path:
+            return None
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def reload(self):
+        """Reload the config file, errors are logged."""
+        self._mtime = self._get_mtime()
+        try:
+            return self.conf.mutate_config_files()
+        except Exception as e:
+            LOG.error("config file not reloaded: %s", e)
+            return None
+
+    def request_reload(self, *args):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            requested = self._wakeup.wait(self.interval or None)
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            if requested or self._get_mtime() != self._mtime:
+                self.reload()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='config-reloader')
+        self._thread.daemon = True
+        self._thread.start()
+        # signals can only be handled by the main thread
+        if hasattr(signal, 'SIGHUP') and \
+                threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, self.request_reload)
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+
+def start(conf=CONF):
+    """Reload the config file on SIGHUP and when it is modified."""
+    reloader = ConfigReloader(conf, conf.config_reload_interval)
+    reloader.start()
+    return reloader
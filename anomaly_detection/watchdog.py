@@ -0,0 +1,195 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Slow operation log.
+
+Requests, trainings and ingestion batches are run inside ``watch()``. A
+monitor thread samples the stack of every operation running longer than
+the threshold, and the aggregated stacks are logged once it finishes::
+
+    slow training 5d0c... took 42.10s, 372 stack samples:
+      301  manager.py:create_training;gaussian.py:create_training;...
+"""
+import collections
+import contextlib
+import itertools
+import sys
+import threading
+import time
+
+from anomaly_detection import log
+from anomaly_detection import profiler
+from anomaly_detection.utils import config as cfg
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+watchdog_opts = [
+    cfg.BoolOpt('enabled',
+                default=True,
+                help='Log the sampled stacks of slow requests, trainings '
+                     'and ingestion batches'),
+    cfg.FloatOpt('threshold',
+                 default=5.0,
+                 min=0,
+                 mutable=True,
+                 help='Seconds after which an operation is slow and its '
+                      'stack starts being sampled'),
+    cfg.FloatOpt('sample_interval',
+                 default=0.1,
+                 min=0.001,
+                 mutable=True,
+                 help='Seconds between two stack samples of slow operations'),
+    cfg.IntOpt('report_stacks',
+               default=5,
+               min=1,
+               mutable=True,
+               help='Number of most frequent stacks logged per slow operation'),
+]
+
+CONF.register_opts(watchdog_opts, "watchdog")
+
+
+class Operation(object):
+    def __init__(self, kind, name, thread_id):
+        self.kind = kind
+        self.name = name
+        self.thread_id = thread_id
+        self.start = time.time()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.done = False
+
+    def report(self, elapsed, limit):
+        lines = ['slow %s %s took %.2fs, %d stack samples:' %
+                 (self.kind, self.name, elapsed, self.samples)]
+        for stack, count in self.stacks.most_common(limit):
+            lines.append('  %5d  %s' % (count, stack))
+        return '\n'.join(lines)
+
+
+class Watchdog(object):
+    def __init__(self, threshold=5.0, sample_interval=0.1, report_stacks=5):
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self.report_stacks = report_stacks
+        self._operations = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_config(cls, conf):
+        return cls(threshold=conf.threshold,
+                   sample_interval=conf.sample_interval,
+                   report_stacks=conf.report_stacks)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='watchdog')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.sample_interval):
+            self.sample()
+
+    def sample(self):
+        """Sample the stacks of the operations running past the threshold."""
+        now = time.time()
+        with self._lock:
+            slow = [op for op in self._operations.values()
+                    if now - op.start >= self.threshold]
+        if not slow:
+            return
+        frames = sys._current_frames()
+        new = []
+        with self._lock:
+            for op in slow:
+                frame = frames.get(op.thread_id)
+                # skip the operations which finished in the meantime
+                if frame is None or op.done:
+                    continue
+                if not op.samples:
+                    new.append(op)
+                op.stacks[profiler.collapse_stack(frame)] += 1
+                op.samples += 1
+        for op in new:
+            LOG.warning("%s %s is running for more than %.1fs",
+                        op.kind, op.name, self.threshold)
+
+    @contextlib.contextmanager
+    def watch(self, kind, name):
+        op = Operation(kind, name, threading.current_thread().ident)
+        key = next(self._ids)
+        with self._lock:
+            self._operations[key] = op
+        try:
+            yield op
+        finally:
+            with self._lock:
+                del self._operations[key]
+                op.done = True
+            if op.samples:
+                LOG.warning(op.report(time.time() - op.start, self.report_stacks))
+
+
+_watchdog = None
+_watchdog_lock = threading.Lock()
+
+
+def _mutate_hook(conf, fresh):
+    """Apply the thresholds of a reloaded config file."""
+    watchdog = _watchdog
+    if watchdog is not None and any(group == 'watchdog' for group, _name in fresh):
+        watchdog_conf = conf.snapshot('watchdog')
+        watchdog.threshold = watchdog_conf.threshold
+        watchdog.sample_interval = watchdog_conf.sample_interval
+        watchdog.report_stacks = watchdog_conf.report_stacks
+
+
+CONF.register_mutate_hook(_mutate_hook)
+
+
+def get_watchdog():
+    """Return the process wide watchdog, None if it is disabled."""
+    global _watchdog
+    if _watchdog is None:
+        conf = CONF.snapshot('watchdog')
+        if not conf.enabled:
+            return None
+        with _watchdog_lock:
+            if _watchdog is None:
+                _watchdog = Watchdog.from_config(conf)
+                _watchdog.start()
+    return _watchdog
+
+
+@contextlib.contextmanager
+def watch(kind, name):
+    """Log the sampled stacks of the with block if it runs past the threshold."""
+    watchdog = get_watchdog()
+    if watchdog is None:
+        yield None
+    else:
+        with watchdog.watch(kind, name) as op:
+            yield op
@@ -0,0 +1,354 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""End to end benchmark of training, scoring, ingestion and the API.
+
+Every benchmark runs once per dataset size on a synthetic workload and
+stores its data in a scratch SQLite database. Results are reported as
+JSON and can be compared against the results of another branch::
+
+    python -m benchmarks.pipeline --sizes 10000 100000 --output head.json
+    python -m benchmarks.pipeline --check --baseline master.json
+
+Benchmarks which don't scale to large datasets (per row ingestion) skip
+sizes above their limit unless --no-limits is given, DBSCAN training uses
+a 1000 rows workload for every size.
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+SIZES = [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+DEFAULT_SIZES = [10 ** 4]
+
+# name -> (function, max size or None, whether it depends on the size)
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(max_size=None, sized=True):
+    def _decorator(func):
+        BENCHMARKS[func.__name__] = (func, max_size, sized)
+        return func
+    return _decorator
+
+
+def _timed(func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - start, result
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+class Environment(object):
+    """Scratch directory, database and synthetic datasets of a run."""
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.workdir = tempfile.mkdtemp(prefix='ad-benchmark-')
+        self._datasets = {}
+
+    def setup(self):
+        from anomaly_detection.utils import config as cfg
+        from anomaly_detection.common import options  # noqa
+        # register the options of every component
+        from anomaly_detection.cmd import api  # noqa
+        from anomaly_detection.cmd import data_parser  # noqa
+        from anomaly_detection.data_generator import synthetic  # noqa
+        from anomaly_detection.db import api as db
+        # the backend sets the default connection when it is imported
+        from anomaly_detection.db.sqlalchemy import api as db_api  # noqa
+
+        conf = cfg.CONF
+        conf([])
+        conf.set_default('connection',
+                         'sqlite:///' + os.path.join(self.workdir, 'benchmark.db'),
+                         group='database')
+        db.init_db()
+
+    def cleanup(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def dataset(self, size):
+        """Return a (size, 3) array of iops, latency and ground truth."""
+        data = self._datasets.get(size)
+        if data is None:
+            import numpy as np
+            from anomaly_detection.data_generator import synthetic
+
+            workload = synthetic.SyntheticWorkload(seed=self.seed, start_time=0)
+            block = workload.block(size)
+            data = np.column_stack([block['iops'], block['latency'],
+                                    block['ground_truth']]).astype(float)
+            self._datasets[size] = data
+        return data
+
+    def workload_file(self, size, sink):
+        """Write a synthetic workload of size samples with a synthetic sink."""
+        from anomaly_detection.data_generator import synthetic
+
+        path = os.path.join(self.workdir, '%s-%d.%s' % (sink, size, sink))
+        if not os.path.exists(path):
+            workload = synthetic.SyntheticWorkload(seed=self.seed, start_time=0)
+            if sink == 'csv':
+                out = synthetic.CSVSink(path)
+            else:
+                out = synthetic.CaptureSink(path)
+            try:
+                for block in workload.blocks(size, 10000):
+                    out.write(block)
+            finally:
+                out.close()
+        return path
+
+    def driver(self, algorithm, size):
+        from anomaly_detection.ml import algorithm as ml_algorithm
+        from anomaly_detection.ml.manager import MLManager
+        from anomaly_detection.utils import config as cfg
+
+        cfg.CONF.set_default('dataset_number', size, group='training')
+        driver = MLManager()._get_algorithm(algorithm)
+        driver.dataset = ml_algorithm.ArrayDataSet(self.dataset(size))
+        return driver
+
+    def clear_performance(self):
+        from anomaly_detection.db.sqlalchemy import api as db_api
+        from anomaly_detection.db.sqlalchemy import models
+
+        session = db_api.get_session()
+        with session.begin():
+            for model in models.PERFORMANCE_MODELS.values():
+                session.query(model).delete()
+        db_api.reset_row_counters()
+
+
+def _training(env, algorithm, size):
+    driver = env.driver(algorithm, size)
+    seconds, _model = _timed(driver.create_training, {'algorithm': algorithm})
+    return {'seconds': seconds, 'rows_per_second': size / seconds}
+
+
+def _figure(env, algorithm, size, model=None):
+    from anomaly_detection.ml import manager
+    from anomaly_detection.utils import np_binary
+
+    driver = env.driver(algorithm, size)
+    if model is None:
+        model = driver.create_training({'algorithm': algorithm})
+    model = driver.load_model(np_binary.dumps(model))
+    start = time.time()
+    png = manager.print_figure(driver.get_training_figure(model), 'png')
+    seconds = time.time() - start
+    return {'seconds': seconds, 'bytes': len(png)}
+
+
+@benchmark()
+def gaussian_training(env, size):
+    return _training(env, 'gaussian', size)
+
+
+# the parameter search fits 450 models, it takes minutes beyond 1000 rows
+DBSCAN_TRAINING_SIZE = 10 ** 3
+
+
+@benchmark()
+def dbscan_training(env, size):
+    # trained on a 1000 rows workload whatever the size
+    train_size = min(size, DBSCAN_TRAINING_SIZE)
+    result = _training(env, 'dbscan', train_size)
+    result['rows'] = train_size
+    return result
+
+
+@benchmark()
+def gaussian_scoring(env, size):
+    from anomaly_detection.utils import np_binary
+
+    train_size = min(size, 10 ** 5)
+    driver = env.driver('gaussian', train_size)
+    model = driver.load_model(np_binary.dumps(driver.create_training({'algorithm': 'gaussian'})))
+    data = env.dataset(size)
+    seconds, outliers = _timed(driver.prediction, model, data)
+    return {'seconds': seconds, 'rows_per_second': size / seconds,
+            'outliers': int(outliers.sum())}
+
+
+@benchmark(max_size=10 ** 6)
+def gaussian_figure(env, size):
+    return _figure(env, 'gaussian', size)
+
+
+@benchmark(max_size=10 ** 5)
+def dbscan_figure(env, size):
+    # skip the parameter search, it is timed by dbscan_training
+    model = {'adjusted_rand_score': 0.0, 'epsilon': 0.3, 'min_samples': 10}
+    return _figure(env, 'dbscan', size, model)
+
+
+@benchmark(max_size=10 ** 5)
+def csv_ingestion(env, size):
+    from anomaly_detection.data_parser import manager
+    from anomaly_detection.utils import config as cfg
+
+    cfg.CONF.set_default('csv_file_name', env.workload_file(size, 'csv'), group='data_parser')
+    env.clear_performance()
+    seconds, _result = _timed(manager.CSVDataReceiver().run)
+    return {'seconds': seconds, 'rows_per_second': size / seconds}
+
+
+@benchmark(max_size=10 ** 5)
+def kafka_ingestion(env, size):
+    # the replay receiver feeds the messages through the same handling as
+    # the kafka receiver, without the broker round trip
+    from anomaly_detection.data_parser import manager
+
+    env.clear_performance()
+    receiver = manager.ReplayDataReceiver(env.workload_file(size, 'capture'), speed=0)
+    seconds, count = _timed(receiver.run)
+    return {'seconds': seconds, 'messages_per_second': count / seconds}
+
+
+@benchmark(sized=False)
+def api_latency(env, size, requests=200):
+    from anomaly_detection.api.v1beta import training as training_api
+    from anomaly_detection.cmd.api import ServerManager
+    from anomaly_detection.context import get_admin_context
+    from anomaly_detection.utils import config as cfg
+
+    tenant_id = 'benchmark'
+    cfg.CONF.set_default('dataset_source_type', 'csv', group='training')
+    cfg.CONF.set_default('dataset_number', 10000, group='training')
+    cfg.CONF.set_default('dataset_csv_file_name', env.workload_file(10000, 'csv'),
+                         group='training')
+    training = training_api.ml_mgr.create_training(
+        get_admin_context(), {'name': 'benchmark', 'algorithm': 'gaussian',
+                              'tenant_id': tenant_id})
+
+    server = ServerManager()
+    server.app.config['TESTING'] = True
+    client = server.app.test_client()
+    headers = {'X-Auth-Token': 'admin:' + tenant_id}
+    urls = collections.OrderedDict([
+        ('version', '/v1beta'),
+        ('training_list', '/v1beta/%s/training' % tenant_id),
+        ('training_get', '/v1beta/%s/training/%s' % (tenant_id, training.id)),
+        ('training_figure', '/v1beta/%s/training/%s?type=image' % (tenant_id, training.id)),
+    ])
+    results = {}
+    for name, url in urls.items():
+        count = requests if name != 'training_figure' else max(requests // 20, 1)
+        latencies = []
+        for _i in range(count):
+            seconds, resp = _timed(client.get, url, headers=headers)
+            if resp.status_code != 200:
+                raise RuntimeError('GET %s returned %s' % (url, resp.status_code))
+            latencies.append(seconds * 1000)
+        results[name] = {'requests': count,
+                         'p50_ms': _percentile(latencies, 50),
+                         'p99_ms': _percentile(latencies, 99),
+                         'max_ms': max(latencies)}
+    return results
+
+
+def run(names=None, sizes=None, no_limits=False, seed=0):
+    sizes = sizes or DEFAULT_SIZES
+    env = Environment(seed)
+    results = collections.OrderedDict()
+    try:
+        env.setup()
+        for name, (func, max_size, sized) in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            results[name] = collections.OrderedDict()
+            for size in (sizes if sized else [None]):
+                key = str(size) if sized else 'default'
+                if sized and max_size and size > max_size and not no_limits:
+                    results[name][key] = {'skipped': 'size above %d' % max_size}
+                    continue
+                print('running %s %s' % (name, key), file=sys.stderr)
+                results[name][key] = func(env, size)
+    finally:
+        env.cleanup()
+    return results
+
+
+def environment():
+    import numpy as np
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__}
+
+
+def check(results, baseline, tolerance=0.5):
+    """Compare the seconds of every benchmark and size against a baseline."""
+    errors = []
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            base = baseline.get(name, {}).get(size, {})
+            if 'seconds' not in result or 'seconds' not in base:
+                continue
+            if result['seconds'] > base['seconds'] * (1 + tolerance):
+                errors.append('%s[%s] took %.3fs, baseline %.3fs' %
+                              (name, size, result['seconds'], base['seconds']))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--benchmarks', nargs='*', choices=list(BENCHMARKS),
+                        help='benchmarks to run, all of them by default')
+    parser.add_argument('--sizes', nargs='*', type=int, default=DEFAULT_SIZES,
+                        help='dataset sizes, e.g. %s' % ' '.join(str(s) for s in SIZES))
+    parser.add_argument('--no-limits', action='store_true',
+                        help='run every benchmark at every size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed slowdown relative to the baseline')
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+
+    results = run(args.benchmarks, args.sizes, args.no_limits, args.seed)
+    output = json.dumps({'environment': environment(), 'results': results},
+                        indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.check and args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        errors = check(results, baseline, args.tolerance)
+        for error in errors:
+            print(error, file=sys.stderr)
+        return 1 if errors else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Startup benchmark of the command line entry points.
+
+Every entry point module is imported in a fresh interpreter with
+``python -X importtime``. The cumulative import time and the heavy third
+party packages pulled in are reported as JSON::
+
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --check --baseline startup.json
+
+With --check the run fails if an entry point imports a heavy package it
+is not allowed to, or if it is slower than the baseline by more than the
+tolerance.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import subprocess
+import sys
+
+ENTRY_POINTS = {
+    'api': 'anomaly_detection.cmd.api',
+    'manage': 'anomaly_detection.cmd.manage',
+    'data_parser': 'anomaly_detection.cmd.data_parser',
+    'data_generator': 'anomaly_detection.cmd.data_generator',
+}
+
+HEAVY_PACKAGES = ['apscheduler', 'flask', 'kafka', 'keystoneauth1', 'matplotlib',
+                  'numpy', 'requests', 'scipy', 'sklearn', 'sqlalchemy']
+
+# modules of this project importing numpy eagerly, loaded on first use of
+# an algorithm, they are reported like the heavy packages
+DEFERRED_MODULES = ['anomaly_detection.ml.algorithms', 'anomaly_detection.utils.np_binary']
+
+# heavy packages each entry point needs at startup, everything else has
+# to be imported on first use
+ALLOWED_PACKAGES = {
+    'api': ['flask'],
+    'manage': [],
+    'data_parser': [],
+    'data_generator': ['apscheduler'],
+}
+
+
+def measure(module):
+    """Import module in a fresh interpreter.
+
+    :returns: (cumulative import time in microseconds, imported heavy
+              packages and deferred modules)
+    """
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _out, err = proc.communicate()
+    if proc.returncode:
+        raise RuntimeError('importing %s failed:\n%s' % (module, err.decode('utf-8', 'replace')))
+
+    total = 0
+    packages = set()
+    for line in err.decode('utf-8', 'replace').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        if name == module:
+            total = int(fields[1])
+        top = name.partition('.')[0]
+        if top in HEAVY_PACKAGES:
+            packages.add(top)
+        for deferred in DEFERRED_MODULES:
+            if name == deferred or name.startswith(deferred + '.'):
+                packages.add(deferred)
+    return total, sorted(packages)
+
+
+def run(repeat=3):
+    results = {}
+    for name, module in sorted(ENTRY_POINTS.items()):
+        times = []
+        packages = []
+        for _i in range(repeat):
+            total, packages = measure(module)
+            times.append(total)
+        results[name] = {'module': module,
+                         'import_time_us': min(times),
+                         'heavy_packages': packages}
+    return results
+
+
+def check(results, baseline=None, tolerance=0.5):
+    errors = []
+    for name, result in sorted(results.items()):
+        unexpected = set(result['heavy_packages']) - set(ALLOWED_PACKAGES[name])
+        if unexpected:
+            errors.append('%s imports %s at startup' % (name, ', '.join(sorted(unexpected))))
+        if baseline and name in baseline:
+            limit = baseline[name]['import_time_us'] * (1 + tolerance)
+            if result['import_time_us'] > limit:
+                errors.append('%s import time %dus exceeds baseline %dus' %
+                              (name, result['import_time_us'], baseline[name]['import_time_us']))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed slowdown relative to the baseline')
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.check:
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        errors = check(results, baseline, args.tolerance)
+        for error in errors:
+            print(error, file=sys.stderr)
+        return 1 if errors else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,7 +14,9 @@
 
 import pytest
 
-from anomaly_detection.server import server_manager
+from anomaly_detection.cmd.api import ServerManager
+
+server_manager = ServerManager()
 
 
 @pytest.fixture
@@ -0,0 +1,42 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from anomaly_detection import metrics
+
+
+def test_render_histogram():
+    registry = metrics.Registry()
+    hist = registry.register(metrics.Histogram('latency_seconds', 'Latency', ['route'],
+                                               buckets=[0.1, 1]))
+    hist.observe(0.05, ('/a',))
+    hist.observe(0.5, ('/a',))
+    hist.observe(5, ('/a',))
+
+    lines = registry.render().splitlines()
+    assert '# TYPE latency_seconds histogram' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+    assert hist.get(('/a',)) == (3, 5.55)
+
+
+def test_metrics_endpoint(client):
+    assert client.get('/v1beta').status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    body = response.get_data(as_text=True)
+    assert 'anomaly_detection_http_request_duration_seconds_count' \
+           '{method="GET",route="/v1beta",status="200"}' in body
+    assert 'anomaly_detection_model_cache_hits_total' in body
@@ -0,0 +1,85 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import pstats
+import time
+
+import pytest
+
+from anomaly_detection import profiler
+from anomaly_detection.cmd.api import ServerManager
+from anomaly_detection.utils import config as cfg
+
+CONF = cfg.CONF
+
+
+@pytest.fixture
+def client():
+    # the profiler middleware is only installed if the header is allowed
+    default = CONF.profiler.allow_header
+    CONF.set_default('allow_header', True, group='profiler')
+    try:
+        server_manager = ServerManager()
+        server_manager.app.config['TESTING'] = True
+        yield server_manager.app.test_client()
+    finally:
+        CONF.set_default('allow_header', default, group='profiler')
+
+
+@pytest.fixture
+def output_dir(tmpdir):
+    default = CONF.profiler.output_dir
+    interval = CONF.profiler.sample_interval
+    CONF.set_default('output_dir', str(tmpdir), group='profiler')
+    yield str(tmpdir)
+    CONF.set_default('output_dir', default, group='profiler')
+    CONF.set_default('sample_interval', interval, group='profiler')
+
+
+def test_profile_request_with_header(client, output_dir):
+    response = client.get('/v1beta/tenant/algorithm',
+                          headers={'X-Auth-Token': 'admin:tenant', 'X-Profile': 'cprofile'})
+    assert response.status_code == 200
+    request_id = response.headers['X-Request-Id']
+    path = os.path.join(output_dir, 'request-%s.pstats' % request_id)
+    assert pstats.Stats(path).total_calls > 0
+
+
+def test_no_profile_without_header(client, output_dir):
+    response = client.get('/v1beta/tenant/algorithm', headers={'X-Auth-Token': 'admin:tenant'})
+    assert response.status_code == 200
+    assert os.listdir(output_dir) == []
+
+
+def test_header_ignored_unless_allowed(client, output_dir):
+    CONF.set_default('allow_header', False, group='profiler')
+    try:
+        response = client.get('/v1beta/tenant/algorithm',
+                              headers={'X-Auth-Token': 'admin:tenant', 'X-Profile': 'cprofile'})
+    finally:
+        CONF.set_default('allow_header', True, group='profiler')
+    assert response.status_code == 200
+    assert os.listdir(output_dir) == []
+
+
+def test_sampling_profile(output_dir):
+    CONF.set_default('sample_interval', 0.001, group='profiler')
+    with profiler.profile('busy', 'sampling'):
+        deadline = time.time() + 0.2
+        while time.time() < deadline:
+            pass
+    with open(os.path.join(output_dir, 'busy.collapsed')) as f:
+        lines = f.read().splitlines()
+    assert lines
+    assert any('test_sampling_profile' in line for line in lines)
@@ -16,4 +16,4 @@
 def test_get_service(client):
     response = client.get('/v1beta')
     assert response.status_code == 200
-    assert "Anomaly Detection" == response.data['name']
+    assert "Anomaly Detection" == response.get_json()['name']
@@ -0,0 +1,50 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import startup
+
+_FIRST_USE = """
+import sys
+from anomaly_detection.ml import manager
+kept_out = [m for m in ('numpy', 'anomaly_detection.ml.algorithms.gaussian') if m in sys.modules]
+manager.MLManager()._get_algorithm('gaussian')
+loaded = [m for m in ('numpy', 'anomaly_detection.ml.algorithms.gaussian') if m in sys.modules]
+print(','.join(kept_out) + ';' + ','.join(loaded))
+"""
+
+
+@pytest.mark.parametrize("name", sorted(startup.ENTRY_POINTS))
+def test_no_heavy_imports_at_startup(name):
+    _total, packages = startup.measure(startup.ENTRY_POINTS[name])
+    unexpected = set(packages) - set(startup.ALLOWED_PACKAGES[name])
+    assert not unexpected, "%s imports %s at startup" % (name, sorted(unexpected))
+
+
+@pytest.mark.parametrize("name", sorted(startup.ENTRY_POINTS))
+def test_numpy_and_drivers_are_kept_out(name):
+    _total, packages = startup.measure(startup.ENTRY_POINTS[name])
+    kept_out = ['numpy', 'anomaly_detection.ml.algorithms', 'anomaly_detection.utils.np_binary']
+    assert not set(packages) & set(kept_out)
+
+
+def test_drivers_are_imported_on_first_use():
+    # the drivers import numpy eagerly, the ML manager defers both
+    out = subprocess.check_output([sys.executable, '-c', _FIRST_USE])
+    kept_out, loaded = out.decode('utf-8').strip().split(';')
+    assert kept_out == ''
+    assert loaded == 'numpy,anomaly_detection.ml.algorithms.gaussian'
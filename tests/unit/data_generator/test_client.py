@@ -0,0 +1,137 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import collections
+import datetime
+
+import pytest
+import requests
+
+from anomaly_detection.data_generator import client
+from anomaly_detection.utils import config as cfg
+
+
+_Access = collections.namedtuple('_Access', ['auth_token', 'expires'])
+
+
+class _FakeAuth(object):
+    def __init__(self, lifetimes):
+        self.lifetimes = list(lifetimes)
+        self.issued = 0
+        self.invalidated = 0
+
+    def get_access(self, session):
+        self.issued += 1
+        lifetime = self.lifetimes.pop(0)
+        expires = None
+        if lifetime is not None:
+            expires = datetime.datetime.now() + datetime.timedelta(seconds=lifetime)
+        return _Access('token-%d' % self.issued, expires)
+
+    def invalidate(self):
+        self.invalidated += 1
+
+
+class _FakeSession(object):
+    def __init__(self, auth):
+        self.auth = auth
+
+    def get_project_id(self):
+        return 'tenant'
+
+
+class _FakeHTTPSession(object):
+    def __init__(self, status_codes):
+        self.status_codes = list(status_codes)
+        self.tokens = []
+        self.timeouts = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.tokens.append(headers.get('X-Auth-Token'))
+        self.timeouts.append(kwargs.get('timeout'))
+        resp = requests.models.Response()
+        resp.status_code = self.status_codes.pop(0)
+        resp.url = url
+        resp._content = b''
+        return resp
+
+
+@pytest.fixture
+def keystone_client(monkeypatch):
+    def _create(*lifetimes):
+        auth = _FakeAuth(lifetimes)
+        monkeypatch.setattr(client.identity, 'Password', lambda **kwargs: auth)
+        monkeypatch.setattr(client.ks, 'Session', _FakeSession)
+        return client.KeystoneClient()
+    return _create
+
+
+def test_token_is_cached(keystone_client):
+    kc = keystone_client(3600)
+    assert kc.get_token() == 'token-1'
+    assert kc.get_token() == 'token-1'
+    assert kc.session.auth.issued == 1
+    assert kc.session.auth.invalidated == 0
+
+
+def test_token_is_renewed_within_the_expiry_margin(keystone_client):
+    # the default margin is 300s, the first token is renewed right away
+    kc = keystone_client(200, 3600)
+    assert kc.get_token() == 'token-1'
+    assert kc.get_token() == 'token-2'
+    # the auth plugin's cached token is dropped before renewing it
+    assert kc.session.auth.invalidated == 1
+    assert kc.get_token() == 'token-2'
+    assert kc.session.auth.issued == 2
+
+
+def test_token_without_expiry_is_cached_until_rejected(keystone_client):
+    kc = keystone_client(None, None)
+    assert kc.get_token() == 'token-1'
+    assert kc.get_token() == 'token-1'
+    assert kc.session.auth.issued == 1
+
+    http_session = _FakeHTTPSession([401, 200])
+    telemetry = client.TelemetryClient(http_session=http_session, keystone_client=kc)
+    resp, _body = telemetry.request('metrics', 'POST', body={})
+    assert resp.status_code == 200
+    assert http_session.tokens == ['token-1', 'token-2']
+    # a token renewed meanwhile isn't dropped by the rejection of the old one
+    kc.invalidate('token-1')
+    assert kc.get_token() == 'token-2'
+
+
+def test_request_attempts_share_the_timeout(keystone_client):
+    http_session = _FakeHTTPSession([401, 200])
+    telemetry = client.TelemetryClient(http_session=http_session,
+                                       keystone_client=keystone_client(None, None))
+    telemetry.request('metrics', 'POST', body={}, timeout=10)
+    first, second = http_session.timeouts
+    assert 9 < second <= first <= 10
+    http_session.status_codes.append(200)
+    telemetry.request('metrics', 'POST', body={})
+    assert http_session.timeouts[-1] == cfg.CONF.data_generator.timeout
+
+
+def test_http_session_pool_size():
+    cfg.CONF.set_default('pool_connections', 3, group='data_generator')
+    cfg.CONF.set_default('pool_maxsize', 7, group='data_generator')
+    try:
+        session = client.create_http_session()
+    finally:
+        cfg.CONF.set_default('pool_connections', 100, group='data_generator')
+        cfg.CONF.set_default('pool_maxsize', 10, group='data_generator')
+    for url in ('http://127.0.0.1:50040', 'https://127.0.0.1:50040'):
+        adapter = session.get_adapter(url)
+        assert adapter._pool_connections == 3
+        assert adapter._pool_maxsize == 7
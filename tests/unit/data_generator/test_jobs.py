@@ -0,0 +1,121 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+
+import pytest
+
+from anomaly_detection.data_generator import jobs
+from anomaly_detection.utils import config as cfg
+
+
+class _FakeClient(object):
+    def __init__(self, endpoint_url=None, driver_type=None, http_session=None,
+                 keystone_client=None):
+        self.endpoint_url = endpoint_url
+        self.driver_type = driver_type
+        self.release = threading.Event()
+        self.calls = 0
+
+    def collect_metrics(self, timeout=None):
+        self.calls += 1
+        if not self.release.wait(timeout):
+            raise IOError('read timed out')
+        if self.driver_type == 'broken':
+            raise ValueError('backend is down')
+
+
+@pytest.fixture
+def job(monkeypatch):
+    monkeypatch.setattr(jobs, 'TelemetryClient', _FakeClient)
+    cfg.CONF.set_default('auth_strategy', 'noauth', group='data_generator')
+    cfg.CONF.set_default('backends', ['lvm', 'broken@http://10.0.0.2:50040'],
+                         group='data_generator')
+    try:
+        job = jobs.CollectMetricsJob()
+    finally:
+        cfg.CONF.set_default('backends', [], group='data_generator')
+        cfg.CONF.set_default('auth_strategy', 'keystone', group='data_generator')
+    yield job
+    for client in job._clients:
+        client.release.set()
+    job._executor.shutdown()
+
+
+def _wait_done(job, driver_type=None):
+    for future, (backend, _submitted_at) in list(job._pending.items()):
+        if driver_type in (None, backend.driver_type):
+            future.exception(timeout=5)
+
+
+def test_parse_backends():
+    backends = jobs.parse_backends(['lvm', ' ceph @ http://10.0.0.2:50040 '],
+                                   'http://127.0.0.1:50040', 'default')
+    assert backends == [jobs.Backend('lvm', 'http://127.0.0.1:50040'),
+                        jobs.Backend('ceph', 'http://10.0.0.2:50040')]
+    assert jobs.parse_backends([], 'http://127.0.0.1:50040', 'lvm') == [
+        jobs.Backend('lvm', 'http://127.0.0.1:50040')]
+
+
+def test_run_does_not_wait_for_the_backends(job):
+    start = time.time()
+    job.run()
+    assert time.time() - start < 1
+    assert len(job._pending) == 2
+
+
+def test_backend_in_flight_is_skipped(job):
+    lvm, broken = job._clients
+    broken.release.set()
+    job.run()
+    _wait_done(job, 'broken')
+
+    # lvm is still being collected
+    job.run()
+    _wait_done(job, 'broken')
+    assert lvm.calls == 1
+    assert broken.calls == 2
+
+
+def test_results_are_reported_on_the_next_run(job, caplog):
+    lvm, broken = job._clients
+    job.run()
+    assert job._report(time.time() + 60, 30) == (0, 0)
+    assert caplog.text.count('still runs after 30s') == 2
+    # a stuck collection is reported once
+    job._report(time.time() + 90, 30)
+    assert caplog.text.count('still runs after 30s') == 2
+
+    lvm.release.set()
+    broken.release.set()
+    _wait_done(job)
+    assert job._report(time.time(), 30) == (1, 1)
+    assert 'backend is down' in caplog.text
+    assert not job._pending and not job._timed_out
+
+
+def test_hung_backend_fails_after_the_timeout(job):
+    lvm, broken = job._clients
+    broken.release.set()
+    cfg.CONF.set_default('backend_timeout', 1, group='data_generator')
+    try:
+        job.run()
+        _wait_done(job)
+        assert job._report(time.time(), 1) == (0, 2)
+        # the worker is free and the backend collected again
+        job.run()
+        _wait_done(job, 'lvm')
+        assert lvm.calls == 2
+    finally:
+        cfg.CONF.set_default('backend_timeout', 30, group='data_generator')
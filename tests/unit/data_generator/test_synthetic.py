@@ -0,0 +1,51 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+
+from anomaly_detection.data_generator.synthetic import SyntheticWorkload
+
+
+def _concat(blocks, column):
+    return np.concatenate([block[column] for block in blocks])
+
+
+def test_blocks_are_deterministic():
+    first = list(SyntheticWorkload(seed=42, start_time=0).blocks(5000, 700))
+    second = list(SyntheticWorkload(seed=42, start_time=0).blocks(5000, 700))
+    assert [len(block['iops']) for block in first] == [700] * 7 + [100]
+    for column in ('time', 'iops', 'latency', 'ground_truth'):
+        np.testing.assert_array_equal(_concat(first, column), _concat(second, column))
+
+
+def test_anomalies_are_labeled():
+    workload = SyntheticWorkload(noise=0.01, seasonality_amplitude=0, anomaly_rate=0.01,
+                                 anomaly_types=['latency_degradation'], seed=1, start_time=0)
+    block = workload.block(20000)
+    truth = block['ground_truth'].astype(bool)
+    assert 0 < truth.mean() < 0.5
+    assert block['latency'][truth].min() > block['latency'][~truth].max()
+    np.testing.assert_allclose(np.diff(block['time']), workload.interval)
+
+
+def test_anomaly_continues_in_next_block():
+    workload = SyntheticWorkload(anomaly_rate=1.0, anomaly_types=['level_shift'],
+                                 seed=3, start_time=0)
+    workload.block(10)
+    assert workload.block(10)['ground_truth'][0] == 1
+
+
+def test_unknown_anomaly_type():
+    with pytest.raises(ValueError):
+        SyntheticWorkload(anomaly_types=['meteor'])
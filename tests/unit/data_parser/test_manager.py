@@ -0,0 +1,109 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import collections
+import json
+import time
+
+from anomaly_detection.data_parser import manager
+from anomaly_detection.utils import config as cfg
+
+
+class _FakeDB(object):
+    def __init__(self):
+        self.stored = []
+        self.rollups = []
+
+    def performance_create(self, context, values):
+        self.stored.append(values)
+
+    def performance_rollup_add(self, context, values, resolutions):
+        self.rollups.append((len(values), resolutions))
+
+
+def test_rollups_are_buffered():
+    cfg.CONF.set_default('rollup_batch_size', 5, group='data_parser')
+    cfg.CONF.set_default('rollup_flush_interval', 3600, group='data_parser')
+    try:
+        receiver = manager.DataReceiver('test')
+        receiver.db = _FakeDB()
+        for i in range(6):
+            receiver.handle_message(json.dumps([{'iops': i, 'latency': i}] * 2))
+        assert len(receiver.db.stored) == 12
+        # merged 6 then 6 rows at a time, not once per message
+        assert receiver.db.rollups == [(6, [3600, 60]), (6, [3600, 60])]
+        receiver.handle_message(json.dumps({'iops': 1, 'latency': 1}))
+        receiver.flush_rollups()
+        assert receiver.db.rollups[-1] == (1, [3600, 60])
+    finally:
+        cfg.CONF.set_default('rollup_batch_size', 1000, group='data_parser')
+        cfg.CONF.set_default('rollup_flush_interval', 10.0, group='data_parser')
+
+
+class _FakeConsumer(object):
+    """Delivers one message, then stays idle until interrupted."""
+
+    def __init__(self, db, polls):
+        self._db = db
+        self._polls = polls
+        self.rollups_seen = []
+
+    def poll(self, timeout_ms):
+        self.rollups_seen.append(list(self._db.rollups))
+        if len(self.rollups_seen) == 1:
+            msg = collections.namedtuple('Msg', 'value timestamp')(
+                json.dumps({'iops': 1, 'latency': 1}), 0)
+            return {'partition': [msg]}
+        if len(self.rollups_seen) > self._polls:
+            raise KeyboardInterrupt()
+        time.sleep(timeout_ms / 1000.0)
+        return {}
+
+
+class _FakeKafka(object):
+    def __init__(self, consumer):
+        self._consumer = consumer
+
+    def KafkaConsumer(self, topic, bootstrap_servers):
+        return self._consumer
+
+
+def test_rollups_are_flushed_while_idle(monkeypatch):
+    cfg.CONF.set_default('rollup_flush_interval', 0.1, group='data_parser')
+    try:
+        receiver = manager.KafkaDataReceiver()
+        receiver.db = _FakeDB()
+        consumer = _FakeConsumer(receiver.db, polls=3)
+        monkeypatch.setattr(manager, 'kafka', _FakeKafka(consumer))
+        receiver.run()
+        # merged by an idle poll, before the receiver stopped
+        assert consumer.rollups_seen[-1] == [(1, [3600, 60])]
+        assert receiver.db.rollups == [(1, [3600, 60])]
+    finally:
+        cfg.CONF.set_default('rollup_flush_interval', 10.0, group='data_parser')
+
+
+def test_csv_receiver_streams_the_whole_file(tmpdir):
+    path = tmpdir.join('perf.csv')
+    path.write('iops,latency,ground_truth\n' + '1,2,0\n' * 10)
+    cfg.CONF.set_default('csv_file_name', str(path), group='data_parser')
+    try:
+        receiver = manager.CSVDataReceiver()
+    finally:
+        cfg.CONF.set_default('csv_file_name', 'performance.csv', group='data_parser')
+    receiver.chunk_rows = 4
+    receiver.db = _FakeDB()
+    receiver.run()
+    assert len(receiver.db.stored) == 10
+    assert receiver.db.stored[-1] == {'iops': 1, 'latency': 2, 'ground_truth': 0}
+    assert receiver.db.rollups == [(10, [3600, 60])]
@@ -0,0 +1,64 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import sqlalchemy
+
+from anomaly_detection.context import get_admin_context
+from anomaly_detection.db.sqlalchemy import api as db_api
+from anomaly_detection.db.sqlalchemy import models
+from anomaly_detection.ml import manager
+from anomaly_detection.utils import np_json
+
+
+def test_sqlite_pragmas(tmpdir):
+    engine = db_api.EngineFacade._create_engine(
+        'sqlite:///' + str(tmpdir.join('test.db')), sqlite_cache_size=1024,
+        sqlite_mmap_size=1 << 20)
+    with engine.connect() as conn:
+        assert conn.execute('PRAGMA journal_mode').scalar() == 'wal'
+        assert conn.execute('PRAGMA synchronous').scalar() == 1
+        assert conn.execute('PRAGMA cache_size').scalar() == -1024
+        assert conn.execute('PRAGMA mmap_size').scalar() == 1 << 20
+
+
+def test_slave_connection(tmpdir):
+    primary = 'sqlite:///' + str(tmpdir.join('primary.db'))
+    replica = 'sqlite:///' + str(tmpdir.join('replica.db'))
+    facade = db_api.EngineFacade(primary, slave_connection=replica)
+    assert str(facade.get_engine().url) == primary
+    assert str(facade.get_engine(use_slave=True).url) == replica
+    assert str(facade.get_session(use_slave=True).bind.url) == replica
+
+    facade = db_api.EngineFacade(primary)
+    assert facade.get_engine(use_slave=True) is facade.get_engine()
+
+
+def test_text_model_data_is_migrated(tmpdir, monkeypatch):
+    facade = db_api.EngineFacade('sqlite:///' + str(tmpdir.join('legacy.db')))
+    monkeypatch.setattr(db_api, '_FACADE', facade)
+    # the training table as created before model data was binary
+    legacy = sqlalchemy.MetaData()
+    table = models.Training.__table__.tometadata(legacy)
+    table.c.model_data.type = sqlalchemy.String(255)
+    legacy.create_all(facade.get_engine())
+    model_data = np_json.dumps({'mu': np.array([1.0, 2.0]), 'sigma': np.eye(2), 'epsilon': 0.1})
+    facade.get_engine().execute(table.insert().values(
+        id='legacy', tenant_id='tenant', algorithm='gaussian', deleted=False,
+        model_data=model_data))
+
+    db_api.init_db()
+    ctx = get_admin_context()
+    assert db_api.training_get(ctx, 'legacy').model_data == model_data.encode('utf-8')
+    entry = manager.MLManager()._get_model(ctx, 'legacy')
+    assert entry.model['mu'].tolist() == [1.0, 2.0]
@@ -0,0 +1,198 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+
+import numpy as np
+from sqlalchemy import exc as sa_exc
+
+from anomaly_detection import db
+from anomaly_detection.context import get_admin_context
+from anomaly_detection.db.sqlalchemy import api as db_api
+from anomaly_detection.db.sqlalchemy import models
+from anomaly_detection.ml import algorithm
+from anomaly_detection.utils import config as cfg
+
+
+def test_performance_iter_columns():
+    ctx = get_admin_context()
+    db.init_db()
+    start = datetime.datetime(2019, 1, 1)
+    db.performance_create_all(ctx, [
+        {'iops': i, 'latency': 2 * i, 'ground_truth': i % 2,
+         'created_at': start + datetime.timedelta(seconds=i),
+         'time': start + datetime.timedelta(seconds=i) if i % 2 else None}
+        for i in range(25)])
+    try:
+        blocks = list(db.performance_iter_columns(ctx, offset=2, limit=20, fetch_size=8))
+        assert [len(b) for b in blocks] == [8, 8, 4]
+        assert blocks[0].shape == (8, 3)
+        assert blocks[0][0].tolist() == [2.0, 4.0, 0.0]
+        assert blocks[-1][-1].tolist() == [21.0, 42.0, 1.0]
+        # times are in seconds since the epoch, NaN if unknown
+        times = next(db.performance_iter_columns(ctx, columns=('iops', 'time'), limit=2))
+        assert np.isnan(times[0, 1])
+        assert times[1].tolist() == [1.0, 1546300801.0]
+    finally:
+        session = db_api.get_session()
+        with session.begin():
+            session.query(models.Performance).delete()
+        db.reset_row_counters()
+
+
+def _row_counter(model):
+    session = db_api.get_session()
+    return session.query(models.RowCounter.count).filter_by(
+        table_name=model.__tablename__, tenant_id='').scalar()
+
+
+def test_performance_count_is_maintained():
+    ctx = get_admin_context()
+    db.init_db()
+    db.reset_row_counters()
+    cfg.CONF.set_default('row_count_strategy', 'counter', group='database')
+    try:
+        db.performance_create_all(ctx, [{'iops': i, 'latency': i} for i in range(3)])
+        # the counter is seeded by the first read
+        assert db.performance_get_count(ctx) == 3
+        perf = db.performance_create(ctx, {'iops': 1, 'latency': 1})
+        db.performance_create_all(ctx, [{'iops': i, 'latency': i} for i in range(5)])
+        db.performance_delete(ctx, perf.id)
+        assert db.performance_get_count(ctx) == 8
+        assert db_api._count_query(ctx, models.Performance, tenant_only=False) == 8
+
+        # counters aren't maintained by the other strategies
+        cfg.CONF.set_default('row_count_strategy', 'estimate', group='database')
+        db.performance_create(ctx, {'iops': 1, 'latency': 1})
+        assert db.performance_get_count(ctx) == 9
+        assert _row_counter(models.Performance) == 8
+    finally:
+        cfg.CONF.set_default('row_count_strategy', 'query', group='database')
+        session = db_api.get_session()
+        with session.begin():
+            session.query(models.Performance).delete()
+        db.reset_row_counters()
+
+
+def test_migrate_performance():
+    ctx = get_admin_context()
+    db.init_db()
+    start = datetime.datetime(2019, 1, 1)
+    db.performance_create_all(ctx, [
+        {'iops': i, 'latency': i, 'created_at': start + datetime.timedelta(seconds=-i)}
+        for i in range(7)])
+    try:
+        assert db.migrate_performance(batch_size=3) == 7
+        cfg.CONF.set_default('performance_schema', 'compact', group='database')
+        perfs = db.performance_get_all(ctx)
+        assert [p.id for p in perfs] == list(range(1, 8))
+        # copied in creation order
+        assert [p.iops for p in perfs] == list(range(6, -1, -1))
+
+        perf = db.performance_create(ctx, {'iops': 10, 'latency': 10})
+        assert perf.id == 8
+        db.performance_delete(ctx, perf.id)
+        assert db.performance_get_count(ctx) == 7
+    finally:
+        cfg.CONF.set_default('performance_schema', 'uuid', group='database')
+        session = db_api.get_session()
+        with session.begin():
+            for model in models.PERFORMANCE_MODELS.values():
+                session.query(model).delete()
+        db.reset_row_counters()
+
+
+def test_purge_performance():
+    ctx = get_admin_context()
+    db.init_db()
+    now = datetime.datetime.utcnow()
+    db.performance_create_all(ctx, [
+        {'iops': i, 'latency': i, 'created_at': now - datetime.timedelta(days=i)}
+        for i in range(10)])
+    try:
+        assert db.performance_get_count(ctx) == 10
+        perfs = db.performance_get_all(ctx, sort_keys=['created_at'], sort_dirs=['desc'])
+        db.performance_delete(ctx, perfs[0].id)
+        db.performance_delete(ctx, perfs[8].id)
+
+        # days 6 to 9 expired, one of them soft deleted, plus the soft
+        # deleted row of today
+        assert db.purge_performance(now - datetime.timedelta(days=5, hours=12),
+                                    batch_size=2) == 5
+        assert db.performance_get_count(ctx) == 5
+        assert db_api._count_query(ctx, models.Performance, tenant_only=False) == 5
+    finally:
+        session = db_api.get_session()
+        with session.begin():
+            session.query(models.Performance).delete()
+        db.reset_row_counters()
+
+
+def test_performance_rollup_add():
+    ctx = get_admin_context()
+    db.init_db()
+    start = datetime.datetime(2019, 1, 1, 10)
+    perfs = [{'iops': i, 'latency': 100 - i, 'ground_truth': int(i == 70),
+              'time': start + datetime.timedelta(seconds=10 * i)}
+             for i in range(90)]
+    try:
+        # merged in two batches which share the bucket of minute 5
+        assert db.performance_rollup_add(ctx, perfs[:33]) == 7
+        assert db.performance_rollup_add(ctx, perfs[33:]) == 11
+
+        minutes = np.concatenate(list(db.performance_rollup_iter_columns(
+            ctx, 60, columns=('iops_mean', 'iops_variance', 'latency_min',
+                              'latency_max', 'anomalies'), fetch_size=4)))
+        assert minutes.shape == (15, 5)
+        iops = np.arange(90, dtype=float).reshape(15, 6)
+        assert np.allclose(minutes[:, 0], iops.mean(axis=1))
+        assert np.allclose(minutes[:, 1], iops.var(axis=1))
+        assert minutes[5].tolist()[2:] == [65.0, 70.0, 0.0]
+        assert minutes[11, 4] == 1
+
+        hours = list(db.performance_rollup_iter_columns(
+            ctx, 3600, columns=('iops_mean', 'latency_variance', 'anomalies')))
+        assert np.allclose(hours[0], [[44.5, np.arange(90).var(), 1]])
+
+        dataset = algorithm.RollupDataSet('minute', use_slave=False)
+        assert dataset.get(offset=10, limit=3)[:, 2].tolist() == [0.0, 1.0, 0.0]
+    finally:
+        session = db_api.get_session()
+        with session.begin():
+            session.query(models.PerformanceRollup).delete()
+
+
+def test_performance_rollup_add_retries(monkeypatch):
+    ctx = get_admin_context()
+    db.init_db()
+    merge = db_api._rollup_merge
+    calls = []
+
+    def _racing_merge(merges):
+        calls.append(merges)
+        if len(calls) == 1:
+            # a concurrent writer created the bucket first
+            raise sa_exc.IntegrityError('INSERT', {}, Exception('duplicate'))
+        return merge(merges)
+
+    monkeypatch.setattr(db_api, '_rollup_merge', _racing_merge)
+    try:
+        perfs = [{'iops': 1, 'latency': 2, 'time': datetime.datetime(2019, 1, 1)}]
+        assert db.performance_rollup_add(ctx, perfs, resolutions=(60,)) == 1
+        assert len(calls) == 2
+        blocks = list(db.performance_rollup_iter_columns(ctx, 60, columns=('count',)))
+        assert blocks[0].tolist() == [[1.0]]
+    finally:
+        session = db_api.get_session()
+        with session.begin():
+            session.query(models.PerformanceRollup).delete()
@@ -0,0 +1,82 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from anomaly_detection.ml.cache import ModelCache
+
+
+def _put(cache, training_id, version=None, nbytes=10):
+    return cache.put(training_id, version, 'tenant', 'gaussian', {}, nbytes)
+
+
+def test_hit_and_miss():
+    cache = ModelCache(max_entries=2)
+    assert cache.get('a') is None
+    _put(cache, 'a')
+    assert cache.get('a').training_id == 'a'
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_lru_eviction_by_entries():
+    cache = ModelCache(max_entries=2)
+    _put(cache, 'a')
+    _put(cache, 'b')
+    cache.get('a')
+    _put(cache, 'c')
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert cache.stats()['evictions'] == 1
+
+
+def test_eviction_by_bytes():
+    cache = ModelCache(max_entries=10, max_bytes=25)
+    _put(cache, 'a')
+    _put(cache, 'b')
+    _put(cache, 'c')
+    assert len(cache) == 2
+    assert cache.stats()['bytes'] == 20
+    _put(cache, 'd', nbytes=100)
+    assert 'd' not in cache
+
+
+def test_version_mismatch_and_invalidate():
+    cache = ModelCache()
+    _put(cache, 'a', version=1)
+    assert cache.get('a', version=2) is None
+    assert 'a' not in cache
+    _put(cache, 'a', version=2)
+    cache.invalidate('a')
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_disabled():
+    cache = ModelCache(max_entries=0)
+    _put(cache, 'a')
+    assert len(cache) == 0
+
+
+def test_charge_state():
+    cache = ModelCache(max_entries=10, max_bytes=35)
+    _put(cache, 'a')
+    _put(cache, 'b')
+    cache.charge('b', 5)
+    assert cache.stats()['bytes'] == 25
+    cache.charge('b', 20)
+    # the least recently used entry makes room for the grown state
+    assert 'a' not in cache
+    assert cache.stats()['bytes'] == 30
+    cache.invalidate('b')
+    assert cache.stats()['bytes'] == 0
@@ -0,0 +1,23 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from anomaly_detection.ml import csv
+
+
+def test_iter_read_streams_the_whole_file(tmpdir):
+    path = tmpdir.join('perf.csv')
+    path.write('iops,latency,ground_truth\n' + ''.join('%d,%d,0\n' % (i, i * 2) for i in range(10)) + '\n')
+    chunks = list(csv.iter_read(str(path), chunk_rows=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert [row[0] for chunk in chunks for row in chunk] == list(range(10))
+    assert list(chunks[-1][-1]) == [9, 18, 0]
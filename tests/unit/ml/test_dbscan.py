@@ -0,0 +1,37 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+
+from anomaly_detection.ml import algorithm
+from anomaly_detection.ml.algorithms import dbscan
+from anomaly_detection.utils import config as cfg
+
+
+@pytest.mark.parametrize("style", ['blue_red', 'core_border_spectral'])
+def test_training_figure_follows_the_apiserver_style(style):
+    data = np.random.RandomState(0).normal(100, 10, size=(200, 3))
+    driver = dbscan.DBSCAN()
+    driver.dataset = algorithm.ArrayDataSet(data)
+    md = {'epsilon': 0.5, 'min_samples': 5, 'adjusted_rand_score': 1.0}
+    cfg.CONF.set_default('dbscan_figure_style', style, group='apiserver')
+    try:
+        fig = driver.get_training_figure(md)
+    finally:
+        cfg.CONF.set_default('dbscan_figure_style', 'blue_red', group='apiserver')
+    labels = set(line.get_label() for line in fig.axes[0].get_lines())
+    if style == 'blue_red':
+        assert labels == {'normal  point', 'outlier point'}
+    else:
+        assert 'core point' in labels
@@ -0,0 +1,137 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+
+from anomaly_detection.ml import algorithm
+from anomaly_detection.ml.algorithms import ewma
+from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import np_binary
+
+
+def test_baseline_matches_exponential_weights():
+    data = np.random.RandomState(0).normal(100, 10, size=(500, 2))
+    alpha = 0.05
+    baseline = ewma.Baseline()
+    for point in data:
+        baseline.update(point, alpha)
+
+    weights = alpha * (1 - alpha) ** np.arange(len(data) - 1)[::-1]
+    weights = np.concatenate([[(1 - alpha) ** (len(data) - 1)], weights])
+    assert np.allclose(baseline.level, weights.dot(data))
+    assert np.allclose(np.sqrt(baseline.variance), 10, rtol=0.3)
+
+
+def test_seasonal_baseline():
+    season = 50
+    rng = np.random.RandomState(1)
+    wave = 1000 + 500 * np.sin(np.arange(season * 20) * 2 * np.pi / season)
+    data = np.stack([wave, np.full(len(wave), 100.0)], axis=1) + rng.normal(0, 5, (len(wave), 2))
+    seasonal, flat = ewma.Baseline(season_length=season), ewma.Baseline()
+    # stop before the peak of the last season
+    for i, point in enumerate(data[:-season + season // 4]):
+        seasonal.update(point, 0.1, gamma=0.3, season=i % season)
+        flat.update(point, 0.1)
+
+    # the seasonal components expect the peak, the spike on top of it
+    # stands out of their residuals only
+    spike = data[-season + season // 4] + [100, 0]
+    deviation = seasonal.update(spike, 0.1, 0.3, season=season // 4)
+    assert flat.update(spike, 0.1)[0] < 3 < deviation[0]
+
+
+def test_season_follows_the_time():
+    md = {"season_length": 24, "season_period": 86400.0}
+    assert ewma.EWMA._season(md, 0) == 0
+    assert ewma.EWMA._season(md, 86400 * 3 + 3600 * 5 + 10) == 5
+    assert ewma.EWMA._season(md, np.nan) is None
+    assert ewma.EWMA._season(dict(md, season_length=0), 3600) is None
+
+
+def test_seasonal_training_uses_the_row_times():
+    rng = np.random.RandomState(3)
+    # hourly rows with a daily peak, 20 days
+    times = np.arange(24 * 20) * 3600.0
+    iops = 1000 + 500 * (times % 86400 >= 12 * 3600) + rng.normal(0, 5, len(times))
+    data = np.column_stack([iops, rng.normal(100, 1, len(times)), np.zeros(len(times)), times])
+    cfg.CONF.set_default('season_length', 24, group='ewma')
+    try:
+        driver = ewma.EWMA()
+        driver.dataset = algorithm.ArrayDataSet(data)
+        md = driver.load_model(np_binary.dumps(driver.create_training({})))
+    finally:
+        cfg.CONF.set_default('season_length', 0, group='ewma')
+    assert md["seasonal"].shape == (1, 24, 2)
+    assert md["seasonal"][0, 12:, 0].mean() - md["seasonal"][0, :12, 0].mean() > 300
+
+    # the daily peak is expected whatever the number of rows in between
+    day = 86400 * 30
+    stream = np.array([[1000, 100, 0, day + 3600], [1500, 100, 0, day + 13 * 3600],
+                       [1500, 100, 0, day + 3 * 3600]])
+    assert driver.prediction(md, stream).tolist() == [False, False, True]
+
+
+def test_create_training_and_stream():
+    rng = np.random.RandomState(2)
+    data = np.column_stack([rng.normal(1000, 10, 300), rng.normal(100, 2, 300),
+                            np.zeros(300)])
+    data[200] = [2000, 100, 1]
+    cfg.CONF.set_default('warm_up', 10, group='ewma')
+    try:
+        driver = ewma.EWMA()
+        driver.dataset = algorithm.ArrayDataSet(data)
+        md = driver.load_model(np_binary.dumps(driver.create_training({})))
+    finally:
+        cfg.CONF.set_default('warm_up', 30, group='ewma')
+    assert md["series"].tolist() == [b'']
+    assert md["count"][0] == 300
+    # the anomaly is caught
+    assert md["f1_score"] > 0
+
+    stream = np.array([[1000, 100], [1005, 99], [3000, 100], [1000, 250]])
+    assert driver.prediction(md, stream).tolist() == [False, False, True, True]
+    # a new series warms up before being flagged
+    loads = ewma.MODEL_LOADS.get()
+    streamed = ewma.STREAMED_POINTS.get()
+    flagged = driver.prediction_by_series(md, stream, ['vol-1'] * 4)
+    assert not flagged.any()
+    assert md["baselines"][b''].count == 304
+    assert ewma.STREAMED_POINTS.get() == streamed + 4
+
+    # the current baselines can be saved, the loaded ones restart from them
+    reloaded = driver.load_model(np_binary.dumps(driver.dump_model(md)))
+    assert ewma.MODEL_LOADS.get() == loads + 1
+    assert sorted(reloaded["baselines"]) == [b'', b'vol-1']
+    assert reloaded["baselines"][b'vol-1'].count == 4
+    assert np.allclose(reloaded["level"][0], md["baselines"][b''].level)
+
+
+def test_new_series_are_capped():
+    driver = ewma.EWMA()
+    driver.dataset = algorithm.ArrayDataSet(np.column_stack([
+        np.full(50, 1000.0), np.full(50, 100.0), np.zeros(50)]))
+    cfg.CONF.set_default('warm_up', 1, group='ewma')
+    cfg.CONF.set_default('max_new_series', 1, group='ewma')
+    try:
+        md = driver.load_model(np_binary.dumps(driver.create_training({})))
+        assert driver.state_nbytes(md) == 0
+        untracked = ewma.UNTRACKED_POINTS.get()
+        stream = np.array([[1000, 100], [1000, 100], [1000, 100], [9000, 100]])
+        flagged = driver.prediction_by_series(md, stream, ['vol-1', 'vol-1', 'vol-2', 'vol-1'])
+    finally:
+        cfg.CONF.set_default('max_new_series', 10000, group='ewma')
+        cfg.CONF.set_default('warm_up', 30, group='ewma')
+    assert flagged.tolist() == [False, False, False, True]
+    assert sorted(md["baselines"]) == [b'', b'vol-1']
+    assert ewma.UNTRACKED_POINTS.get() == untracked + 1
+    assert driver.state_nbytes(md) > 0
@@ -0,0 +1,28 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+
+from anomaly_detection.ml.algorithms import gaussian
+
+
+def test_estimator_matches_whole_dataset():
+    data = np.random.RandomState(0).normal(100, 10, size=(1001, 2))
+    estimator = gaussian.GaussianEstimator()
+    for start in range(0, len(data), 300):
+        estimator.update(data[start:start + 300])
+
+    mu, sigma = gaussian.estimate_gaussian(data)
+    assert estimator.count == len(data)
+    assert np.allclose(estimator.mean, mu)
+    assert np.allclose(estimator.covariance(), sigma)
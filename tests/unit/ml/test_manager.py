@@ -0,0 +1,102 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gc
+import weakref
+
+import numpy as np
+import pytest
+
+from anomaly_detection import db
+from anomaly_detection import exception
+from anomaly_detection.context import get_admin_context
+from anomaly_detection.ml import algorithm
+from anomaly_detection.ml import manager
+from anomaly_detection.utils import config as cfg
+from anomaly_detection.utils import np_binary
+
+
+def test_model_caches_follow_reloads():
+    ml_mgr = manager.MLManager()
+    cache = ml_mgr.model_cache
+    cfg.CONF.set_default('model_cache_size', 3, group='training')
+    try:
+        manager._resize_model_caches(cfg.CONF, {('training', 'model_cache_size'): (128, 3)})
+        assert cache._max_entries == 3
+    finally:
+        cfg.CONF.set_default('model_cache_size', 128, group='training')
+
+
+def test_managers_are_not_kept_alive():
+    ref = weakref.ref(manager.MLManager())
+    gc.collect()
+    assert ref() is None
+
+
+def test_cached_model_is_revalidated(monkeypatch):
+    ctx = get_admin_context()
+    db.init_db()
+    training = db.training_create(ctx, {'name': 'cached', 'algorithm': 'gaussian',
+                                        'tenant_id': 'tenant',
+                                        'model_data': np_binary.dumps({'mu': np.zeros(2)})})
+    ml_mgr = manager.MLManager()
+    entry = ml_mgr._get_model(ctx, training.id)
+    # never updated trainings are versioned by their creation
+    assert entry.version == training.created_at
+
+    checks = []
+    monkeypatch.setattr(ml_mgr.db, 'training_get_version',
+                        lambda ctx, training_id: checks.append(training_id) or entry.version)
+    assert ml_mgr._get_model(ctx, training.id) is entry
+    assert checks == []
+    # past the revalidate interval the version is checked again
+    ml_mgr.model_cache.validate(training.id, 0)
+    assert ml_mgr._get_model(ctx, training.id).model is entry.model
+    assert checks == [training.id]
+    assert ml_mgr._get_model(ctx, training.id).validated_at > 0
+    assert checks == [training.id]
+    monkeypatch.undo()
+
+    # deleted by another process, the cache of this one isn't invalidated
+    db.training_delete(ctx, training.id)
+    ml_mgr.model_cache.validate(training.id, 0)
+    with pytest.raises(exception.NotFound):
+        ml_mgr._get_model(ctx, training.id)
+    assert training.id not in ml_mgr.model_cache
+
+
+def test_scoring_state_is_charged_to_the_cache():
+    ctx = get_admin_context()
+    db.init_db()
+    driver = manager.MLManager()._get_algorithm('ewma')
+    driver.dataset = algorithm.ArrayDataSet(np.column_stack([
+        np.full(50, 1000.0), np.full(50, 100.0), np.zeros(50)]))
+    training = db.training_create(ctx, {'name': 'ewma', 'algorithm': 'ewma',
+                                        'tenant_id': 'tenant',
+                                        'model_data': np_binary.dumps(driver.create_training({}))})
+    try:
+        ml_mgr = manager.MLManager()
+        ml_mgr.prediction(ctx, training.id, np.array([[1000, 100]]))
+        loaded = ml_mgr.model_cache.stats()['bytes']
+        ml_mgr.prediction(ctx, training.id, np.array([[1000, 100]]), series_ids=['vol-1'])
+        assert ml_mgr.model_cache.stats()['bytes'] > loaded
+    finally:
+        db.training_delete(ctx, training.id)
+
+
+def test_print_figure_closes_the_figure():
+    plt = manager.plt
+    fig = plt.figure()
+    plt.plot([1, 2], [3, 4])
+    assert manager.print_figure(fig).startswith(b'\x89PNG')
+    assert fig.number not in plt.get_fignums()
@@ -0,0 +1,81 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+
+import numpy as np
+
+from anomaly_detection import db
+from anomaly_detection.context import get_admin_context
+from anomaly_detection.db.sqlalchemy import api as db_api
+from anomaly_detection.db.sqlalchemy import models
+from anomaly_detection.ml import algorithm
+from anomaly_detection.ml.algorithms import series_gaussian
+from anomaly_detection.utils import np_binary
+
+
+def test_statistics_match_every_series():
+    rng = np.random.RandomState(0)
+    ids = np.array([b'vol-%d' % i for i in rng.randint(0, 50, size=3000)])
+    data = rng.normal(1000, 10, size=(3000, 2)) * (1 + np.char.str_len(ids)[:, None])
+    stats = series_gaussian.SeriesStatistics()
+    for start in range(0, len(data), 700):
+        stats.update(ids[start:start + 700], data[start:start + 700])
+    md = stats.fit(min_samples=2)
+
+    assert md["series"].tolist() == sorted(set(ids.tolist()))
+    for i, series_id in enumerate(md["series"]):
+        rows = data[ids == series_id]
+        assert md["count"][i] == len(rows)
+        assert np.allclose(md["mu"][i], rows.mean(axis=0))
+        assert np.allclose(np.linalg.inv(md["precision"][i]), np.cov(rows.T), rtol=1e-5)
+    assert np.allclose(md["mu"][-1], data.mean(axis=0))
+
+
+def test_create_training_by_series():
+    ctx = get_admin_context()
+    db.init_db()
+    rng = np.random.RandomState(1)
+    start = datetime.datetime(2019, 1, 1)
+    perfs = []
+    for i in range(400):
+        series = i % 4
+        perfs.append({'series_id': 'vol-%d' % series,
+                      'iops': int(rng.normal(1000 * (series + 1), 20)),
+                      'latency': int(rng.normal(100, 5)),
+                      'ground_truth': 0,
+                      'created_at': start + datetime.timedelta(seconds=i)})
+    # too few rows for a model of its own
+    perfs.append({'series_id': 'vol-9', 'iops': 1000, 'latency': 100})
+    # rows ingested without a series are the series b''
+    perfs.extend({'iops': int(rng.normal(500, 20)), 'latency': int(rng.normal(100, 5))}
+                 for _ in range(40))
+    db.performance_create_all(ctx, perfs)
+    try:
+        driver = series_gaussian.SeriesGaussian()
+        driver.dataset = algorithm.DBDataSet(use_slave=False)
+        md = np_binary.loads(np_binary.dumps(driver.create_training({})))
+        assert md["series"].tolist() == [b'', b'vol-0', b'vol-1', b'vol-2', b'vol-3']
+        assert md["count"].tolist() == [40, 100, 100, 100, 100, 441]
+        assert md["f1_score"] is None
+
+        dataset = np.array([[1000, 100], [4000, 100], [4000, 100]])
+        flagged = driver.prediction_by_series(md, dataset, ['vol-0', 'vol-0', 'vol-3'])
+        assert flagged.tolist() == [False, True, False]
+        # unknown series are scored with the model of all rows
+        assert not driver.prediction_by_series(md, dataset[:1], ['vol-9']).any()
+    finally:
+        session = db_api.get_session()
+        with session.begin():
+            session.query(models.Performance).delete()
+        db.reset_row_counters()
@@ -0,0 +1,70 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import logging
+
+import pytest
+from six.moves import queue
+
+from anomaly_detection import log
+
+
+def _record(msg, *args):
+    return logging.LogRecord('test', logging.INFO, __file__, 1, msg, args, None)
+
+
+@pytest.mark.parametrize("policy, expected", [
+    ('drop_new', ['message 0', 'message 1']),
+    ('drop_old', ['message 1', 'message 2']),
+])
+def test_queue_handler_drop_policy(policy, expected):
+    log_queue = queue.Queue(2)
+    handler = log.DroppingQueueHandler(log_queue, policy)
+    for i in range(3):
+        handler.handle(_record('message %d', i))
+
+    assert handler.dropped == 1
+    assert [log_queue.get_nowait().msg for _i in range(2)] == expected
+
+
+def test_queue_listener_writes_records():
+    records = []
+
+    class ListHandler(logging.Handler):
+        def emit(self, record):
+            records.append(self.format(record))
+
+    log_queue = queue.Queue(10)
+    listener = log.QueueListener(log_queue, [ListHandler()])
+    listener.start()
+    handler = log.DroppingQueueHandler(log_queue)
+    handler.handle(_record('iops %s', {'iops': 1}))
+    listener.stop()
+
+    assert records == ["iops {'iops': 1}"]
+
+
+def test_json_formatter():
+    formatter = log.JSONFormatter()
+    record = _record('training %s done', 'x')
+    record.created = 1500000000.25
+    with log.context(request_id='req-1', training_id='x'):
+        data = json.loads(formatter.format(record))
+
+    assert data['timestamp'] == '2017-07-14T02:40:00.250Z'
+    assert data['message'] == 'training x done'
+    assert data['request_id'] == 'req-1'
+    assert data['training_id'] == 'x'
+    assert data['exception'] is None
+    assert log.get_context() == {'request_id': None, 'training_id': None}
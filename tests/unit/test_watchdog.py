@@ -0,0 +1,39 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+
+from anomaly_detection import watchdog
+
+
+def _busy_wait(seconds):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        pass
+
+
+def test_slow_operation_is_sampled():
+    dog = watchdog.Watchdog(threshold=0.05, sample_interval=0.005)
+    dog.start()
+    try:
+        with dog.watch('training', 'slow') as op:
+            _busy_wait(0.3)
+        with dog.watch('training', 'fast') as fast:
+            pass
+    finally:
+        dog.stop()
+
+    assert op.samples > 0
+    assert any('_busy_wait' in stack for stack in op.stacks)
+    assert 'slow training slow took' in op.report(0.3, 5)
+    assert fast.samples == 0
@@ -0,0 +1,65 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from anomaly_detection.utils import capture
+
+
+def test_capture_roundtrip(tmpdir):
+    path = str(tmpdir.join('metrics.cap'))
+    writer = capture.CaptureWriter(path)
+    writer.write(b'{"iops": 1}', capture.KIND_KAFKA, 10.5)
+    writer.write(u'{"iops": 2}', capture.KIND_TELEMETRY, 11.0)
+    writer.close()
+
+    records = list(capture.CaptureReader(path))
+    assert records == [(10.5, capture.KIND_KAFKA, b'{"iops": 1}'),
+                       (11.0, capture.KIND_TELEMETRY, b'{"iops": 2}')]
+    kafka_only = list(capture.CaptureReader(path, kinds=[capture.KIND_KAFKA]))
+    assert len(kafka_only) == 1
+
+
+def test_capture_ignores_truncated_record(tmpdir):
+    path = str(tmpdir.join('metrics.cap'))
+    writer = capture.CaptureWriter(path)
+    writer.write(b'{"iops": 1}', timestamp=1.0)
+    writer.write(b'{"iops": 2}', timestamp=2.0)
+    writer.close()
+    with open(path, 'rb+') as f:
+        f.truncate(len(f.read()) - 3)
+
+    assert [r[0] for r in capture.CaptureReader(path)] == [1.0]
+
+
+def test_capture_appends(tmpdir):
+    path = str(tmpdir.join('metrics.cap'))
+    for i in range(2):
+        writer = capture.CaptureWriter(path)
+        writer.write(b'x', timestamp=float(i))
+        writer.close()
+
+    assert [r[0] for r in capture.CaptureReader(path)] == [0.0, 1.0]
+
+
+def test_capture_appends_after_truncated_record(tmpdir):
+    path = str(tmpdir.join('metrics.cap'))
+    writer = capture.CaptureWriter(path)
+    writer.write(b'{"iops": 1}', timestamp=1.0)
+    writer.write(b'{"iops": 2}', timestamp=2.0)
+    # flushed without closing, as when the process is killed
+    with open(path, 'rb+') as f:
+        f.truncate(len(f.read()) - 3)
+
+    writer = capture.CaptureWriter(path)
+    writer.write(b'{"iops": 3}', timestamp=3.0)
+    writer.close()
+    assert [r[2] for r in capture.CaptureReader(path)] == [b'{"iops": 1}', b'{"iops": 3}']
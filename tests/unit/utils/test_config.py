@@ -0,0 +1,59 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+from anomaly_detection.utils import config as cfg
+
+
+def test_snapshot_is_replaced_on_change():
+    conf = cfg.ConfigOpts()
+    conf.register_opts([cfg.IntOpt('size', default=1),
+                        cfg.StrOpt('name', default='a')], 'group')
+    conf([])
+
+    snapshot = conf.snapshot('group')
+    assert (snapshot.size, snapshot.name) == (1, 'a')
+    assert conf.snapshot('group') is snapshot
+    with pytest.raises(AttributeError):
+        snapshot.size = 2
+
+    conf.set_default('size', 2, group='group')
+    assert snapshot.size == 1
+    assert conf.snapshot('group').size == 2
+    assert conf.group.size == 2
+
+
+def test_mutate_config_files(tmpdir):
+    path = tmpdir.join('test.conf')
+    path.write('[group]\nsize = 1\nname = a\n')
+    conf = cfg.ConfigOpts()
+    conf.register_opts([cfg.IntOpt('size', default=0, mutable=True),
+                        cfg.StrOpt('name', default='')], 'group')
+    conf(['--config-file', str(path)])
+    calls = []
+    conf.register_mutate_hook(lambda c, fresh: calls.append(fresh))
+
+    path.write('[group]\nsize = 2\nname = b\n')
+    fresh = conf.mutate_config_files()
+
+    assert fresh == {('group', 'size'): (1, 2)}
+    assert calls == [fresh]
+    assert conf.snapshot('group').size == 2
+    # restart only options keep the value they were started with
+    assert conf.group.name == 'a'
+
+    path.write('[group]\nsize = x\nname = b\n')
+    with pytest.raises(ValueError):
+        conf.mutate_config_files()
+    assert conf.group.size == 2
@@ -0,0 +1,75 @@
+# Copyright 2019 The OpenSDS Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+
+from anomaly_detection.utils import np_binary
+from anomaly_detection.utils import np_json
+
+MODEL = {
+    "mu": np.array([1.5, 2.5]),
+    "sigma": np.array([[1.0, 0.5], [0.5, 2.0]]),
+    "epsilon": np.asarray(-12.25),
+    "min_samples": np.int64(7),
+    "f1_score": 0.875,
+    "name": "gaussian",
+}
+
+
+def _check(md):
+    np.testing.assert_array_equal(md["mu"], MODEL["mu"])
+    np.testing.assert_array_equal(md["sigma"], MODEL["sigma"])
+    assert md["epsilon"].shape == ()
+    assert md["epsilon"] == MODEL["epsilon"]
+    assert isinstance(md["min_samples"], np.int64)
+    assert md["min_samples"] == 7
+    assert md["f1_score"] == MODEL["f1_score"]
+    assert md["name"] == "gaussian"
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(compress):
+    data = np_binary.dumps(MODEL, compress=compress)
+    assert np_binary.is_container(data)
+    _check(np_binary.loads(data))
+
+
+def test_arrays_are_views_and_aligned():
+    data = np_binary.dumps(MODEL)
+    md = np_binary.loads(data)
+    base = np.frombuffer(data, dtype=np.uint8).ctypes.data
+    for name in ("mu", "sigma"):
+        assert not md[name].flags.owndata
+        assert (md[name].ctypes.data - base) % np_binary.ALIGNMENT == 0
+
+
+def test_load_mmap(tmp_path):
+    path = str(tmp_path / "model.admf")
+    with open(path, "wb") as fp:
+        np_binary.dump(MODEL, fp)
+    _check(np_binary.load(path))
+    _check(np_binary.load(path, use_mmap=False))
+
+
+def test_legacy_json():
+    legacy = np_json.dumps({"mu": MODEL["mu"], "f1_score": 0.875})
+    md = np_binary.loads(legacy)
+    np.testing.assert_array_equal(md["mu"], MODEL["mu"])
+    md = np_binary.loads(legacy.encode('utf-8'))
+    assert md["f1_score"] == 0.875
+
+
+def test_reject_object_arrays():
+    with pytest.raises(TypeError):
+        np_binary.dumps({"bad": np.array([object()])})